@@ -0,0 +1,249 @@
+"""
+Contains an asyncio facade for :class:`~tinydb.indexed_tinydb.IndexedTinyDB`.
+
+>>> db = AsyncIndexedTinyDB('db.json')
+>>> doc_id = await db.insert({'user': {'age': 30}})
+>>> await db.search(where('user').age == 30)
+[{'user': {'age': 30}}]
+>>> await db.close()
+"""
+
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Mapping, Optional, Tuple
+
+from .indexed_tinydb import IndexedTinyDB
+from .utils import freeze
+
+__all__ = ('AsyncIndexedTinyDB',)
+
+
+class AsyncIndexedTinyDB:
+    """
+    Use an :class:`~tinydb.indexed_tinydb.IndexedTinyDB` from asyncio code.
+
+    All work that touches the storage or the indexes runs on a thread pool
+    of at most ``max_workers`` threads, so reading and writing files never
+    blocks the event loop. Reads run in parallel, writes one at a time.
+    Arguments are passed on to :class:`~tinydb.indexed_tinydb.IndexedTinyDB`.
+
+    Concurrent calls are combined where possible:
+
+    - Concurrent searches (and gets) with the same arguments share a
+      single search.
+    - Concurrent inserts are collected into a batch that is written to the
+      storage at once, with one update per index.
+
+    Reads always see the writes that have finished before they were made.
+    """
+
+    def __init__(self, *args, max_workers: int = 4, **kwargs):
+        self.db = IndexedTinyDB(*args, **kwargs)
+
+        self._executor = ThreadPoolExecutor(max_workers=max_workers)
+
+        # Reads in progress by their arguments
+        self._reads: Dict[Any, asyncio.Future] = {}
+
+        # Inserts waiting for the next batch and the task writing batches
+        self._inserts: List[Tuple[Mapping, asyncio.Future]] = []
+        self._insert_task: Optional[asyncio.Task] = None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *args):
+        await self.close()
+
+    async def _run(self, func: Callable, *args, **kwargs) -> Any:
+        """
+        Run a database operation on the thread pool.
+        """
+        loop = asyncio.get_running_loop()
+
+        return await loop.run_in_executor(
+            self._executor,
+            functools.partial(func, *args, **kwargs)
+        )
+
+    async def _read(self, key: Any, func: Callable, *args, **kwargs) -> Any:
+        """
+        Run a read on the thread pool, sharing it with concurrent reads that
+        have the same ``key``. Reads without a key aren't shared.
+        """
+        if key is None:
+            return await self._run(func, *args, **kwargs)
+
+        future = self._reads.get(key)
+        if future is None:
+            future = asyncio.ensure_future(self._run(func, *args, **kwargs))
+            self._reads[key] = future
+            future.add_done_callback(
+                lambda _: self._reads.get(key) is future and self._reads.pop(key)
+            )
+
+        # Shield the shared read from callers that get cancelled
+        return await asyncio.shield(future)
+
+    async def _write(self, func: Callable, *args, **kwargs) -> Any:
+        # Let inserts that have been made before go first
+        if self._insert_task is not None:
+            await asyncio.shield(self._insert_task)
+
+        # Reads in progress may miss this write, so later reads must not
+        # share them. That includes the reads started while it runs.
+        self._reads.clear()
+        try:
+            return await self._run(func, *args, **kwargs)
+        finally:
+            self._reads.clear()
+
+    @staticmethod
+    def _read_key(*args) -> Any:
+        """
+        The key to share a read by, or ``None`` if it can't be shared.
+        """
+        for arg in args:
+            is_cacheable = getattr(arg, 'is_cacheable', None)
+            if is_cacheable is not None and not is_cacheable():
+                return None
+
+        try:
+            key = freeze(args)
+            hash(key)
+        except TypeError:
+            return None
+
+        return key
+
+    async def search(self, query, limit: Optional[int] = None) -> List[Mapping]:
+        """
+        Search the database, see
+        :meth:`~tinydb.indexed_tinydb.IndexedTinyDB.search`.
+        """
+        key = self._read_key('search', query, limit)
+
+        return await self._read(key, self.db.search, query, limit=limit)
+
+    async def get(self, cond=None, doc_id: Optional[int] = None,
+                  doc_ids: Optional[List[int]] = None):
+        """
+        Get documents by query or ID, see :meth:`~tinydb.table.Table.get`.
+        """
+        key = self._read_key('get', cond, doc_id, doc_ids)
+
+        return await self._read(key, self.db.get, cond=cond, doc_id=doc_id,
+                                doc_ids=doc_ids)
+
+    async def insert(self, document: Mapping) -> int:
+        """
+        Insert a document and index it.
+
+        Inserts made concurrently are written together.
+        """
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._inserts.append((document, future))
+
+        if self._insert_task is None:
+            self._insert_task = asyncio.ensure_future(self._write_inserts())
+
+        self._reads.clear()
+
+        return await future
+
+    async def insert_multiple(self, documents) -> List[int]:
+        return await self._write(self.db.insert_multiple, list(documents))
+
+    async def update(self, fields, cond=None, doc_ids=None) -> List[int]:
+        return await self._write(self.db.update, fields, cond=cond,
+                                 doc_ids=doc_ids)
+
+    async def remove(self, cond=None, doc_ids=None) -> List[int]:
+        return await self._write(self.db.remove, cond=cond, doc_ids=doc_ids)
+
+    async def create_index(self, jsonpath: str, alias: str,
+                           index_type: str) -> None:
+        await self._write(self.db.create_index, jsonpath, alias, index_type)
+
+    async def _write_inserts(self):
+        """
+        Write the waiting inserts in batches until there are none left.
+        """
+        try:
+            while self._inserts:
+                batch, self._inserts = self._inserts, []
+
+                try:
+                    results = await self._run(
+                        self._insert_batch, [doc for doc, _ in batch])
+                except BaseException as e:
+                    results = [e] * len(batch)
+
+                # Reads started while the batch was written may miss it
+                self._reads.clear()
+
+                for (_, future), result in zip(batch, results):
+                    if future.done():
+                        continue
+
+                    if isinstance(result, BaseException):
+                        future.set_exception(result)
+                    else:
+                        future.set_result(result)
+        finally:
+            self._insert_task = None
+
+    def _insert_batch(self, documents: List[Mapping]) -> List[Any]:
+        """
+        Insert documents with a single storage write and a single update
+        per index, committed together. Runs on the thread pool.
+
+        :returns: the ID of every document, or the error that prevented
+                  inserting it
+        """
+        db = self.db
+        specs = db.index_manager.index_specs
+
+        # Write the whole batch in one transaction, so nobody sees documents
+        # that aren't indexed yet
+        with db.transaction():
+            # Check the documents before writing anything, so a document that
+            # can't be indexed only fails its own insert
+            results: List[Any] = [None] * len(documents)
+            valid = []
+            keys = []
+            for i, document in enumerate(documents):
+                try:
+                    keys.append(db.index_keys(document))
+                except ValueError as e:
+                    results[i] = e
+                else:
+                    valid.append(i)
+
+            doc_ids = db.table(db.default_table_name).insert_multiple(
+                documents[i] for i in valid)
+
+            for alias in specs:
+                pairs = [(key, doc_id)
+                         for doc_id, keys_by_alias in zip(doc_ids, keys)
+                         for key in keys_by_alias[alias]]
+
+                if pairs:
+                    db.index_manager.add_entries(alias, pairs)
+
+            for i, doc_id in zip(valid, doc_ids):
+                results[i] = doc_id
+
+        return results
+
+    async def close(self) -> None:
+        """
+        Wait for pending inserts, then close the database.
+        """
+        if self._insert_task is not None:
+            await asyncio.shield(self._insert_task)
+
+        await self._run(self.db.close)
+        self._executor.shutdown()
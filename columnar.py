@@ -0,0 +1,330 @@
+"""
+Contains columnar projections of numeric fields that let tables evaluate
+comparisons on these fields with NumPy instead of document by document.
+
+Projections are optional and require NumPy to be installed:
+
+>>> table.create_projection('$.user.age')
+>>> table.search(where('user').age >= 30)  # Evaluated on the projection
+"""
+
+import operator
+import threading
+from typing import Any, Callable, Dict, List, Mapping, Optional, Tuple
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover
+    np = None
+
+from .jsonpath import parse_jsonpath
+from .query_compiler import compile_query
+
+__all__ = ('ColumnStore',)
+
+# Floats represent all integers up to this size exactly
+_MAX_EXACT_INT = 2 ** 53
+
+# The comparisons that can be evaluated on a column
+_COMPARISONS: Dict[str, Callable[[Any, Any], Any]] = {
+    '==': operator.eq,
+    '!=': operator.ne,
+    '<': operator.lt,
+    '<=': operator.le,
+    '>': operator.gt,
+    '>=': operator.ge,
+}
+
+
+def _is_number(value: Any) -> bool:
+    """
+    Check whether a value can be stored in a column without changing how it
+    compares to other numbers.
+    """
+    if isinstance(value, float):
+        return True
+
+    return isinstance(value, int) and -_MAX_EXACT_INT <= value <= _MAX_EXACT_INT
+
+
+def _parse_path(path: str) -> Tuple[Any, ...]:
+    """
+    Turn a JSONPath into the path of a query.
+
+    :raises ValueError: if the path may match more than one value
+    """
+    parts = []
+    for kind, key, deep in parse_jsonpath(path):
+        if kind == 'all' or deep:
+            raise ValueError('Projections require a path to a single field, '
+                             'got {!r}'.format(path))
+
+        parts.append(key)
+
+    return tuple(parts)
+
+
+class _Column:
+    """
+    The values of a field for every row of a :class:`ColumnStore`.
+
+    ``numeric`` marks the rows that have a number in ``values``, ``other``
+    marks the rows where the field has some other value. Queries evaluate
+    the latter document by document.
+    """
+
+    def __init__(self, jsonpath: str, path: Tuple[Any, ...], capacity: int):
+        self.jsonpath = jsonpath
+        self.path = path
+        self.values = np.zeros(capacity, dtype=np.float64)
+        self.numeric = np.zeros(capacity, dtype=bool)
+        self.other = np.zeros(capacity, dtype=bool)
+
+    def resize(self, capacity: int) -> None:
+        for name in ('values', 'numeric', 'other'):
+            array = getattr(self, name)
+            resized = np.zeros(capacity, dtype=array.dtype)
+            resized[:len(array)] = array[:capacity]
+            setattr(self, name, resized)
+
+    def keep(self, rows) -> None:
+        """
+        Only keep the given rows, moving them to the front.
+        """
+        for name in ('values', 'numeric', 'other'):
+            array = getattr(self, name)
+            kept = np.zeros(len(array), dtype=array.dtype)
+            kept[:len(rows)] = array[rows]
+            setattr(self, name, kept)
+
+    def set(self, row: int, doc: Mapping) -> None:
+        value: Any = doc
+        try:
+            # Resolve the path the same way queries do
+            for part in self.path:
+                value = value[part]
+        except (KeyError, TypeError):
+            present = False
+        else:
+            present = True
+
+        number = present and _is_number(value)
+        self.values[row] = value if number else 0
+        self.numeric[row] = number
+        self.other[row] = present and not number
+
+
+class ColumnStore:
+    """
+    Columnar projections of the numeric fields of a table.
+
+    Every document of the table has a row with the document's ID and the
+    value it has in each of the projected fields. Rows stay in the order
+    of the table, so results come out in the same order as when searching
+    the table document by document. :meth:`apply` keeps the rows in sync
+    with the changes made to the table.
+
+    :meth:`search` evaluates comparisons (``==``, ``!=``, ``<``, ``<=``,
+    ``>``, ``>=``) with a number and :meth:`~tinydb.queries.Query.one_of`
+    on projected fields as well as any combination of them with ``&``,
+    ``|`` and ``~`` as array operations.
+    """
+
+    #: The number of rows to allocate at first
+    INITIAL_CAPACITY = 1024
+
+    def __init__(self):
+        if np is None:
+            raise ImportError('Columnar projections require NumPy')
+
+        self._columns: Dict[Tuple[Any, ...], _Column] = {}
+
+        capacity = self.INITIAL_CAPACITY
+        self._doc_ids = np.zeros(capacity, dtype=np.int64)
+        self._live = np.zeros(capacity, dtype=bool)
+
+        # The number of rows in use, including those of removed documents,
+        # and the row of every document
+        self._size = 0
+        self._rows: Dict[int, int] = {}
+
+        # Writes update the rows under the table's write lock, but searches
+        # only hold its read lock. This keeps concurrent searches from
+        # rebuilding the rows at the same time.
+        self._search_lock = threading.Lock()
+
+    @property
+    def paths(self) -> List[str]:
+        """
+        The paths of the projected fields.
+        """
+        return [column.jsonpath for column in self._columns.values()]
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def add(self, path: str, table: Mapping[int, Mapping]) -> None:
+        """
+        Project a field of the documents in ``table``.
+
+        :param path: The JSONPath of the field, e.g. ``'$.user.age'``.
+        :param table: The documents of the table.
+        """
+        if self._rows.keys() != table.keys():
+            self.reset(table)
+
+        path_parts = _parse_path(path)
+        if path_parts in self._columns:
+            return
+
+        column = _Column(path, path_parts, len(self._doc_ids))
+        for doc_id, row in self._rows.items():
+            column.set(row, table[doc_id])
+
+        self._columns[path_parts] = column
+
+    def reset(self, table: Mapping[int, Mapping]) -> None:
+        """
+        Rebuild all rows from the documents in ``table``.
+        """
+        self._size = 0
+        self._rows.clear()
+        self._live[:] = False
+
+        self.apply(table)
+
+    def apply(self, changes: Mapping[int, Optional[Mapping]]) -> None:
+        """
+        Update the rows with documents that have been written (or removed,
+        if mapped to ``None``).
+        """
+        for doc_id, doc in changes.items():
+            row = self._rows.get(doc_id)
+
+            if doc is None:
+                if row is not None:
+                    del self._rows[doc_id]
+                    self._live[row] = False
+                continue
+
+            if row is None:
+                if self._size == len(self._doc_ids):
+                    self._grow()
+
+                row = self._size
+                self._size += 1
+                self._rows[doc_id] = row
+                self._doc_ids[row] = doc_id
+                self._live[row] = True
+
+            for column in self._columns.values():
+                column.set(row, doc)
+
+    def _grow(self) -> None:
+        if len(self._rows) <= self._size // 2:
+            # Most rows belong to removed documents, reuse them
+            self._compact()
+            return
+
+        capacity = len(self._doc_ids) * 2
+        for name in ('_doc_ids', '_live'):
+            array = getattr(self, name)
+            resized = np.zeros(capacity, dtype=array.dtype)
+            resized[:len(array)] = array
+            setattr(self, name, resized)
+
+        for column in self._columns.values():
+            column.resize(capacity)
+
+    def _compact(self) -> None:
+        rows = np.flatnonzero(self._live[:self._size])
+
+        self._doc_ids[:len(rows)] = self._doc_ids[rows]
+        self._live[:] = False
+        self._live[:len(rows)] = True
+        for column in self._columns.values():
+            column.keep(rows)
+
+        self._size = len(rows)
+        self._rows = {int(doc_id): row
+                      for row, doc_id in enumerate(self._doc_ids[:self._size])}
+
+    def search(self, cond, table: Mapping[int, Mapping]) -> Optional[List[int]]:
+        """
+        Search the projections.
+
+        :param cond: The query to search for.
+        :param table: The documents of the table, used for rows that don't
+                      have a number in a projected field.
+        :returns: the IDs of the matching documents or ``None`` if the query
+                  can't be evaluated on the projections
+        """
+        if getattr(cond, '_hash', None) is None or not self._columns:
+            return None
+
+        with self._search_lock:
+            if len(table) != len(self._rows):
+                # The table has been changed behind our back
+                self.reset(table)
+
+            mask = self._evaluate(cond, table)
+            if mask is None:
+                return None
+
+            mask &= self._live[:self._size]
+
+            return self._doc_ids[:self._size][mask].tolist()
+
+    def _evaluate(self, query, table: Mapping[int, Mapping]):
+        """
+        Evaluate a query for all rows. The hash tells what the query does,
+        the queries it combines are evaluated one by one.
+        """
+        hashval = getattr(query, '_hash', None)
+        if hashval is None:
+            return None
+
+        if hashval == ():
+            return np.ones(self._size, dtype=bool)
+
+        op = hashval[0]
+
+        if op in ('and', 'or', 'not'):
+            masks = [self._evaluate(part, table)
+                     for part in getattr(query, '_operands', ())]
+            if not masks or any(mask is None for mask in masks):
+                return None
+
+            if op == 'not':
+                return ~masks[0]
+
+            combine = np.logical_and if op == 'and' else np.logical_or
+            return combine.reduce(masks)
+
+        if op not in _COMPARISONS and op != 'one_of':
+            return None
+
+        column = self._columns.get(hashval[1])
+        if column is None:
+            return None
+
+        values = column.values[:self._size]
+        if op == 'one_of':
+            items = [item for item in hashval[2] if _is_number(item)]
+            mask = np.isin(values, items)
+        elif _is_number(hashval[2]):
+            mask = _COMPARISONS[op](values, hashval[2])
+        else:
+            return None
+
+        mask &= column.numeric[:self._size]
+
+        # Rows with other values are evaluated the usual way
+        other_rows = np.flatnonzero(column.other[:self._size]
+                                    & self._live[:self._size])
+        if len(other_rows):
+            test = compile_query(query)
+            for row in other_rows:
+                mask[row] = test(table[int(self._doc_ids[row])])
+
+        return mask
@@ -1,12 +1,14 @@
 """
 This module contains the main component of TinyDB: the database.
 """
-from typing import Dict, Iterator, Set, Type
+from contextlib import contextmanager
+from typing import Dict, Iterator, Optional, Set, Type
 
 from . import JSONStorage
+from .process_lock import ProcessLock
 from .storages import Storage
-from .table import Table, Document
-from .utils import with_typehint
+from .table import Table, Document, Transaction
+from .utils import CostAwareCache, RWLock, with_typehint
 
 # The table's base class. This is used to add type hinting from the Table
 # class to TinyDB. Currently, this supports PyCharm, Pyright/VS Code and MyPy.
@@ -29,7 +31,7 @@ class TinyDB(TableBase):
     ``__getattr__``.
 
     When creating a new instance, all arguments and keyword arguments (except
-    for ``storage``) will be passed to the storage class that is provided. If
+    for ``storage`` and ``lock_file``) will be passed to the storage class that is provided. If
     no storage class is specified, :class:`~tinydb.storages.JSONStorage` will be
     used.
 
@@ -38,9 +40,11 @@ class TinyDB(TableBase):
         For customization, the following class variables can be set:
 
         - ``table_class`` defines the class that is used to create tables,
-        - ``default_table_name`` defines the name of the default table, and
+        - ``default_table_name`` defines the name of the default table,
         - ``default_storage_class`` will define the class that will be used to
-          create storage instances if no other storage is passed.
+          create storage instances if no other storage is passed, and
+        - ``query_cache_bytes`` and ``query_cache_policy`` define the size
+          and eviction policy of the query cache the tables share.
 
         .. versionadded:: 4.0
 
@@ -64,8 +68,26 @@ class TinyDB(TableBase):
         ``dict`` of documents as its value. The document ``dict`` contains
         document IDs as keys and the documents themselves as values.
 
+    .. admonition:: Multiple Processes
+
+        Several processes (e.g. the workers of a web server) can use the same
+        database files if all of them pass the same ``lock_file``::
+
+            db = TinyDB('db.json', lock_file='db.json.lock')
+
+        Reads then take a shared lock on the file and writes an exclusive
+        one (see :class:`~tinydb.process_lock.ProcessLock`). A process only
+        drops its caches after another process has written.
+
+        :class:`~tinydb.middlewares.CachingMiddleware` flushes every write
+        before releasing the lock, so it only saves reading the file.
+        The log of :class:`~tinydb.middlewares.WALMiddleware` and
+        :class:`~tinydb.log_storage.LogStorage` can't be shared.
+
     :param storage: The class of the storage to use. Will be initialized
                     with ``args`` and ``kwargs``.
+    :param lock_file: The file to lock when several processes use the
+                      database.
     """
 
     #: The class that will be used to create table instances
@@ -83,12 +105,21 @@ class TinyDB(TableBase):
     #: .. versionadded:: 4.0
     default_storage_class = JSONStorage
 
+    #: The size in bytes of the query cache shared by all tables. Set it to
+    #: ``None`` to give every table a query cache of its own instead.
+    query_cache_bytes: Optional[int] = 64 * 1024 * 1024
+
+    #: The eviction policy of the shared query cache, see
+    #: :class:`~tinydb.utils.CostAwareCache`
+    query_cache_policy = 'gdsf'
+
     def __init__(self, *args, **kwargs) -> None:
         """
         Create a new instance of TinyDB.
         """
 
         storage = kwargs.pop('storage', self.default_storage_class)
+        lock_file = kwargs.pop('lock_file', None)
 
         # Prepare the storage
         self._storage: Storage = storage(*args, **kwargs)
@@ -96,6 +127,22 @@ class TinyDB(TableBase):
         self._opened = True
         self._tables: Dict[str, Table] = {}
 
+        # Guards the storage, shared by all tables
+        if lock_file is not None:
+            self._lock = ProcessLock(lock_file)
+            self._lock.on_change(self._reload)
+        else:
+            self._lock = RWLock()
+        self._storage.use_lock(self._lock)
+
+        # The transaction in progress, see ``transaction``
+        self._transaction: Optional[Transaction] = None
+
+        self._query_cache: Optional[CostAwareCache] = None
+        if self.query_cache_bytes is not None:
+            self._query_cache = CostAwareCache(self.query_cache_bytes,
+                                               self.query_cache_policy)
+
     def __repr__(self):
         args = [
             'tables={}'.format(list(self.tables())),
@@ -127,7 +174,16 @@ class TinyDB(TableBase):
         if name in self._tables:
             return self._tables[name]
 
+        # Tables share the query cache, unless they ask for a cache of
+        # their own
+        if self._query_cache is not None and 'cache_size' not in kwargs:
+            kwargs.setdefault('query_cache', self._query_cache)
+
+        # Tables share the storage, so they share the lock guarding it
+        kwargs.setdefault('lock', self._lock)
+
         table = self.table_class(self.storage, name, **kwargs)
+        table._transaction = self._transaction
         self._tables[name] = table
 
         return table
@@ -158,20 +214,30 @@ class TinyDB(TableBase):
         # so we need to consider this case to and return an empty set in this
         # case.
 
-        return set(self.storage.read() or {})
+        with self._lock.read():
+            return set(self.storage.read() or {})
 
     def drop_tables(self) -> None:
         """
         Drop all tables from the database. **CANNOT BE REVERSED!**
         """
 
-        # We drop all tables from this database by writing an empty dict
-        # to the storage thereby returning to the initial state with no tables.
-        self.storage.write({})
+        with self._lock.write():
+            self._check_no_transaction()
+
+            # We drop all tables from this database by writing an empty dict
+            # to the storage thereby returning to the initial state with no
+            # tables.
+            self.storage.write({})
+            self._lock.mark_written()
 
-        # After that we need to remember to empty the ``_tables`` dict, so we'll
-        # create new table instances when a table is accessed again.
-        self._tables.clear()
+            # After that we need to remember to empty the ``_tables`` dict, so
+            # we'll create new table instances when a table is accessed again.
+            self._tables.clear()
+
+            # The cached query results are gone along with the tables
+            if self._query_cache is not None:
+                self._query_cache.clear_all()
 
     def drop_table(self, name: str) -> None:
         """
@@ -180,26 +246,34 @@ class TinyDB(TableBase):
         :param name: The name of the table to drop.
         """
 
-        # If the table is currently opened, we need to forget the table class
-        # instance
-        if name in self._tables:
-            del self._tables[name]
+        with self._lock.write():
+            self._check_no_transaction()
+
+            # If the table is currently opened, we need to forget the table
+            # class instance
+            if name in self._tables:
+                del self._tables[name]
+
+            if self._query_cache is not None:
+                self._query_cache.clear(name)
 
-        data = self.storage.read()
+            data = self.storage.read()
 
-        # The database is uninitialized, there's nothing to do
-        if data is None:
-            return
+            # The database is uninitialized, there's nothing to do
+            if data is None:
+                return
 
-        # The table does not exist, there's nothing to do
-        if name not in data:
-            return
+            # The table does not exist, there's nothing to do
+            if name not in data:
+                return
 
-        # Remove the table from the data dict
-        del data[name]
+            # Remove the table from the data dict
+            del data[name]
 
-        # Store the updated data back to the storage
-        self.storage.write(data)
+            # Store the updated data back to the storage
+            self.storage.write_changes(data, {name: None})
+            self._lock.mark_written()
+            self._lock.after_write(self.storage.wait_durable)
 
     @property
     def storage(self) -> Storage:
@@ -230,6 +304,85 @@ class TinyDB(TableBase):
         self._opened = False
         self.storage.close()
 
+        if isinstance(self._lock, ProcessLock):
+            self._lock.close()
+
+    @contextmanager
+    def transaction(self) -> Iterator[None]:
+        """
+        Group writes into a transaction.
+
+        All writes to the database's tables inside the ``with`` block are
+        kept in memory and written to the storage with a single write when
+        the block ends. If the block raises an exception, none of them are
+        written:
+
+        >>> with db.transaction():
+        ...     db.insert({'name': 'John'})
+        ...     db.update({'age': 30}, where('name') == 'John')
+
+        Reads inside the block see the writes made so far. Other threads
+        wait until the transaction is over, both to read and to write.
+        Transactions can be nested, the inner ones become part of the
+        outermost one. Tables can't be dropped in a transaction.
+        """
+
+        with self._lock.write():
+            if self._transaction is not None:
+                # Part of the transaction in progress
+                yield
+                return
+
+            transaction = Transaction(self.storage)
+            self._set_transaction(transaction)
+            try:
+                yield
+                self._commit(transaction)
+                self._lock.after_write(self.storage.wait_durable)
+            except BaseException:
+                if transaction.committed:
+                    raise
+
+                transaction.rollback()
+                self._set_transaction(None)
+
+                # The caches of the tables have seen the undone writes
+                for table in transaction.tables:
+                    table._reload()
+
+                raise
+            finally:
+                self._set_transaction(None)
+
+    def _commit(self, transaction: Transaction) -> None:
+        """
+        Write the changes of a transaction.
+        """
+        transaction.commit()
+        if transaction.changes:
+            self._lock.mark_written()
+
+    def _set_transaction(self, transaction: Optional[Transaction]) -> None:
+        self._transaction = transaction
+        for table in self._tables.values():
+            table._transaction = transaction
+
+    def _check_no_transaction(self) -> None:
+        if self._transaction is not None:
+            raise RuntimeError('Cannot drop tables in a transaction')
+
+    def _reload(self) -> None:
+        """
+        Forget all cached data after another process has written.
+        """
+        self.storage.invalidate()
+
+        if self._query_cache is not None:
+            self._query_cache.clear_all()
+
+        for table in self._tables.values():
+            table._reload()
+
     def __enter__(self):
         """
         Use the database as a context manager.
@@ -1,7 +1,17 @@
+import dbm
+import heapq
 import os
+import pickle
+import tempfile
+import threading
+from bisect import bisect_left
+from contextlib import contextmanager
+from itertools import groupby, islice
+from operator import itemgetter
 from bplustree import BPlusTree
 from bplustree.serializer import Serializer
-from .utils import str_to_bytes, int_to_bytes
+from .process_lock import ProcessLock
+from .utils import str_to_bytes, int_to_bytes, FrozenList, LRUCache, RWLock
 import shelve
 from pathlib import Path
 
@@ -11,7 +21,8 @@ def pointer_store_path(index_dir, file_name):
 
 def load_pointer_store(store_path):
     """Load the pointer store from disk; keys are stored as hex strings."""
-    if not os.path.exists(f"{store_path}.db"):
+    # The files of a shelf depend on the dbm module, so let dbm find them
+    if not dbm.whichdb(store_path):
         return {}
     with shelve.open(store_path, flag='r') as shelf:
         return {bytes.fromhex(k): shelf[k] for k in shelf}
@@ -22,6 +33,80 @@ def save_pointer_store(pointer_store, store_path):
         for pointer, doc_ids in pointer_store.items():
             shelf[pointer.hex()] = doc_ids
 
+def sync_pointer_store(store_path):
+    """Make sure a saved pointer store is on disk, whatever files the dbm module uses."""
+    directory, name = os.path.split(store_path)
+    for file_name in os.listdir(directory):
+        if file_name.startswith(name):
+            fd = os.open(os.path.join(directory, file_name), os.O_RDONLY)
+            try:
+                os.fsync(fd)
+            finally:
+                os.close(fd)
+
+def external_sort(items, key, run_size):
+    """
+    Sort items with bounded memory: runs of ``run_size`` items are sorted
+    and written to temporary files, which are then merged. Items that fit
+    into a single run are sorted in memory.
+    """
+    items = iter(items)
+    runs = []
+    try:
+        while True:
+            run = sorted(islice(items, run_size), key=key)
+            if not runs and len(run) < run_size:
+                yield from run
+                return
+            if not run:
+                break
+
+            handle = tempfile.TemporaryFile()
+            for item in run:
+                pickle.dump(item, handle)
+            handle.seek(0)
+            runs.append(handle)
+
+        yield from heapq.merge(*map(_read_run, runs), key=key)
+    finally:
+        for handle in runs:
+            handle.close()
+
+def _read_run(handle):
+    while True:
+        try:
+            yield pickle.load(handle)
+        except EOFError:
+            return
+
+def refresh_bplustree(tree):
+    """
+    Make a B+Tree forget the nodes it has cached, after another process has
+    written to its file. Relies on the internals of bplustree.
+    """
+    mem = tree._mem
+    mem._cache.clear()
+    mem.last_page = os.fstat(mem._fd.fileno()).st_size // tree._tree_conf.page_size
+    tree._root_node_page, tree._tree_conf = mem.get_metadata()
+
+def iter_bplustree(tree, slice_=None):
+    """
+    Walk the (key, value) entries of a B+Tree in key order, all of them or
+    those with a key in ``slice_``. bplustree ends its iterators by raising
+    StopIteration, which Python 3.7+ turns into a RuntimeError (PEP 479), so
+    we end the walk there.
+    """
+    entries = iter(tree.items(slice_))
+    while True:
+        try:
+            yield next(entries)
+        except StopIteration:
+            return
+        except RuntimeError as e:
+            if isinstance(e.__cause__, StopIteration):
+                return
+            raise
+
 class RawBytesSerializer(Serializer):
     def serialize(self, obj, key_size=8):
         # If obj is already bytes and the length matches, return it.
@@ -40,7 +125,27 @@ class RawBytesSerializer(Serializer):
         return data
 
 class IndexManager:
-    def __init__(self, path: str, index_dir='indexes', list_dir='posting_list'):
+    """
+    Searches hold ``lock`` for reading and run in parallel, index updates
+    hold it for writing. A B+Tree reads its file through a single handle, so
+    reads of the same tree take turns, while reads of different trees and
+    of the pointer stores overlap.
+
+    With a ProcessLock, the indexes are reloaded from disk when another
+    process has changed them, and a writer checkpoints the B+Trees it has
+    changed before releasing the lock, so their files are complete.
+    """
+
+    # Number of range search results kept in memory
+    result_cache_size = 256
+
+    # Number of B+Tree entries a lazy range walk reads under the lock at once
+    range_chunk_size = 64
+
+    # Number of (key, doc_id) pairs verify() sorts in memory at once
+    verify_run_size = 100000
+
+    def __init__(self, path: str, index_dir='indexes', list_dir='posting_list', lock=None):
         db_name = Path(path).stem
         self.index_dir = index_dir + '/' + db_name
         self.list_dir = list_dir + '/' + db_name
@@ -50,6 +155,25 @@ class IndexManager:
         self.index_specs = {}
         self.max_index_text_len = 13
 
+        # Range search results by (alias, low key, high key)
+        self.result_cache = LRUCache(capacity=self.result_cache_size)
+
+        # Shared with the database, so documents and indexes change together
+        self.lock = lock if lock is not None else RWLock()
+        # One lock per B+Tree serializing its reads
+        self.tree_locks = {}
+
+        # The entries added in the transaction in progress by alias, as
+        # [pairs, whether all of them have been added as a batch], see
+        # transaction()
+        self.pending = None
+
+        # The indexes written to since the lock has been taken
+        self.changed_aliases = set()
+        if isinstance(self.lock, ProcessLock):
+            self.lock.on_change(self.reload)
+            self.lock.on_commit(self.checkpoint)
+
     def create_index(self, jsonpath: str, alias: str, index_type: str) -> None:
         """
         Create an index on a specific JSON field before inserting documents.
@@ -65,15 +189,17 @@ class IndexManager:
         if index_type.upper() != "TEXT" and index_type.upper() != "NUMERIC":
             raise ValueError("Unsupported index type. Use TEXT or NUMERIC.")
 
-        if alias not in self.index_specs:
-            self.index_specs[alias] = {}
-        if not self.index_specs[alias]:
-            bplustree_index = self.create_bplustree(alias, jsonpath, index_type.upper())
-            pointer_store = load_pointer_store(pointer_store_path(self.list_dir, f"doc_id_list_{alias}_{jsonpath}"))
-            self.index_specs[alias] = (jsonpath, index_type.upper(), bplustree_index, pointer_store)
-        else:
-            print("Index already exist.")
-            return
+        with self.lock.write():
+            if alias not in self.index_specs:
+                self.index_specs[alias] = {}
+            if not self.index_specs[alias]:
+                bplustree_index = self.create_bplustree(alias, jsonpath, index_type.upper())
+                pointer_store = load_pointer_store(pointer_store_path(self.list_dir, f"doc_id_list_{alias}_{jsonpath}"))
+                self.tree_locks[alias] = threading.Lock()
+                self.index_specs[alias] = (jsonpath, index_type.upper(), bplustree_index, pointer_store)
+            else:
+                print("Index already exist.")
+                return
 
         print(f"Index '{alias}' created with type '{index_type}' on path {jsonpath}.")
 
@@ -86,16 +212,84 @@ class IndexManager:
         else:
             return BPlusTree(index_path, order=3)
 
+    @contextmanager
+    def transaction(self):
+        """
+        Collect the entries added in the with block and add them when it
+        ends, with one write of the pointer_store per index. If the block
+        fails, the entries are dropped. Searches in the block don't see the
+        entries yet.
+        """
+        with self.lock.write():
+            if self.pending is not None:
+                # Part of the transaction in progress
+                yield
+                return
+
+            self.pending = {}
+            try:
+                yield
+                pending = self.pending
+                self.pending = None
+                self.write_pending(pending)
+            finally:
+                self.pending = None
+
+    def add_pending(self, alias, pairs, batch):
+        entry = self.pending.setdefault(alias, [[], batch])
+        entry[0].extend(pairs)
+        entry[1] = entry[1] and batch
+
+    def write_pending(self, pending):
+        """Write the entries collected in a transaction, with one write per index."""
+        for alias, (pairs, batch) in pending.items():
+            if batch:
+                self.write_batch(alias, pairs)
+            else:
+                self.write_entries(alias, pairs)
+
     def update_index(self, alias, key_bytes, doc_id):
         """
         Update the B+Tree index for the given alias and key.
         Instead of storing the document id directly, store a pointer.
         Update the external pointer_store accordingly and persist it.
         """
+        self.add_entries(alias, [(key_bytes, doc_id)])
+
+    def add_entries(self, alias, pairs):
+        """
+        Add (key_bytes, doc_id) pairs to an index one by one, persisting the
+        pointer_store once at the end. Unlike batch_update_index, the keys
+        don't have to be larger than the keys already in the B+Tree.
+        """
         if alias not in self.index_specs:
             return
 
-        jsonpath, index_type, bplus_tree, pointer_store = self.index_specs[alias]
+        with self.lock.write():
+            if self.pending is not None:
+                self.add_pending(alias, pairs, batch=False)
+                return
+
+            self.write_entries(alias, pairs)
+
+    def write_entries(self, alias, pairs):
+        """Like add_entries, but writes the entries even in a transaction."""
+        with self.lock.write():
+            jsonpath, index_type, bplus_tree, pointer_store = self.index_specs[alias]
+            self.changed_aliases.add(alias)
+            self.lock.mark_written()
+            keys = []
+            with self.tree_locks[alias]:
+                for key_bytes, doc_id in pairs:
+                    self._add_entry(index_type, bplus_tree, pointer_store, key_bytes, doc_id)
+                    keys.append(key_bytes)
+
+            # Persist the pointer_store to disk.
+            save_pointer_store(pointer_store, pointer_store_path(self.list_dir, f"doc_id_list_{alias}_{jsonpath}"))
+
+            self.invalidate_results(alias, keys)
+
+    def _add_entry(self, index_type, bplus_tree, pointer_store, key_bytes, doc_id):
         try:
             # Attempt to get the pointer for the key.
             pointer = bplus_tree.get(key_bytes)
@@ -109,8 +303,11 @@ class IndexManager:
             else:
                 pointer = key_bytes
 
-            # Initialize pointer_store entry.
-            pointer_store[pointer] = [doc_id]
+            # Initialize pointer_store entry, keeping the ids a redo of the
+            # same write may have stored already.
+            doc_ids = pointer_store.setdefault(pointer, [])
+            if doc_id not in doc_ids:
+                doc_ids.append(doc_id)
             # Insert into the B+Tree index.
             bplus_tree.insert(key_bytes, pointer)
         else:
@@ -120,9 +317,6 @@ class IndexManager:
             if doc_id not in pointer_store[pointer]:
                 pointer_store[pointer].append(doc_id)
 
-        # Persist the pointer_store to disk.
-        save_pointer_store(pointer_store, pointer_store_path(self.list_dir, f"doc_id_list_{alias}_{jsonpath}"))
-
     def batch_update_index(self, alias: str, iterable):
         """
         Batch insert or update an entire index in one go.
@@ -134,60 +328,320 @@ class IndexManager:
         if alias not in self.index_specs:
             raise KeyError(f"No such index: {alias}")
 
-        jsonpath, index_type, bplus_tree, pointer_store = self.index_specs[alias]
+        with self.lock.write():
+            if self.pending is not None:
+                self.add_pending(alias, iterable, batch=True)
+                return
 
-        # 1) Build up a map: pointer → [new doc_ids]
-        new_entries = {}
-        for key_bytes, doc_id in iterable:
-            # TEXT uses the raw bytes as pointer; NUMERIC packs the int into bytes
-            pointer = key_bytes if index_type == "TEXT" else int_to_bytes(key_bytes)
-            new_entries.setdefault(pointer, []).append(doc_id)
+            self.write_batch(alias, iterable)
 
-        # 2) Merge into the existing pointer_store (deduplicating)
-        for pointer, doc_ids in new_entries.items():
-            existing = pointer_store.get(pointer, [])
-            # union of old and new
-            pointer_store[pointer] = list(set(existing) | set(doc_ids))
+    def write_batch(self, alias, iterable):
+        """Like batch_update_index, but writes the entries even in a transaction."""
+        with self.lock.write():
+            jsonpath, index_type, bplus_tree, pointer_store = self.index_specs[alias]
 
-        # 3) Prepare the B+Tree batch list: (key, pointer)
-        batch_list = []
-        for pointer in new_entries:
-            if index_type == "NUMERIC":
-                # unpack back to integer key
-                key = int.from_bytes(pointer, byteorder='big', signed=True)
-            else:
-                key = pointer
-            batch_list.append((key, pointer))
+            # 1) Build up a map: pointer → [new doc_ids]
+            new_entries = {}
+            for key_bytes, doc_id in iterable:
+                # TEXT uses the raw bytes as pointer; NUMERIC packs the int into bytes
+                pointer = key_bytes if index_type == "TEXT" else int_to_bytes(key_bytes)
+                new_entries.setdefault(pointer, []).append(doc_id)
+
+            # 2) Merge into the existing pointer_store (deduplicating)
+            for pointer, doc_ids in new_entries.items():
+                existing = pointer_store.get(pointer, [])
+                # union of old and new
+                pointer_store[pointer] = list(set(existing) | set(doc_ids))
+
+            # 3) Prepare the B+Tree batch list: (key, pointer)
+            batch_list = []
+            for pointer in new_entries:
+                if index_type == "NUMERIC":
+                    # unpack back to integer key
+                    key = int.from_bytes(pointer, byteorder='big', signed=True)
+                else:
+                    key = pointer
+                batch_list.append((key, pointer))
 
-        # sort by key ascending (required by BPlusTree.batch_insert)
-        batch_list.sort(key=lambda kv: kv[0])
+            # sort by key ascending (required by BPlusTree.batch_insert)
+            batch_list.sort(key=lambda kv: kv[0])
 
-        # 4) Do the single-transaction bulk insert
-        bplus_tree.batch_insert(batch_list)
+            # 4) Do the single-transaction bulk insert
+            self.changed_aliases.add(alias)
+            self.lock.mark_written()
+            with self.tree_locks[alias]:
+                bplus_tree.batch_insert(batch_list)
 
-        # 5) Persist the updated pointer store
-        store_path = pointer_store_path(
-            self.list_dir,
-            f"doc_id_list_{alias}_{jsonpath}"
+            # 5) Persist the updated pointer store
+            store_path = pointer_store_path(
+                self.list_dir,
+                f"doc_id_list_{alias}_{jsonpath}"
+            )
+            save_pointer_store(pointer_store, store_path)
+
+            # 6) Forget the cached results that contain the new entries
+            self.invalidate_results(alias, [key for key, _ in batch_list])
+
+    def sync_pointer_stores(self, aliases):
+        """Make sure the pointer stores of the given indexes are on disk."""
+        for alias in aliases:
+            jsonpath = self.index_specs[alias][0]
+            sync_pointer_store(pointer_store_path(self.list_dir, f"doc_id_list_{alias}_{jsonpath}"))
+
+    def redo_entries(self, alias, jsonpath, index_type, pairs):
+        """
+        Add entries of a committed write that may not have made it to disk,
+        opening the index if it hasn't been created in this process. Adding
+        an entry twice is harmless.
+        """
+        with self.lock.write():
+            if alias in self.index_specs:
+                self.write_entries(alias, pairs)
+                self.sync_pointer_stores([alias])
+                return
+
+            store_path = pointer_store_path(self.list_dir, f"doc_id_list_{alias}_{jsonpath}")
+            bplus_tree = self.create_bplustree(alias, jsonpath, index_type)
+            self.lock.mark_written()
+            try:
+                pointer_store = load_pointer_store(store_path)
+                for key_bytes, doc_id in pairs:
+                    self._add_entry(index_type, bplus_tree, pointer_store, key_bytes, doc_id)
+
+                save_pointer_store(pointer_store, store_path)
+                sync_pointer_store(store_path)
+            finally:
+                bplus_tree.close()
+
+    def reload(self):
+        """
+        Load the indexes again after another process has changed them. The
+        caller has to hold the lock.
+        """
+        for alias, (jsonpath, index_type, bplus_tree, _) in self.index_specs.items():
+            refresh_bplustree(bplus_tree)
+            pointer_store = load_pointer_store(pointer_store_path(self.list_dir, f"doc_id_list_{alias}_{jsonpath}"))
+            self.index_specs[alias] = (jsonpath, index_type, bplus_tree, pointer_store)
+
+        self.result_cache.clear()
+
+    def checkpoint(self):
+        """
+        Move the changes of the B+Trees from their write-ahead logs into
+        their files, where other processes read them. The caller has to
+        hold the lock for writing.
+        """
+        for alias in self.changed_aliases:
+            self.index_specs[alias][2].checkpoint()
+
+        self.changed_aliases.clear()
+
+    @staticmethod
+    def pointer_for(index_type, key):
+        """The pointer the doc ids of a key are stored under."""
+        return int_to_bytes(key) if index_type == "NUMERIC" else key
+
+    def verify(self, alias, pairs):
+        """
+        Compare an index with the (key, doc_id) pairs it should contain,
+        walking both in key order. The caller has to hold the lock.
+
+        The pairs are sorted in runs of verify_run_size pairs that are
+        merged from temporary files, and the B+Tree is walked on disk, so
+        neither is held in memory as a whole. The keys of the pointer store
+        are sorted in memory, as the store is loaded in memory anyway.
+
+        Returns the keys whose entries differ as (key, expected doc ids,
+        indexed doc ids). A key left in the B+Tree without doc ids is as
+        good as a missing key, as bplustree can't delete keys.
+        """
+        if alias not in self.index_specs:
+            raise KeyError(f"No such index: {alias}")
+
+        _, index_type, bplus_tree, pointer_store = self.index_specs[alias]
+
+        # The keys of every source in ascending order, tagged with the source
+        expected = (
+            (key, 0, sorted({doc_id for _, doc_id in entries}))
+            for key, entries in groupby(external_sort(pairs, itemgetter(0), self.verify_run_size),
+                                        key=itemgetter(0))
         )
-        save_pointer_store(pointer_store, store_path)
+        in_tree = ((key, 1, pointer) for key, pointer in iter_bplustree(bplus_tree))
+        if index_type == "NUMERIC":
+            stored_keys = [int.from_bytes(pointer, byteorder='big', signed=True) for pointer in pointer_store]
+        else:
+            stored_keys = list(pointer_store)
+        in_store = ((key, 2, None) for key in sorted(stored_keys))
+
+        divergent = []
+        for key, entries in groupby(heapq.merge(expected, in_tree, in_store), key=itemgetter(0)):
+            found = {source: value for _, source, value in entries}
+            pointer = self.pointer_for(index_type, key)
+
+            expected_ids = found.get(0, [])
+            indexed_ids = sorted(set(pointer_store.get(pointer, ())))
+            if expected_ids:
+                intact = found.get(1) == pointer and indexed_ids == expected_ids
+            else:
+                intact = not indexed_ids
+
+            if not intact:
+                divergent.append((key, expected_ids, indexed_ids))
+
+        return divergent
+
+    def repair(self, alias, divergent):
+        """
+        Fix the entries of the keys verify() has reported, leaving all other
+        entries alone. Keys without documents keep their B+Tree entry, but
+        lose their doc ids.
+        """
+        with self.lock.write():
+            jsonpath, index_type, bplus_tree, pointer_store = self.index_specs[alias]
+            self.changed_aliases.add(alias)
+            self.lock.mark_written()
+
+            for key, expected_ids, _ in divergent:
+                pointer = self.pointer_for(index_type, key)
+                if expected_ids:
+                    with self.tree_locks[alias]:
+                        bplus_tree.insert(key, pointer, replace=True)
+                    pointer_store[pointer] = list(expected_ids)
+                else:
+                    pointer_store.pop(pointer, None)
+
+            save_pointer_store(pointer_store, pointer_store_path(self.list_dir, f"doc_id_list_{alias}_{jsonpath}"))
+
+            self.invalidate_results(alias, [key for key, _, _ in divergent])
+
+    def invalidate_results(self, alias, keys):
+        """
+        Drop the cached range search results of an index whose range
+        contains one of the given keys. All other results stay cached.
+        """
+        keys = sorted(keys)
+        if not keys:
+            return
+
+        for cache_key in list(self.result_cache):
+            cached_alias, low, high = cache_key
+            if cached_alias != alias:
+                continue
 
+            # The first key not below the range must be inside it
+            i = 0 if low is None else bisect_left(keys, low)
+            if i < len(keys) and (high is None or keys[i] < high):
+                del self.result_cache[cache_key]
+
+
+    def _range_keys(self, index_type, min_v, max_v):
+        """Normalize the bounds of a range to the keys stored in the B+Tree."""
+        if index_type == "NUMERIC":
+            return min_v, max_v
+
+        return (str_to_bytes(min_v, self.max_index_text_len),
+                str_to_bytes(max_v, self.max_index_text_len))
+
+    def iter_btree_range(self, alias, min_v, max_v):
+        """
+        Walk a range of the B+Tree lazily, yielding doc ids in key order.
+        Stopping early skips the rest of the walk.
+
+        See iter_btree_chunks for how the walk sees writes made meanwhile.
+        """
+        for doc_ids in self.iter_btree_chunks(alias, min_v, max_v):
+            yield from doc_ids
+
+    def iter_btree_chunks(self, alias, min_v, max_v, read=None):
+        """
+        Walk a range of the B+Tree lazily, yielding the doc ids of
+        range_chunk_size entries at a time in key order.
+
+        Every chunk is read under the lock, which is released before the
+        chunk is yielded, so writes don't wait for the walk to end. The walk
+        goes on after the last key it has read, so it sees the writes made
+        meanwhile: doc ids whose key changes while walking may be missed or
+        show up twice. ``read`` is called with the doc ids of each chunk
+        under the same lock, and its result is yielded instead of them.
+        """
+        read = read or list
+        with self.lock.read():
+            if alias not in self.index_specs:
+                return
+
+            index_type = self.index_specs[alias][1]
+            low, high = self._range_keys(index_type, min_v, max_v)
+
+            cached = self.result_cache.get((alias, low, high))
+            if cached is not None:
+                # The results are immutable, so they can be used outside of
+                # the lock
+                chunk = read(cached)
+
+        if cached is not None:
+            yield chunk
+            return
+
+        last = None
+        while True:
+            with self.lock.read():
+                if alias not in self.index_specs:
+                    return
+
+                _, _, bplustree_index, pointer_store = self.index_specs[alias]
+                # Read one more entry to know whether the walk goes on, and
+                # the last entry of the previous chunk again
+                if last is None:
+                    start, count = low, self.range_chunk_size + 1
+                else:
+                    start, count = last, self.range_chunk_size + 2
+
+                with self.tree_locks[alias]:
+                    entries = list(islice(
+                        iter_bplustree(bplustree_index, slice(start, high)),
+                        count))
+
+                if last is not None and entries and entries[0][0] == last:
+                    # Where the previous chunk ended
+                    entries.pop(0)
+                done = len(entries) <= self.range_chunk_size
+                entries = entries[:self.range_chunk_size]
+
+                chunk = read([doc_id for _, pointer in entries
+                              for doc_id in pointer_store.get(pointer, ())])
+
+            yield chunk
+            if done:
+                return
+
+            last = entries[-1][0]
 
     def search_btree_range(self, alias, min_v, max_v):
         """Search for a range of values using B+Tree indexing."""
         if alias in self.index_specs:
             _, index_type, bplustree_index, pointer_store = self.index_specs[alias]
-            
-            if index_type == "NUMERIC":
-                pointers = [value for _, value in bplustree_index.items(slice(min_v, max_v))]
-            else:
-                pointers = [value for _, value in bplustree_index.items(slice(str_to_bytes(min_v, self.max_index_text_len), str_to_bytes(max_v, self.max_index_text_len)))]
 
-            doc_ids = []
-            for pointer in pointers:
-                for doc_id in pointer_store.get(pointer, []):
-                    # doc_id = int.from_bytes(doc_id_bytes, byteorder='big', signed=True)
-                    doc_ids.append(doc_id)
+            low, high = self._range_keys(index_type, min_v, max_v)
+
+            with self.lock.read():
+                # Serve repeated searches from memory. The results are
+                # shared, so they are immutable.
+                cache_key = (alias, low, high)
+                doc_ids = self.result_cache.get(cache_key)
+                if doc_ids is not None:
+                    return doc_ids
+
+                with self.tree_locks[alias]:
+                    pointers = [value for _, value in iter_bplustree(bplustree_index, slice(low, high))]
+
+                doc_ids = []
+                for pointer in pointers:
+                    for doc_id in pointer_store.get(pointer, []):
+                        # doc_id = int.from_bytes(doc_id_bytes, byteorder='big', signed=True)
+                        doc_ids.append(doc_id)
+
+                doc_ids = FrozenList(doc_ids)
+                self.result_cache[cache_key] = doc_ids
             return doc_ids
         
         return []
@@ -197,7 +651,11 @@ class IndexManager:
             _, index_type, _, pointer_store = self.index_specs[alias]
             # print(pointer_store)
             if index_type == "NUMERIC":
-                return pointer_store.get(int_to_bytes(value), set())
+                key = int_to_bytes(value)
             else:
-                return pointer_store.get(str_to_bytes(value, self.max_index_text_len), set())
+                key = str_to_bytes(value, self.max_index_text_len)
+
+            # Copy the posting list, as writers append to it
+            with self.lock.read():
+                return list(pointer_store.get(key, ()))
         return []
@@ -0,0 +1,77 @@
+"""
+A command line tool checking the indexes of an
+:class:`~tinydb.indexed_tinydb.IndexedTinyDB` against its documents and
+repairing them::
+
+    python -m tinydb_test.index_tool db.json --index age '$.user.age' NUMERIC
+    python -m tinydb_test.index_tool db.json --index age '$.user.age' NUMERIC --repair
+
+As indexes are defined by the application, every index to check is given
+with its alias, JSONPath and type. Like the database, the index files are
+looked up relative to the working directory.
+
+Exits with status 1 if an index diverges from the documents and hasn't been
+repaired.
+"""
+
+import argparse
+import contextlib
+import io
+import sys
+from typing import List, Optional
+
+from .indexed_tinydb import IndexedTinyDB
+
+__all__ = ('main',)
+
+
+def format_key(key) -> str:
+    if isinstance(key, bytes):
+        return repr(key.rstrip(b'\x00').decode('utf-8', errors='replace'))
+
+    return repr(key)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(
+        description='Check the indexes of a database against its documents.')
+    parser.add_argument('path', help='the database file')
+    parser.add_argument('--index', nargs=3, action='append', required=True,
+                        metavar=('ALIAS', 'JSONPATH', 'TYPE'),
+                        help='an index to check, can be given several times')
+    parser.add_argument('--repair', action='store_true',
+                        help='fix the keys that diverge')
+    parser.add_argument('--show', type=int, default=20, metavar='N',
+                        help='the number of divergent keys to show per index '
+                             '(default: %(default)s)')
+    args = parser.parse_args(argv)
+
+    status = 0
+    with IndexedTinyDB(args.path) as db:
+        for alias, jsonpath, index_type in args.index:
+            # create_index reports on stdout, which we keep for the results
+            with contextlib.redirect_stdout(io.StringIO()):
+                db.create_index(jsonpath, alias, index_type)
+
+            if args.repair:
+                divergent = db.repair_index(alias)
+                verb = 'repaired'
+            else:
+                divergent = db.verify_index(alias)
+                verb = 'found'
+
+            print('{}: {} {} divergent keys'.format(alias, verb, len(divergent)))
+            for key, expected, indexed in divergent[:args.show]:
+                print('  {}: documents {}, index {}'.format(
+                    format_key(key), expected, indexed))
+            if len(divergent) > args.show:
+                print('  ...')
+
+            if divergent and not args.repair:
+                status = 1
+
+    return status
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,64 +1,265 @@
+import os
+from contextlib import closing, contextmanager
+from itertools import islice
 from typing import (
     Iterable,
+    Iterator,
     List,
     Mapping
 )
 
 from tinydb_test import TinyDB
 from .index_manager import IndexManager
-from .utils import str_to_bytes
+from .jsonpath import compile_jsonpath
+from .storages import apply_changes, int_keys
+from .utils import FrozenList, str_to_bytes
+from .wal import WriteAheadLog
 
 class IndexedTinyDB(TinyDB):
+    """
+    Writes are committed atomically across the documents, the B+Trees and
+    the pointer stores: the changed documents and index entries are first
+    appended to a shared commit log as a single record. A complete record
+    commits the write, and only then are the documents and indexes written.
+    Once they are on disk, the log is emptied again. If the process crashes
+    in between, the next open redoes the records left in the log, which only
+    touches the documents and index entries of the interrupted writes.
+
+    Storages that keep writes in memory (CachingMiddleware) still lose them
+    in a crash.
+    """
+
     def __init__(self, *args, **kwargs):
         """Initialize TinyDB with Index Manager."""
         super().__init__(*args, **kwargs)
-        self.index_manager = IndexManager(*args)
+        # The indexes share the database's lock, so readers never see a
+        # document without its index entries
+        self.index_manager = IndexManager(*args, lock=self._lock)
+
+        # The compiled JSONPath of each index, see compile_jsonpath
+        self.extractors = {}
+
+        self.commit_log = WriteAheadLog(os.path.join(self.index_manager.index_dir, 'commit.wal'))
+        self.recover()
 
     def create_index(self, jsonpath: str, alias: str, index_type: str) -> None:
+        # Compiling rejects unsupported paths before the index is created
+        compile_jsonpath(jsonpath)
         self.index_manager.create_index(jsonpath, alias, index_type)
 
-    def update_index(self, value, alias, doc_id, index_type):
-        if value is None or isinstance(value, dict):
+    @contextmanager
+    def transaction(self):
+        """
+        Group writes to the documents and the indexes, see TinyDB.transaction.
+        The documents are written first, then every index is written once.
+        Index searches in the block don't see the documents inserted in it.
+        """
+        with self.index_manager.transaction():
+            with super().transaction():
+                yield
+
+    def _commit(self, transaction):
+        """Commit the documents and the index entries of a transaction together."""
+        manager = self.index_manager
+        entries = manager.pending or {}
+        if manager.pending is not None:
+            # Written below instead of when the index transaction ends
+            manager.pending = {}
+
+        if not transaction.changes and not entries:
             return
 
+        # 1) Log the transaction. Once the record is on disk, the
+        # transaction is committed.
+        record = {
+            'changes': transaction.changes,
+            'entries': {
+                alias: [manager.index_specs[alias][0], manager.index_specs[alias][1],
+                        [[key.hex() if isinstance(key, bytes) else key, doc_id]
+                         for key, doc_id in pairs]]
+                for alias, (pairs, _) in entries.items()
+            },
+        }
+        self.commit_log.commit(self.commit_log.append(record))
+        transaction.committed = True
+        self._lock.mark_written()
+
+        # 2) Write the documents and the indexes. If this fails, recover()
+        # finishes it.
+        transaction.commit()
+        # The log record can only go once the documents are on disk
+        self.storage.wait_durable()
+        manager.write_pending(entries)
+        manager.sync_pointer_stores(entries)
+
+        # 3) Everything is on disk, so the record isn't needed anymore
+        self.commit_log.truncate()
+
+    def recover(self):
+        """Redo the writes that have been committed but may not have been written completely."""
+        # Most of the time there is nothing to redo, so don't keep other
+        # processes waiting for the lock
+        if not self.commit_log.size:
+            return
+
+        with self._lock.write():
+            records = list(self.commit_log.records())
+            if not records:
+                return
+
+            self._lock.mark_written()
+
+            for record in records:
+                # Writing the same documents and entries again is harmless
+                changes = int_keys(record['changes'])
+                if changes:
+                    data = self.storage.read() or {}
+                    apply_changes(data, changes)
+                    self.storage.write_changes(data, changes)
+
+                for alias, (jsonpath, index_type, pairs) in record['entries'].items():
+                    pairs = [(bytes.fromhex(key) if index_type == "TEXT" else key, doc_id)
+                             for key, doc_id in pairs]
+                    self.index_manager.redo_entries(alias, jsonpath, index_type, pairs)
+
+            flush = getattr(self.storage, 'flush', None)
+            if flush is not None:
+                flush()
+            self.storage.wait_durable()
+
+            self.commit_log.truncate()
+
+    def close(self):
+        super().close()
+        self.commit_log.close()
+
+    def index_pairs(self, alias):
+        """The (key, doc_id) pairs an index should contain according to the documents."""
+        for doc_id, doc in self.table(self.default_table_name)._read_table().items():
+            for key in self.document_keys(alias, doc, check=False):
+                yield key, doc_id
+
+    def verify_index(self, alias):
+        """
+        Check an index against the documents. Returns the keys whose entries
+        are wrong as (key, expected doc ids, indexed doc ids), so an empty
+        list means the index is intact.
+        """
+        if alias not in self.index_manager.index_specs:
+            raise KeyError(f"No such index: {alias}")
+
+        with self._lock.read():
+            return self.index_manager.verify(alias, self.index_pairs(alias))
+
+    def repair_index(self, alias):
+        """
+        Fix the keys verify_index reports without rebuilding the index, e.g.
+        after a crash or for documents inserted before the index has been
+        created. Returns the fixed keys like verify_index.
+        """
+        if alias not in self.index_manager.index_specs:
+            raise KeyError(f"No such index: {alias}")
+
+        with self._lock.write():
+            divergent = self.index_manager.verify(alias, self.index_pairs(alias))
+            if divergent:
+                self.index_manager.repair(alias, divergent)
+
+            return divergent
+
+    def index_key(self, value, index_type):
+        """The key an indexed value is stored under, or None if it isn't indexed."""
+        if value is None or isinstance(value, dict):
+            return None
+
         if index_type == "TEXT":
-            key_bytes = str_to_bytes(value, self.index_manager.max_index_text_len)
+            # Only strings are indexed as text
+            if not isinstance(value, str):
+                return None
+
+            return str_to_bytes(value, self.index_manager.max_index_text_len)
         elif index_type == "NUMERIC":
-            key_bytes = value
+            return value
+
+    def extractor(self, alias, jsonpath):
+        """The compiled JSONPath of an index."""
+        extract = self.extractors.get(alias)
+        if extract is None:
+            extract = self.extractors[alias] = compile_jsonpath(jsonpath)
+
+        return extract
+
+    def index_keys(self, document):
+        """
+        The keys of a document in every index as {alias: [key, ...]}, with
+        one extraction pass over the indexes. Paths with wildcards or
+        descent give a key for each value they match.
+
+        Raises a ValueError if an indexed value is too long to be indexed,
+        so documents can be checked before anything is written.
+        """
+        return {alias: self.document_keys(alias, document)
+                for alias in self.index_manager.index_specs}
+
+    def document_keys(self, alias, document, check=True):
+        """
+        The keys of a document in one index, without repeats. Writes and
+        verify_index both get the keys from here, so they agree on what an
+        index contains.
+
+        Values that are too long to be indexed raise a ValueError with
+        ``check`` and are left out without.
+        """
+        jsonpath, index_type, _, _ = self.index_manager.index_specs[alias]
+        extract = self.extractor(alias, jsonpath)
+        value = extract(document)
+        max_len = self.index_manager.max_index_text_len
+
+        keys = []
+        for value in (value if extract.multiple else (value,)):
+            key = self.index_key(value, index_type)
+            if key is None:
+                continue
+
+            # The indexed value has longer length than the max_index_text_len which may lead error when querying
+            if index_type == 'TEXT' and len(value) > max_len:
+                if check:
+                    raise ValueError(f'Indexed value: {value} has length longer than max_index_text_len: {max_len}')
+                continue
+
+            if key not in keys:
+                keys.append(key)
+
+        return keys
+
+    def check_index_values(self, document):
+        """Raise a ValueError if an indexed value of the document is too long to be indexed."""
+        self.index_keys(document)
+
+    def update_index(self, value, alias, doc_id, index_type):
+        key_bytes = self.index_key(value, index_type)
+        if key_bytes is None:
+            return
 
         self.index_manager.update_index(alias, key_bytes, doc_id)
 
 
     def extract_by_jsonpath(self, doc: dict, path):
-        if not path.startswith("$."):
-            raise ValueError("Unsupported JSONPath format")
-        parts = path[2:].split(".")
-        value = doc
-        for part in parts:
-            if isinstance(value, dict) and part in value:
-                value = value[part]
-            else:
-                return None  # Path does not exist in document
-        return value
+        return compile_jsonpath(path)(doc)
 
     
     def insert(self, document: dict):
         """Insert a document and update indexes."""
-        doc_id = self.table(self.default_table_name).insert(document)  # FIXED
+        with self.transaction():
+            # Check the document before writing anything
+            keys_by_alias = self.index_keys(document)
+
+            doc_id = self.table(self.default_table_name).insert(document)  # FIXED
+
+            for alias, keys in keys_by_alias.items():
+                for key_bytes in keys:
+                    self.index_manager.update_index(alias, key_bytes, doc_id)
 
-        for alias, (jsonpath, index_type, _, _) in self.index_manager.index_specs.items():
-            value = self.extract_by_jsonpath(document, jsonpath)
-            
-            # The indexed value has longer length than the max_index_text_len which may lead error when querying
-            if value and index_type == 'TEXT' and len(value) > self.index_manager.max_index_text_len:
-                self.table(self.default_table_name).remove(doc_ids=[doc_id])
-                raise ValueError (f'Indexed value: {value} has length longer than max_index_text_len: {self.index_manager.max_index_text_len}' )
-        
-        # I'm lazy I don't want to figure it out a better way to implement this
-        for alias, (jsonpath, index_type, _, _) in self.index_manager.index_specs.items():
-            value = self.extract_by_jsonpath(document, jsonpath)
-            self.update_index(value, alias, doc_id, index_type)
-        
         return doc_id
 
 
@@ -69,49 +270,125 @@ class IndexedTinyDB(TinyDB):
 
         !! If the target json are not empty then you must use normal insert or else it will fail !!
         """
-        # 1) Insert into TinyDB and get all new doc_ids
-        doc_ids = self.table(self.default_table_name).insert_multiple(documents)
+        # The documents are read twice
+        documents = list(documents)
 
-        # 2) Prepare a list of (key_bytes, doc_id) for each index alias
-        pairs_by_alias = {
-            alias: []
-            for alias in self.index_manager.index_specs
-        }
+        with self.transaction():
+            # Extract the keys, which checks the documents before writing
+            # anything
+            keys = [self.index_keys(document) for document in documents]
 
-        # 3) For each new document, extract every indexed field
-        for doc_id, doc in zip(doc_ids, documents):
-            for alias, (jsonpath, index_type, _, _) in self.index_manager.index_specs.items():
-                value = self.extract_by_jsonpath(doc, jsonpath)
-                if value is None or isinstance(value, dict):
-                    continue
+            # 1) Insert into TinyDB and get all new doc_ids
+            doc_ids = self.table(self.default_table_name).insert_multiple(documents)
 
-                if index_type == "TEXT":
-                    key_bytes = str_to_bytes(value, self.index_manager.max_index_text_len)
-                else:  # "NUMERIC"
-                    key_bytes = value  # already an int
+            # 2) Prepare a list of (key_bytes, doc_id) for each index alias
+            pairs_by_alias = {
+                alias: []
+                for alias in self.index_manager.index_specs
+            }
 
-                pairs_by_alias[alias].append((key_bytes, doc_id))
+            # 3) Pair the keys of each new document with its doc_id
+            for doc_id, keys_by_alias in zip(doc_ids, keys):
+                for alias, alias_keys in keys_by_alias.items():
+                    for key_bytes in alias_keys:
+                        pairs_by_alias[alias].append((key_bytes, doc_id))
 
-        # 4) Bulk‐update each index in one call
-        for alias, pairs in pairs_by_alias.items():
-            if pairs:
-                self.index_manager.batch_update_index(alias, pairs)
+            # 4) Bulk‐update each index in one call, written along with the
+            # documents when the transaction commits
+            for alias, pairs in pairs_by_alias.items():
+                if pairs:
+                    self.index_manager.batch_update_index(alias, pairs)
 
         # 5) Return all inserted IDs
         return doc_ids
 
   
-    def search(self, query):
-        """Perform indexed search before full scan."""
+    def iter_search(self, query) -> Iterator[Mapping]:
+        """
+        Search lazily, one document at a time. Stopping early skips the
+        rest of the index walk or table scan.
+
+        Index searches yield the documents in index order. Like
+        Table.iter_search, they don't hold the lock while the caller
+        handles the documents, so writes don't wait for them.
+
+        Exact matches yield the documents the table had when iterating
+        started. Range searches walk the B+Tree in chunks (see
+        IndexManager.iter_btree_chunks) and read the documents of each
+        chunk along with their index entries, so documents written while
+        iterating show up in their new version in later chunks.
+        """
+        table = self.table(self.default_table_name)
+
+        if not isinstance(query, (tuple, dict)):
+            yield from table.iter_search(query)
+            return
+
+        if isinstance(query, dict):  # {'age': (min, max)}
+            key, (min_v, max_v) = list(query.items())[0]
+
+            def read(doc_ids):
+                documents = table._read_table()
+                return [(doc_id, documents[doc_id]) for doc_id in doc_ids
+                        if doc_id in documents]
+
+            for chunk in self.index_manager.iter_btree_chunks(key, min_v, max_v, read):
+                for doc_id, doc in chunk:
+                    yield table.document_class(doc, table.document_id_class(doc_id))
+            return
+
+        # (key, value) for exact match. Pin the current version of the
+        # table under the lock, but read the documents outside of it.
+        key, value = query
+        with self._lock.read():
+            doc_ids = self.index_manager.search_hash(key, value)
+            documents = table._read_table()
+            pinned = isinstance(documents, dict)
+            if pinned:
+                table._pin_table(documents)
+
+        if not pinned:
+            yield from table._iter_unpinned(doc_ids)
+            return
+
+        try:
+            for doc_id in doc_ids:
+                doc = documents.get(doc_id)
+                if doc is not None:
+                    yield table.document_class(doc, table.document_id_class(doc_id))
+        finally:
+            table._unpin_table(documents)
+
+    def search(self, query, limit=None):
+        """
+        Perform indexed search before full scan.
+
+        With a ``limit``, at most that many documents are returned and the
+        search stops once they have been found (see :meth:`iter_search`).
+
+        Like :meth:`~tinydb.table.Table.search`, the documents are returned
+        as a :class:`~tinydb.utils.FrozenList`, which can't be modified.
+        """
+        if limit is not None:
+            # Close the iterator right away, so it unpins the table
+            with closing(self.iter_search(query)) as documents:
+                return FrozenList(islice(documents, limit))
+
         # print("query: ", query)
 
+        # Look up the index and the documents under one read lock, so they
+        # agree with each other
+        with self._lock.read():
+            return self._search(query)
+
+    def _search(self, query):
         # Handle exact match queries using Hash Index
         if isinstance(query, tuple):  # (key, value) for exact match
             key, value = query
             result = self.index_manager.search_hash(key, value)
 
             if result and all(isinstance(doc_id, int) for doc_id in result):
-                return self.table(self.default_table_name).get(doc_ids=result)  # ✅ Fix applied
+                return FrozenList(self.table(self.default_table_name).get(doc_ids=result))  # ✅ Fix applied
 
         # Handle range queries using B+ Tree
         elif isinstance(query, dict):  # {'age': (min, max)}
@@ -120,7 +397,7 @@ class IndexedTinyDB(TinyDB):
             doc_ids = self.index_manager.search_btree_range(key, min_v, max_v)
 
             if doc_ids and all(isinstance(doc_id, int) for doc_id in doc_ids):
-                return self.get(doc_ids=doc_ids)  # ✅ Fix applied
+                return FrozenList(self.get(doc_ids=doc_ids))  # ✅ Fix applied
 
 
         # If it's a TinyDB query object, fallback to normal search
@@ -128,4 +405,4 @@ class IndexedTinyDB(TinyDB):
             return self.table(self.default_table_name).search(query)
 
 
-        return []  # Return an empty list if query type is unsupported
\ No newline at end of file
+        return FrozenList()  # Return an empty list if query type is unsupported
\ No newline at end of file
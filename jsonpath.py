@@ -0,0 +1,222 @@
+"""
+Contains a compiler that turns the JSONPaths of indexes into plain Python
+functions.
+
+Extracting an indexed value used to split the JSONPath for every document
+and every index. The compiler parses a path once and generates a function
+that resolves it with a single chain of lookups:
+
+>>> extract = compile_jsonpath('$.user.tags[0]')
+>>> print(extract.source)
+def extract(doc):
+    try:
+        v = doc['user']['tags']
+        if not isinstance(v, list):
+            return None
+        v = v[0]
+    except (KeyError, IndexError, TypeError):
+        return None
+    return v
+
+Supported are keys (``.name`` or ``['name']``), list indices (``[n]``,
+negative indices count from the end), wildcards (``.*`` or ``[*]``) that
+match all elements of a list or values of a dict, and descent (``..name``)
+that matches at any depth. Paths with a wildcard or descent may match more
+than one value. Their functions return a list of all matches and have
+``multiple`` set. All other functions return the value or ``None`` if the
+path doesn't exist in the document.
+"""
+
+import re
+from typing import Any, Callable, Dict, Iterator, List, Tuple
+
+from .utils import LRUCache
+
+__all__ = ('compile_jsonpath',)
+
+#: The compiled paths by path
+_compiled: LRUCache = LRUCache(capacity=256)
+
+# A step of a path after '$': a key or wildcard after one or two dots, or
+# an index, quoted key or wildcard in brackets, optionally after two dots
+_STEP = re.compile(r"""
+    (?P<dots>\.\.?)(?P<name>\*|[^.\[\]]+)
+  | (?P<descend>\.\.)?\[(?:
+        (?P<index>-?\d+)
+      | '(?P<single>[^']*)'
+      | "(?P<double>[^"]*)"
+      | (?P<all>\*)
+    )\]
+""", re.VERBOSE)
+
+# The steps of a parsed path: kind ('key', 'index' or 'all'), the key or
+# index and whether the step descends into the value at any depth first
+Step = Tuple[str, Any, bool]
+
+
+def descend(value) -> Iterator:
+    """
+    Yield a value and all dicts and lists nested in it.
+    """
+    stack = [value]
+    while stack:
+        value = stack.pop()
+        yield value
+
+        if isinstance(value, dict):
+            children = value.values()
+        elif isinstance(value, list):
+            children = value
+        else:
+            continue
+
+        stack.extend(reversed([child for child in children
+                               if isinstance(child, (dict, list))]))
+
+
+def parse_jsonpath(path: str) -> List[Step]:
+    """
+    Split a JSONPath into its steps.
+
+    :raises ValueError: if the path isn't supported
+    """
+    if not path.startswith('$') or len(path) == 1:
+        raise ValueError('Unsupported JSONPath format')
+
+    steps: List[Step] = []
+    position = 1
+    while position < len(path):
+        match = _STEP.match(path, position)
+        if match is None:
+            raise ValueError('Unsupported JSONPath format: {!r} at {}'.format(
+                path, position))
+
+        if match['name'] is not None:
+            deep = match['dots'] == '..'
+            if match['name'] == '*':
+                steps.append(('all', None, deep))
+            else:
+                steps.append(('key', match['name'], deep))
+        else:
+            deep = match['descend'] is not None
+            if match['index'] is not None:
+                steps.append(('index', int(match['index']), deep))
+            elif match['all'] is not None:
+                steps.append(('all', None, deep))
+            else:
+                key = match['single'] if match['single'] is not None \
+                    else match['double']
+                steps.append(('key', key, deep))
+
+        position = match.end()
+
+    return steps
+
+
+class _Compiler:
+    def __init__(self):
+        self.lines: List[str] = ['def extract(doc):']
+        self.namespace: Dict[str, Any] = {'descend': descend}
+        self.loops = 0
+
+    def emit(self, indent: int, line: str) -> None:
+        self.lines.append('    ' * indent + line)
+
+    def single(self, steps: List[Step]) -> None:
+        """
+        Generate the code of a path that matches at most one value: the keys
+        are looked up in one expression, only indices need a check as they
+        must not index strings.
+        """
+        self.emit(1, 'try:')
+        lookup = 'doc'
+        for kind, key, _ in steps:
+            if kind == 'index':
+                self.emit(2, 'v = ' + lookup)
+                self.emit(2, 'if not isinstance(v, list):')
+                self.emit(3, 'return None')
+                lookup = 'v'
+
+            lookup += '[{!r}]'.format(key)
+
+        self.emit(2, 'v = ' + lookup)
+        self.emit(1, 'except (KeyError, IndexError, TypeError):')
+        self.emit(2, 'return None')
+        self.emit(1, 'return v')
+
+    def loop(self, indent: int, iterable: str) -> int:
+        name = 'v{}'.format(self.loops)
+        self.loops += 1
+        self.emit(indent, 'for {} in {}:'.format(name, iterable))
+        self.emit(indent + 1, 'v = ' + name)
+
+        return indent + 1
+
+    def multiple(self, steps: List[Step]) -> None:
+        """
+        Generate the code of a path that may match several values: each
+        wildcard and descent loops over the candidates, a candidate that
+        doesn't have the next step is skipped.
+        """
+        self.emit(1, 'r = []')
+        self.emit(1, 'v = doc')
+
+        indent = 1
+        for kind, key, deep in steps:
+            skip = 'continue' if self.loops else 'return r'
+
+            if deep:
+                indent = self.loop(indent, 'descend(v)')
+                skip = 'continue'
+
+            if kind == 'key':
+                self.emit(indent, 'if not isinstance(v, dict) or {!r} not in v:'
+                          .format(key))
+                self.emit(indent + 1, skip)
+                self.emit(indent, 'v = v[{!r}]'.format(key))
+            elif kind == 'index':
+                self.emit(indent, 'if not isinstance(v, list) or not '
+                          '-len(v) <= {0} < len(v):'.format(key))
+                self.emit(indent + 1, skip)
+                self.emit(indent, 'v = v[{}]'.format(key))
+            else:
+                indent = self.loop(
+                    indent, '(v.values() if isinstance(v, dict) else '
+                            'v if isinstance(v, list) else ())')
+
+        self.emit(indent, 'r.append(v)')
+        self.emit(1, 'return r')
+
+
+def compile_jsonpath(path: str) -> Callable[[Any], Any]:
+    """
+    Compile a JSONPath into a function that extracts its value(s) from a
+    document.
+
+    Compiled functions are cached by path.
+
+    :param path: The JSONPath, starting with ``$``.
+    :raises ValueError: if the path isn't supported
+    """
+    compiled = _compiled.get(path)
+    if compiled is not None:
+        return compiled
+
+    steps = parse_jsonpath(path)
+    multiple = any(kind == 'all' or deep for kind, _, deep in steps)
+
+    compiler = _Compiler()
+    if multiple:
+        compiler.multiple(steps)
+    else:
+        compiler.single(steps)
+
+    source = '\n'.join(compiler.lines)
+    exec(source, compiler.namespace)
+
+    compiled = compiler.namespace['extract']
+    compiled.source = source
+    compiled.multiple = multiple
+    _compiled[path] = compiled
+
+    return compiled
@@ -0,0 +1,312 @@
+"""
+Contains a log-structured storage that appends the changed documents to a
+log instead of rewriting the whole database on every write.
+"""
+
+import json
+import os
+import threading
+from typing import Dict, Any, List, Optional, Set
+
+from .storages import Storage, write_atomic
+
+__all__ = ('LogStorage',)
+
+
+def _apply_record(tables: Dict[str, Dict[str, Any]], record: Dict[str, Any]):
+    """
+    Apply a single log record to the database state.
+    """
+    if record.get('reset'):
+        # Everything logged before this record is obsolete
+        tables.clear()
+        return
+
+    name = record['t']
+
+    if record.get('drop'):
+        tables.pop(name, None)
+        return
+
+    table = tables.setdefault(name, {})
+
+    if 'k' in record:
+        if 'v' in record:
+            table[record['k']] = record['v']
+        else:
+            table.pop(record['k'], None)
+
+
+class LogStorage(Storage):
+    """
+    Store the data as an append-only log of JSON records.
+
+    The log lives in the directory ``path`` and is split into numbered
+    segment files. Every write appends one line per changed document to the
+    active segment, so the amount of data written depends on the size of
+    the change and not on the size of the database. On open, all segments
+    are replayed in order to rebuild the state in memory.
+
+    Overwritten and removed documents stay in the log until it is
+    compacted. Once the log contains :attr:`COMPACTION_RATIO` times more
+    records than live documents, a background thread writes the live
+    documents into a new segment and deletes the segments it replaces.
+
+    Each line contains one of these records::
+
+        {"t": table}                    the table has been created
+        {"t": table, "k": id, "v": doc} a document has been written
+        {"t": table, "k": id}           a document has been removed
+        {"t": table, "drop": true}      the table has been dropped
+        {"reset": true}                 all previous records are obsolete
+    """
+
+    #: Start a new segment once the active one grows beyond this size
+    SEGMENT_SIZE = 16 * 1024 * 1024
+
+    #: Compact once the log holds this many records per live document
+    COMPACTION_RATIO = 2.0
+
+    #: Don't bother compacting logs with fewer records than this
+    COMPACTION_MIN_RECORDS = 1000
+
+    def __init__(self, path: str, **kwargs):
+        """
+        Create a new instance.
+
+        Also creates the log directory if it doesn't exist yet.
+
+        :param path: The directory that holds the log segments.
+        :param kwargs: Arguments passed to ``json.dumps``. As every record
+                       has to fit on a single line, ``indent`` is ignored.
+        """
+
+        super().__init__()
+
+        kwargs.pop('indent', None)
+        self.kwargs = kwargs
+
+        self._path = path
+        os.makedirs(path, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._compactor: Optional[threading.Thread] = None
+
+        self._data: Dict[str, Dict[str, Any]] = {}
+
+        # Sequence numbers of all segments and the number of records
+        # each of them holds
+        self._segments: Dict[int, int] = {}
+
+        for file_name in os.listdir(path):
+            stem, ext = os.path.splitext(file_name)
+            if ext == '.log' and stem.isdigit():
+                self._segments[int(stem)] = 0
+
+        self._replay()
+
+        # The tables that have been recorded in the log
+        self._known: Set[str] = set(self._data)
+
+        # Open the last segment for appending or start the first one
+        self._active = max(self._segments, default=1)
+        self._segments.setdefault(self._active, 0)
+        self._handle = open(self._segment_path(self._active), 'ab')
+
+    def _segment_path(self, seq: int) -> str:
+        return os.path.join(self._path, '{:08d}.log'.format(seq))
+
+    def _replay(self):
+        """
+        Rebuild the database state by applying all segments in order.
+        """
+        last = max(self._segments, default=None)
+
+        for seq in sorted(self._segments):
+            offset = 0
+
+            with open(self._segment_path(seq), 'rb+') as handle:
+                for line in handle:
+                    if not line.endswith(b'\n'):
+                        # A write has been interrupted. The incomplete
+                        # record can only be at the end of the last
+                        # segment, so we cut it off
+                        if seq != last:
+                            raise ValueError('Corrupt log segment {}'.format(
+                                self._segment_path(seq)))
+
+                        handle.truncate(offset)
+                        break
+
+                    _apply_record(self._data, json.loads(line))
+                    self._segments[seq] += 1
+                    offset += len(line)
+
+    def _read_segments(self, seqs: List[int]) -> Dict[str, Dict[str, Any]]:
+        """
+        Rebuild the database state from complete segments.
+        """
+        data: Dict[str, Dict[str, Any]] = {}
+        for seq in seqs:
+            with open(self._segment_path(seq), 'rb') as handle:
+                for line in handle:
+                    _apply_record(data, json.loads(line))
+
+        return data
+
+    def _encode(self, records: List[Dict[str, Any]]) -> bytes:
+        return b''.join(
+            json.dumps(record, **self.kwargs).encode('utf-8') + b'\n'
+            for record in records
+        )
+
+    def _append(self, records: List[Dict[str, Any]]):
+        """
+        Append records to the active segment and make sure they are written
+        to disk. The caller has to hold ``self._lock``.
+        """
+        self._handle.write(self._encode(records))
+        self._handle.flush()
+        os.fsync(self._handle.fileno())
+
+        self._segments[self._active] += len(records)
+
+        if self._handle.tell() >= self.SEGMENT_SIZE:
+            self._roll_over()
+
+    def _roll_over(self):
+        """
+        Seal the active segment and start a new one. The caller has to hold
+        ``self._lock``.
+        """
+        self._handle.close()
+
+        self._active += 1
+        self._segments[self._active] = 0
+        self._handle = open(self._segment_path(self._active), 'ab')
+
+    def _write_snapshot(self, seq: int, data: Dict[str, Dict[str, Any]]) -> int:
+        """
+        Write all documents in ``data`` as segment ``seq``, replacing any
+        segment with that number atomically.
+
+        :returns: the number of records written
+        """
+        records: List[Dict[str, Any]] = [{'reset': True}]
+        for name, table in data.items():
+            records.append({'t': name})
+            records.extend({'t': name, 'k': doc_id, 'v': doc}
+                           for doc_id, doc in table.items())
+
+        write_atomic(self._segment_path(seq), self._encode(records))
+
+        return len(records)
+
+    def _drop_segments_before(self, seq: int):
+        """
+        Delete all segments that are older than ``seq``. The caller has to
+        hold ``self._lock``.
+        """
+        for old in [s for s in self._segments if s < seq]:
+            os.remove(self._segment_path(old))
+            del self._segments[old]
+
+    def _needs_compaction(self) -> bool:
+        records = sum(self._segments.values())
+        live = sum(len(table) + 1 for table in self._data.values())
+
+        return (records >= self.COMPACTION_MIN_RECORDS
+                and records > live * self.COMPACTION_RATIO)
+
+    def _compact(self):
+        """
+        Replace all sealed segments by a single segment that only holds the
+        live documents.
+        """
+        with self._lock:
+            # Seal the active segment, so writers can keep appending to a
+            # new one while we rewrite the sealed ones
+            sealed = self._active
+            self._roll_over()
+
+            segments = sorted(seq for seq in self._segments if seq <= sealed)
+
+        # The tables in memory are changed in place by writers before they
+        # are committed (and by transactions that may be rolled back), so we
+        # rebuild the snapshot from the sealed segments, which only hold
+        # committed writes
+        snapshot = self._read_segments(segments)
+
+        count = self._write_snapshot(sealed, snapshot)
+
+        with self._lock:
+            self._segments[sealed] = count
+            self._drop_segments_before(sealed)
+
+    def compact(self) -> None:
+        """
+        Compact the log in the background unless a compaction is running
+        already.
+        """
+        if self._compactor is not None and self._compactor.is_alive():
+            return
+
+        self._compactor = threading.Thread(target=self._compact, daemon=True)
+        self._compactor.start()
+
+    def read(self) -> Optional[Dict[str, Dict[str, Any]]]:
+        return self._data
+
+    def write(self, data: Dict[str, Dict[str, Any]]):
+        # Without knowing what has changed we have to rewrite everything,
+        # so we write a new segment that replaces all others
+        self._wait_for_compaction()
+
+        with self._lock:
+            self._data = data
+            self._known = set(data)
+            self._roll_over()
+
+            seq = self._active
+            self._handle.close()
+            self._segments[seq] = self._write_snapshot(seq, data)
+            self._drop_segments_before(seq)
+
+            self._handle = open(self._segment_path(seq), 'ab')
+
+    def write_changes(self, data, changes):
+        records: List[Dict[str, Any]] = []
+
+        for name, docs in changes.items():
+            if docs is None:
+                records.append({'t': name, 'drop': True})
+                self._known.discard(name)
+                continue
+
+            # Record new tables, so they are kept even if they are empty
+            if name not in self._known:
+                records.append({'t': name})
+                self._known.add(name)
+
+            for doc_id, doc in docs.items():
+                if doc is None:
+                    records.append({'t': name, 'k': doc_id})
+                else:
+                    records.append({'t': name, 'k': doc_id, 'v': doc})
+
+        with self._lock:
+            self._data = data
+            self._append(records)
+
+            needs_compaction = self._needs_compaction()
+
+        if needs_compaction:
+            self.compact()
+
+    def _wait_for_compaction(self):
+        if self._compactor is not None:
+            self._compactor.join()
+
+    def close(self) -> None:
+        self._wait_for_compaction()
+        self._handle.close()
@@ -2,9 +2,16 @@
 Contains the :class:`base class <tinydb.middlewares.Middleware>` for
 middlewares and implementations.
 """
+import threading
+import time
+import warnings
 from typing import Optional
 
 from tinydb_test import Storage
+from .process_lock import ProcessLock
+from .storages import apply_changes, int_keys
+from .utils import estimate_size
+from .wal import WriteAheadLog
 
 
 class Middleware:
@@ -64,6 +71,39 @@ class Middleware:
 
         return self
 
+    def write_changes(self, data, changes):
+        """
+        Write the current state of the database, knowing which documents
+        have changed.
+
+        Middlewares hook into ``write``, so unless a middleware knows how to
+        handle partial writes, they are routed through ``write`` instead of
+        being forwarded to the underlying storage.
+        """
+
+        self.write(data)
+
+    def search_table(self, name, cond):
+        """
+        Search a table without reading it.
+
+        The underlying storage may not know about changes a middleware
+        holds back, so unless a middleware knows better, the table is
+        scanned instead.
+        """
+
+        return None
+
+    def table_meta(self, name):
+        """
+        Get the metadata of a table without reading it.
+
+        For the same reason as with :meth:`search_table`, the metadata is
+        unknown unless a middleware knows better.
+        """
+
+        return None
+
     def __getattr__(self, name):
         """
         Forward all unknown attribute calls to the underlying storage, so we
@@ -80,12 +120,35 @@ class CachingMiddleware(Middleware):
     This Middleware aims to improve the performance of TinyDB by writing only
     the last DB state every :attr:`WRITE_CACHE_SIZE` time and reading always
     from cache.
+
+    The middleware keeps track of the documents that have changed since the
+    last flush, so storages that can write partial updates (see
+    :meth:`~tinydb.storages.Storage.write_changes`) only have to write these
+    documents when the cache is flushed.
+
+    By default, the cache is flushed by the write that fills it. Passing
+    ``max_age`` (in seconds) or ``max_bytes`` moves flushing to a background
+    thread instead, so writers never wait for a flush::
+
+        TinyDB('db.json', storage=CachingMiddleware(JSONStorage, max_age=1.0))
+
+    The thread flushes the cache once the oldest unwritten change is
+    ``max_age`` seconds old, once the changed documents take up roughly
+    ``max_bytes`` bytes or once :attr:`WRITE_CACHE_SIZE` writes have been
+    cached, whichever comes first.
+
+    With a ``lock_file`` (see :class:`~tinydb.process_lock.ProcessLock`),
+    every write is flushed before the lock is released. Otherwise the next
+    flush would write the cached tables over what other processes have
+    written in the meantime. Reads are still served from the cache until
+    another process writes.
     """
 
     #: The number of write operations to cache before writing to disc
     WRITE_CACHE_SIZE = 1000
 
-    def __init__(self, storage_cls):
+    def __init__(self, storage_cls, max_age: Optional[float] = None,
+                 max_bytes: Optional[int] = None):
         # Initialize the parent constructor
         super().__init__(storage_cls)
 
@@ -93,35 +156,378 @@ class CachingMiddleware(Middleware):
         self.cache = None
         self._cache_modified_count = 0
 
+        # The documents that have changed since the last flush by table, or
+        # ``None`` if the changes are unknown and the whole state has to be
+        # written
+        self._changes: Optional[dict] = {}
+
+        self.max_age = max_age
+        self.max_bytes = max_bytes
+
+        # The estimated size of the changed documents and when the oldest
+        # unwritten change has been made
+        self._cache_modified_bytes = 0
+        self._dirty_since: Optional[float] = None
+
+        # The database's lock, which keeps writers from changing the tables
+        # while the background flusher copies them, see use_lock
+        self._db_lock = None
+
+        # Protects the cache state from the background flusher
+        self._lock = threading.Lock()
+        # Makes sure only one flush runs at a time
+        self._flush_lock = threading.Lock()
+
+        self._flusher: Optional[threading.Thread] = None
+        self._wakeup = threading.Event()
+        self._stop = threading.Event()
+
+    def __call__(self, *args, **kwargs):
+        super().__call__(*args, **kwargs)
+
+        if self.max_age is not None or self.max_bytes is not None:
+            self._flusher = threading.Thread(target=self._flush_periodically,
+                                             daemon=True)
+            self._flusher.start()
+
+        return self
+
+    def use_lock(self, lock):
+        self._db_lock = lock
+        self.storage.use_lock(lock)
+
+        if isinstance(lock, ProcessLock):
+            lock.on_commit(self.flush)
+
     def read(self):
         if self.cache is None:
-            # Empty cache: read from the storage
-            self.cache = self.storage.read()
+            with self._lock:
+                # Empty cache: read from the storage, unless another thread
+                # has done so in the meantime
+                if self.cache is None:
+                    self.cache = self.storage.read()
 
         # Return the cached data
         return self.cache
 
     def write(self, data):
-        # Store data in cache
-        self.cache = data
+        with self._lock:
+            # Store data in cache. As we don't know what has changed, the
+            # whole state has to be written on the next flush
+            self.cache = data
+            self._changes = None
+
+            flush = self._count_write()
+
+        if flush:
+            self.flush()
+
+    def write_changes(self, data, changes):
+        with self._lock:
+            # Store data in cache and remember the changed documents
+            self.cache = data
+            self._merge_changes(changes)
+
+            if self.max_bytes is not None:
+                self._cache_modified_bytes += sum(
+                    estimate_size(doc)
+                    for docs in changes.values() if docs is not None
+                    for doc in docs.values()
+                )
+
+            flush = self._count_write()
+
+        if flush:
+            self.flush()
+
+    def search_table(self, name, cond):
+        # The storage can only search tables without unwritten changes. The
+        # flush lock makes sure no flush changes them during the search.
+        with self._flush_lock:
+            with self._lock:
+                if self._changes is None or name in self._changes:
+                    return None
+
+            return self.storage.search_table(name, cond)
+
+    def invalidate(self):
+        with self._lock:
+            # Changes that haven't been written yet would be lost, so we only
+            # drop a clean cache. With a ProcessLock, writes are flushed
+            # before other processes can write, so the cache is clean.
+            if self._cache_modified_count == 0:
+                self.cache = None
+
+        self.storage.invalidate()
+
+    def table_meta(self, name):
+        # Only the metadata of tables without unwritten changes is known
+        with self._flush_lock:
+            with self._lock:
+                if self._changes is None or name in self._changes:
+                    return None
+
+            return self.storage.table_meta(name)
+
+    def _merge_changes(self, changes):
+        """
+        Add changes to the changes since the last flush. The caller has to
+        hold ``self._lock``.
+        """
+        if self._changes is None:
+            return
+
+        for name, docs in changes.items():
+            if docs is None:
+                self._changes[name] = None
+            elif name in self._changes and self._changes[name] is None:
+                # The table has been dropped and created again. As we don't
+                # know which documents the dropped table had, we have to
+                # write the whole state
+                self._changes = None
+                return
+            else:
+                self._changes.setdefault(name, {}).update(docs)
+
+    def _count_write(self) -> bool:
+        """
+        Count a write. The caller has to hold ``self._lock``.
+
+        :returns: whether the caller has to flush the cache
+        """
         self._cache_modified_count += 1
+        if self._dirty_since is None:
+            self._dirty_since = time.monotonic()
 
         # Check if we need to flush the cache
-        if self._cache_modified_count >= self.WRITE_CACHE_SIZE:
-            self.flush()
+        full = self._cache_modified_count >= self.WRITE_CACHE_SIZE or (
+            self.max_bytes is not None
+            and self._cache_modified_bytes >= self.max_bytes
+        )
+
+        if full and self._flusher is not None:
+            # Let the background thread do the work
+            self._wakeup.set()
+            return False
+
+        return full
 
     def flush(self):
         """
         Flush all unwritten data to disk.
         """
-        if self._cache_modified_count > 0:
-            # Force-flush the cache by writing the data to the storage
-            self.storage.write(self.cache)
-            self._cache_modified_count = 0
+        # Writers change the tables in place, so we hold the database's lock
+        # (if we know it) while we look at them. It's taken before our own
+        # locks, as writers hold it when they flush.
+        db_lock = self._db_lock
+        held = db_lock is not None
+        if held:
+            db_lock.acquire_read()
+
+        try:
+            with self._flush_lock:
+                with self._lock:
+                    if self._cache_modified_count == 0:
+                        return
+
+                    changes = self._changes
+                    data = self.cache
+                    if self._flusher is not None:
+                        # Writers keep updating the cache while we flush, so
+                        # we write a snapshot of it. Documents are never
+                        # modified in place, so a shallow copy of the tables
+                        # is enough.
+                        data = {name: table.copy() if isinstance(table, dict)
+                                else table
+                                for name, table in dict(data).items()}
+
+                    self._changes = {}
+                    self._cache_modified_count = 0
+                    self._cache_modified_bytes = 0
+                    self._dirty_since = None
+
+                if held and self._flusher is not None:
+                    # We've got the snapshot, so writers may continue while
+                    # we write it
+                    db_lock.release_read()
+                    held = False
+
+                try:
+                    # Force-flush the cache by writing the changes (or the
+                    # whole data if we don't know what has changed) to the
+                    # storage
+                    if changes is None:
+                        self.storage.write(data)
+                    else:
+                        self.storage.write_changes(data, changes)
+                        self.storage.wait_durable()
+                except BaseException:
+                    # Keep the changes around for the next flush
+                    with self._lock:
+                        newer = self._changes
+                        self._changes = changes
+                        if newer is None:
+                            self._changes = None
+                        else:
+                            self._merge_changes(newer)
+
+                        self._cache_modified_count += 1
+                        if self._dirty_since is None:
+                            self._dirty_since = time.monotonic()
+
+                    raise
+        finally:
+            if held:
+                db_lock.release_read()
+
+    def _flush_periodically(self):
+        while not self._stop.is_set():
+            timeout = None
+            if self.max_age is not None:
+                dirty_since = self._dirty_since
+                timeout = self.max_age if dirty_since is None else \
+                    max(0.0, dirty_since + self.max_age - time.monotonic())
+
+            self._wakeup.wait(timeout)
+            self._wakeup.clear()
+
+            try:
+                self.flush()
+            except Exception as e:
+                warnings.warn('Flushing the cache failed: {!r}'.format(e))
+
+                # Don't retry in a tight loop
+                self._stop.wait(self.max_age or 1.0)
 
     def close(self):
+        # Stop the background flusher
+        if self._flusher is not None:
+            self._stop.set()
+            self._wakeup.set()
+            self._flusher.join()
+
         # Flush potentially unwritten data
         self.flush()
 
         # Let the storage clean up too
         self.storage.close()
+
+
+class WALMiddleware(Middleware):
+    """
+    Make writes durable by appending the changed documents to a write-ahead
+    log instead of writing the whole database to the storage.
+
+    The log is replayed on top of the storage's contents when the data is
+    read for the first time, so all committed writes survive a crash. Once
+    the log grows beyond :attr:`CHECKPOINT_SIZE` bytes, the current state
+    is written to the storage and the log is emptied.
+
+    How often the log is synced to disk can be chosen per deployment, see
+    :class:`~tinydb.wal.WriteAheadLog`::
+
+        TinyDB('db.json', storage=WALMiddleware(JSONStorage,
+                                                durability='interval',
+                                                sync_interval=0.1))
+
+    By default the log is stored next to the database file as
+    ``<path>.wal``.
+
+    :meth:`write_changes` only appends to the log. The writing thread waits
+    for its record to be synced in :meth:`wait_durable`, which the database
+    calls after releasing its lock. That way, threads committing at the same
+    time share a sync (group commit).
+    """
+
+    #: The size of the log in bytes that triggers a checkpoint
+    CHECKPOINT_SIZE = 16 * 1024 * 1024
+
+    def __init__(self, storage_cls, durability='commit', sync_interval=0.05,
+                 wal_path: Optional[str] = None):
+        super().__init__(storage_cls)
+
+        self._durability = durability
+        self._sync_interval = sync_interval
+        self._wal_path = wal_path
+
+        self.wal: WriteAheadLog = None  # type: ignore
+        self.cache = None
+
+        # Serializes checkpoints with the writes that trigger them
+        self._lock = threading.Lock()
+
+        # The last record each thread has appended but not waited for
+        self._local = threading.local()
+
+    def __call__(self, *args, **kwargs):
+        super().__call__(*args, **kwargs)
+
+        wal_path = self._wal_path
+        if wal_path is None:
+            if not args or not isinstance(args[0], str):
+                raise ValueError('Cannot derive the log path from the '
+                                 'storage arguments, pass wal_path')
+            wal_path = args[0] + '.wal'
+
+        self.wal = WriteAheadLog(wal_path, self._durability,
+                                 self._sync_interval)
+
+        return self
+
+    def read(self):
+        if self.cache is None:
+            # Restore the last checkpoint and replay the writes committed
+            # after it
+            self.cache = self.storage.read() or {}
+            for changes in self.wal.records():
+                # The log stores document IDs as strings
+                apply_changes(self.cache, int_keys(changes))
+
+        return self.cache
+
+    def write(self, data):
+        # A full write replaces everything in the log, so we can write it
+        # to the storage right away
+        with self._lock:
+            self.cache = data
+            self._checkpoint()
+
+    def write_changes(self, data, changes):
+        with self._lock:
+            self.cache = data
+            self._local.lsn = self.wal.append(changes)
+
+        if self.wal.size >= self.CHECKPOINT_SIZE:
+            self.checkpoint()
+
+    def wait_durable(self):
+        lsn = getattr(self._local, 'lsn', None)
+        if lsn is not None:
+            self._local.lsn = None
+            self.wal.commit(lsn)
+
+    def table_meta(self, name):
+        # The storage only knows the tables without logged changes
+        if self.wal.size:
+            return None
+
+        return self.storage.table_meta(name)
+
+    def _checkpoint(self):
+        self.storage.write(self.cache)
+        self.wal.truncate()
+
+    def checkpoint(self):
+        """
+        Write the current state to the storage and empty the log.
+        """
+        with self._lock:
+            if self.cache is not None:
+                self._checkpoint()
+
+    def close(self):
+        # Leave a complete database in the storage
+        self.checkpoint()
+
+        self.wal.close()
+        self.storage.close()
@@ -0,0 +1,245 @@
+"""
+Contains a storage that keeps every table in a file of its own.
+"""
+
+import json
+import os
+from collections.abc import MutableMapping
+from typing import Dict, Any, Iterator, List, Optional, Union
+
+from .serialization import Codec, get_codec
+from .storages import Storage, TableMeta, int_keys, table_meta, write_atomic
+
+__all__ = ('MultiFileStorage',)
+
+
+class _LazyTables(MutableMapping):
+    """
+    The tables of a :class:`MultiFileStorage`.
+
+    The table names are known from the manifest, but a table's file is only
+    read when the table is accessed.
+    """
+
+    def __init__(self, storage: 'MultiFileStorage'):
+        self._storage = storage
+        self._names = dict.fromkeys(storage._manifest['tables'])
+        self._tables: Dict[str, Dict[int, Any]] = {}
+
+    def __getitem__(self, name: str):
+        if name not in self._tables:
+            if name not in self._names:
+                raise KeyError(name)
+
+            self._tables[name] = self._storage._read_table(name)
+
+        return self._tables[name]
+
+    def __setitem__(self, name: str, table) -> None:
+        self._names[name] = None
+        self._tables[name] = table
+
+    def __delitem__(self, name: str) -> None:
+        del self._names[name]
+        self._tables.pop(name, None)
+
+    def __contains__(self, name: object) -> bool:
+        return name in self._names
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._names)
+
+    def __len__(self) -> int:
+        return len(self._names)
+
+
+class MultiFileStorage(Storage):
+    """
+    Store every table in a file of its own.
+
+    The files live in the directory ``path`` along with a small manifest
+    that lists the tables and their files. Reading the data only reads the
+    manifest, a table's file is read when the table is accessed. Writes only
+    rewrite the files of the tables that have changed, so writing to a small
+    table doesn't rewrite a large one.
+
+    The manifest also holds the metadata of every table (see
+    :meth:`~tinydb.storages.Storage.table_meta`), so counting a table's
+    documents doesn't read its file.
+
+    Like :class:`~tinydb.storages.JSONStorage`, tables are stored as JSON
+    using the keyword arguments passed to the storage, unless a ``codec``
+    is passed.
+    """
+
+    #: The name of the manifest file
+    MANIFEST = 'manifest.json'
+
+    def __init__(self, path: str, codec: Optional[Union[str, Codec]] = None,
+                 **kwargs):
+        """
+        Create a new instance.
+
+        Also creates the directory, if it doesn't exist.
+
+        :param path: The directory to store the table files in.
+        :param codec: The codec (or name of the codec) to serialize tables
+                      with.
+        """
+
+        super().__init__()
+
+        self._path = path
+        self._codec = get_codec(codec) if codec is not None else None
+        self.kwargs = kwargs
+
+        os.makedirs(path, exist_ok=True)
+
+        self._read_manifest()
+
+    def _read_manifest(self):
+        manifest_path = os.path.join(self._path, self.MANIFEST)
+        if os.path.exists(manifest_path):
+            with open(manifest_path, 'rb') as handle:
+                self._manifest = json.load(handle)
+        else:
+            self._manifest = {'tables': {}, 'next_file': 1}
+
+    def _table_path(self, name: str) -> str:
+        return os.path.join(self._path, self._manifest['tables'][name])
+
+    def _table_paths(self, name: str) -> List[str]:
+        """
+        Get the paths of all files a table is stored in.
+        """
+        return [self._table_path(name)]
+
+    def _table_size(self, name: str) -> Optional[int]:
+        try:
+            return sum(os.path.getsize(path) for path in self._table_paths(name))
+        except OSError:
+            return None
+
+    def _update_meta(self, name: str, table, changed=None):
+        """
+        Update the metadata of a table that has just been written.
+
+        :param changed: The documents that have changed or ``None`` if they
+                        are unknown.
+        """
+        meta = self._manifest.setdefault('meta', {})
+        meta[name] = table_meta(table, self._table_size(name), meta.get(name),
+                                changed)
+
+    def _write_manifest(self):
+        write_atomic(os.path.join(self._path, self.MANIFEST),
+                     json.dumps(self._manifest).encode('utf-8'))
+
+    def _encode(self, table) -> bytes:
+        if self._codec is not None:
+            return self._codec.encode(table)
+
+        return json.dumps(table, **self.kwargs).encode('utf-8')
+
+    def _decode(self, data: bytes):
+        if self._codec is not None:
+            return self._codec.decode(data)
+
+        return json.loads(data)
+
+    def _read_table(self, name: str) -> Dict[int, Any]:
+        with open(self._table_path(name), 'rb') as handle:
+            table = self._decode(handle.read())
+
+        # JSON only supports string keys, so we have to convert the document
+        # IDs back
+        return int_keys({name: table})[name]
+
+    def _add_table(self, name: str):
+        """
+        Add a table to the manifest and pick a file for it.
+        """
+        extension = self._codec.name if self._codec is not None else 'json'
+        self._manifest['tables'][name] = 'table_{}.{}'.format(
+            self._manifest['next_file'], extension)
+        self._manifest['next_file'] += 1
+
+    def _write_table(self, name: str, table, changed=None) -> bool:
+        """
+        Write a table to its file.
+
+        :param changed: The IDs of the documents that have changed or
+                        ``None`` if they are unknown.
+        :returns: whether the table is new and the manifest has to be written
+        """
+        new = name not in self._manifest['tables']
+        if new:
+            self._add_table(name)
+
+        write_atomic(self._table_path(name), self._encode(table))
+
+        return new
+
+    def _drop_table(self, name: str):
+        path = self._table_path(name)
+        del self._manifest['tables'][name]
+        self._manifest.get('meta', {}).pop(name, None)
+
+        # Remove the table from the manifest before removing its file, so
+        # the manifest never points to a missing file
+        self._write_manifest()
+        os.remove(path)
+
+    def read(self) -> Optional[Dict[str, Dict[str, Any]]]:
+        return _LazyTables(self)
+
+    def table_meta(self, name: str) -> Optional[TableMeta]:
+        if name not in self._manifest['tables']:
+            # The table doesn't exist, so it's empty
+            return TableMeta(1, 0, 0)
+
+        # Manifests written by older versions have no metadata
+        meta = self._manifest.get('meta', {}).get(name)
+        if meta is None:
+            return None
+
+        # If the table has been written but the manifest hasn't (e.g. because
+        # of a crash), the metadata doesn't describe the table anymore
+        if meta[2] != self._table_size(name):
+            return None
+
+        return TableMeta(*meta)
+
+    def invalidate(self) -> None:
+        # Another process may have added or dropped tables
+        self._read_manifest()
+
+    def write(self, data: Dict[str, Dict[str, Any]]):
+        for name in [name for name in self._manifest['tables']
+                     if name not in data]:
+            self._drop_table(name)
+
+        # Without knowing what has changed we have to write all tables
+        for name in data:
+            self._write_table(name, data[name])
+            self._update_meta(name, data[name])
+
+        # The manifest holds the tables' metadata, so it's written even if
+        # no table has been added
+        self._write_manifest()
+
+    def write_changes(self, data, changes):
+        for name, docs in changes.items():
+            if docs is None:
+                if name in self._manifest['tables']:
+                    self._drop_table(name)
+            else:
+                # Only build on metadata that still describes the table
+                if self.table_meta(name) is None:
+                    self._manifest.get('meta', {}).pop(name, None)
+
+                self._write_table(name, data[name], docs)
+                self._update_meta(name, data[name], docs)
+
+        if changes:
+            self._write_manifest()
@@ -0,0 +1,634 @@
+"""
+Contains a storage that keeps documents in fixed-size pages of a binary file
+and reads them through a memory map.
+"""
+
+import mmap
+import os
+import struct
+from collections.abc import MutableMapping
+from typing import Dict, Any, Iterator, List, Optional, Set, Tuple, Union
+
+from .serialization import Codec, get_codec
+from .storages import Storage, TableMeta, touch
+
+__all__ = ('PagedStorage',)
+
+# The first page of the file starts with the file header: magic, version,
+# page size, page count and the name of the codec documents are stored with
+_FILE_HEADER = struct.Struct('>4sHII16s')
+_MAGIC = b'TDBP'
+_VERSION = 1
+
+# All other pages start with a page header. For slotted pages it is followed
+# by the slot array which grows towards the end of the page while the records
+# grow from the end of the page towards the slot array.
+_PAGE_HEADER = struct.Struct('>BHH')  # page type, slot count, end of free space
+_SLOT = struct.Struct('>HH')  # record offset, record length (0: free slot)
+
+_FREE_PAGE = 0
+_SLOTTED_PAGE = 1
+# The first page of a run of pages that holds a single large record. The
+# slot count of its header is the number of pages in the run, the header is
+# followed by the record length.
+_OVERFLOW_PAGE = 2
+_OVERFLOW_LENGTH = struct.Struct('>I')
+
+# Records start with their kind and the table they belong to, followed by
+# the document ID and the serialized document for document records
+_RECORD_HEADER = struct.Struct('>BH')  # record kind, table name length
+_KEY_HEADER = struct.Struct('>H')  # document ID length
+_OVERFLOW_POINTER = struct.Struct('>II')  # first page, record length
+
+_TABLE_RECORD = 0  # marks the existence of a (possibly empty) table
+_DOCUMENT_RECORD = 1
+_OVERFLOW_RECORD = 2  # the document is stored in a run of overflow pages
+
+# Where a document is stored: page number and slot number
+Location = Tuple[int, int]
+
+
+class _PagedTable(MutableMapping):
+    """
+    A table of a :class:`PagedStorage`.
+
+    Documents are decoded from the pages when they are accessed, so looking
+    up a document only touches the page it is stored on. Changes are kept in
+    memory until the storage writes them.
+    """
+
+    def __init__(self, storage: 'PagedStorage', name: str):
+        self._storage = storage
+        self._name = name
+        self._locations = storage._directory.get(name, {})
+        self._changes: Dict[int, Optional[Any]] = {}
+
+    def __getitem__(self, doc_id: int):
+        if doc_id in self._changes:
+            doc = self._changes[doc_id]
+            if doc is None:
+                raise KeyError(doc_id)
+
+            return doc
+
+        return self._storage._load(self._locations[doc_id])
+
+    def __setitem__(self, doc_id: int, doc) -> None:
+        self._changes[doc_id] = doc
+
+    def __delitem__(self, doc_id: int) -> None:
+        if doc_id not in self:
+            raise KeyError(doc_id)
+
+        self._changes[doc_id] = None
+
+    def __contains__(self, doc_id: object) -> bool:
+        if doc_id in self._changes:
+            return self._changes[doc_id] is not None
+
+        return doc_id in self._locations
+
+    def __iter__(self) -> Iterator[int]:
+        for doc_id in self._locations:
+            if doc_id not in self._changes:
+                yield doc_id
+
+        for doc_id, doc in self._changes.items():
+            if doc is not None:
+                yield doc_id
+
+    def __len__(self) -> int:
+        count = len(self._locations)
+        for doc_id, doc in self._changes.items():
+            if doc_id in self._locations:
+                count -= doc is None
+            else:
+                count += doc is not None
+
+        return count
+
+
+class PagedStorage(Storage):
+    """
+    Store the data in fixed-size pages of a binary file.
+
+    Every page belongs to a single table and holds its documents in slots.
+    Documents that don't fit into a page are stored in a run of consecutive
+    overflow pages. On open, the page headers are scanned to find out where
+    each document is stored.
+
+    Documents are read through a read-only memory map of the file and are
+    only decoded when they are accessed, so fetching a document only touches
+    the page it's stored on and reading a table only touches the table's
+    pages. Processes that open the same file share the mapped pages through
+    the operating system's page cache. Writes only rewrite the pages that
+    hold changed documents.
+
+    Documents are serialized with a :class:`~tinydb.serialization.Codec`,
+    ``pickle`` by default. The codec is recorded in the file, so existing
+    files are always read with the codec they have been written with.
+    """
+
+    #: The default size of a page in bytes
+    DEFAULT_PAGE_SIZE = 8192
+
+    #: The default codec for new files
+    DEFAULT_CODEC = 'pickle'
+
+    def __init__(self, path: str, create_dirs=False, access_mode='rb+',
+                 page_size: int = DEFAULT_PAGE_SIZE,
+                 codec: Optional[Union[str, Codec]] = None):
+        """
+        Create a new instance.
+
+        Also creates the storage file, if it doesn't exist and the access mode
+        is appropriate for writing.
+
+        :param path: Where to store the pages.
+        :param access_mode: ``'rb'`` to open the file read-only or ``'rb+'``
+                            for reading and writing.
+        :param page_size: The page size for new files, a power of two
+                          between 1 KiB and 32 KiB. Existing files keep
+                          their page size.
+        :param codec: The codec (or name of the codec) for new files.
+        """
+
+        super().__init__()
+
+        if access_mode not in ('rb', 'rb+'):
+            raise ValueError('Unsupported access mode {!r}'.format(access_mode))
+        if page_size & (page_size - 1) or not 1024 <= page_size <= 32768:
+            raise ValueError('The page size has to be a power of two between '
+                             '1024 and 32768')
+
+        self._path = path
+        self._mode = access_mode
+
+        if access_mode == 'rb+':
+            touch(path, create_dirs=create_dirs)
+
+        self._handle = open(path, access_mode)
+        self._fd = self._handle.fileno()
+
+        codec = get_codec(codec if codec is not None else self.DEFAULT_CODEC)
+
+        if os.fstat(self._fd).st_size == 0:
+            if access_mode == 'rb':
+                self._handle.close()
+                raise IOError('Cannot initialize the empty database {}. '
+                              'Access mode is "rb"'.format(path))
+
+            self._init_file(page_size, codec.name)
+
+        self._map = mmap.mmap(self._fd, 0, access=mmap.ACCESS_READ)
+
+        magic, version, self._page_size, self._page_count, codec_name = \
+            _FILE_HEADER.unpack_from(self._map)
+        if magic != _MAGIC or version != _VERSION:
+            raise ValueError('{} is not a paged database file'.format(path))
+
+        codec_name = codec_name.rstrip(b'\x00').decode('ascii')
+        self._codec = codec if codec.name == codec_name \
+            else get_codec(codec_name)
+
+        self._scan()
+
+    def _init_file(self, page_size: int, codec_name: str):
+        header = bytearray(page_size)
+        _FILE_HEADER.pack_into(header, 0, _MAGIC, _VERSION, page_size, 1,
+                               codec_name.encode('ascii'))
+        os.pwrite(self._fd, header, 0)
+
+    def _scan(self):
+        """
+        Build the directory of tables, documents and pages by scanning the
+        page headers.
+        """
+        # Where each document of each table is stored
+        self._directory: Dict[str, Dict[int, Location]] = {}
+
+        # The pages of each table and free pages
+        self._table_pages: Dict[str, Set[int]] = {}
+        self._free_pages: List[int] = []
+
+        # The pages of each table that have room for more records
+        self._open_pages: Dict[str, Set[int]] = {}
+
+        # The number of bytes of each table's records and overflow payloads
+        self._sizes: Dict[str, int] = {}
+
+        # The next document ID of the tables it's known for. It's looked up
+        # in the directory when it's needed.
+        self._next_ids: Dict[str, int] = {}
+
+        # Pages past the end of the file don't exist, whatever the header
+        # says
+        self._page_count = min(self._page_count,
+                               len(self._map) // self._page_size)
+
+        page = 1
+        while page < self._page_count:
+            page_type, count, _ = _PAGE_HEADER.unpack_from(
+                self._map, page * self._page_size)
+
+            if page_type == _OVERFLOW_PAGE:
+                page += count
+                continue
+
+            if page_type == _FREE_PAGE:
+                self._free_pages.append(page)
+                page += 1
+                continue
+
+            name = None
+            buf = self._page(page, {})
+            for slot in range(count):
+                offset, length = _SLOT.unpack_from(
+                    buf, _PAGE_HEADER.size + slot * _SLOT.size)
+                if not length:
+                    continue
+
+                kind, name, doc_id, payload = self._parse(buf, offset)
+                docs = self._directory.setdefault(name, {})
+                if kind != _TABLE_RECORD:
+                    docs[doc_id] = (page, slot)
+
+                self._sizes[name] = self._sizes.get(name, 0) + length
+                if kind == _OVERFLOW_RECORD:
+                    self._sizes[name] += _OVERFLOW_POINTER.unpack_from(
+                        buf, payload)[1]
+
+            if name is not None:
+                self._table_pages.setdefault(name, set()).add(page)
+                self._update_free_space(name, page, buf)
+            else:
+                # A slotted page without records is as good as a free page
+                self._free_pages.append(page)
+
+            page += 1
+
+    # --- Page access ---------------------------------------------------------
+
+    def _page(self, page: int, dirty: Dict[int, bytearray]) -> bytearray:
+        """
+        Get a modifiable copy of a page, preferring pages that have been
+        modified but not written yet.
+        """
+        if page not in dirty:
+            start = page * self._page_size
+            dirty[page] = bytearray(self._map[start:start + self._page_size])
+
+        return dirty[page]
+
+    @staticmethod
+    def _parse(buf, offset: int) -> Tuple[int, str, int, int]:
+        """
+        Parse the header of the record starting at ``offset``.
+
+        :returns: the record kind, table name, document ID and the offset
+                  of the record payload
+        """
+        kind, name_len = _RECORD_HEADER.unpack_from(buf, offset)
+        offset += _RECORD_HEADER.size
+        name = bytes(buf[offset:offset + name_len]).decode('utf-8')
+        offset += name_len
+
+        if kind == _TABLE_RECORD:
+            return kind, name, 0, offset
+
+        key_len, = _KEY_HEADER.unpack_from(buf, offset)
+        offset += _KEY_HEADER.size
+        doc_id = int(bytes(buf[offset:offset + key_len]))
+
+        return kind, name, doc_id, offset + key_len
+
+    def _load(self, location: Location):
+        """
+        Decode the document stored at ``location``.
+        """
+        page, slot = location
+        start = page * self._page_size
+
+        offset, length = _SLOT.unpack_from(
+            self._map, start + _PAGE_HEADER.size + slot * _SLOT.size)
+        record = self._map[start + offset:start + offset + length]
+        kind, _, _, payload = self._parse(record, 0)
+
+        if kind == _OVERFLOW_RECORD:
+            first, length = _OVERFLOW_POINTER.unpack_from(record, payload)
+            start = first * self._page_size + _PAGE_HEADER.size \
+                + _OVERFLOW_LENGTH.size
+            return self._codec.decode(self._map[start:start + length])
+
+        return self._codec.decode(record[payload:])
+
+    @staticmethod
+    def _encode(name: str, doc_id: Optional[int], payload: bytes = b'',
+                kind: int = _DOCUMENT_RECORD) -> bytes:
+        name_bytes = name.encode('utf-8')
+        record = _RECORD_HEADER.pack(kind, len(name_bytes)) + name_bytes
+
+        if doc_id is not None:
+            key = str(doc_id).encode('ascii')
+            record += _KEY_HEADER.pack(len(key)) + key
+
+        return record + payload
+
+    # --- Page allocation -----------------------------------------------------
+
+    def _allocate(self, count: int, dirty: Dict[int, bytearray]) -> int:
+        """
+        Allocate ``count`` consecutive pages.
+
+        :returns: the number of the first page
+        """
+        if count == 1 and self._free_pages:
+            page = self._free_pages.pop()
+        else:
+            page = self._page_count
+            self._page_count += count
+
+        for p in range(page, page + count):
+            dirty[p] = bytearray(self._page_size)
+
+        return page
+
+    def _free(self, page: int, count: int, dirty: Dict[int, bytearray]):
+        """
+        Mark ``count`` pages starting at ``page`` as free.
+        """
+        for p in range(page, page + count):
+            dirty[p] = bytearray(self._page_size)
+            self._free_pages.append(p)
+
+    def _update_free_space(self, name: str, page: int, buf: bytearray):
+        """
+        Remember whether a page still has room for more records.
+        """
+        _, count, _ = _PAGE_HEADER.unpack_from(buf)
+        used = _PAGE_HEADER.size + count * _SLOT.size + sum(
+            _SLOT.unpack_from(buf, _PAGE_HEADER.size + i * _SLOT.size)[1]
+            for i in range(count)
+        )
+
+        open_pages = self._open_pages.setdefault(name, set())
+        if self._page_size - used >= self._page_size // 4:
+            open_pages.add(page)
+        else:
+            open_pages.discard(page)
+
+    # --- Slotted pages -------------------------------------------------------
+
+    def _compact_page(self, buf: bytearray):
+        """
+        Move all records of a page to its end, merging the gaps left by
+        removed records into the free space. Slot numbers don't change.
+        """
+        page_type, count, _ = _PAGE_HEADER.unpack_from(buf)
+
+        records = []
+        for slot in range(count):
+            offset, length = _SLOT.unpack_from(
+                buf, _PAGE_HEADER.size + slot * _SLOT.size)
+            if length:
+                records.append((slot, bytes(buf[offset:offset + length])))
+
+        free_end = self._page_size
+        for slot, record in records:
+            free_end -= len(record)
+            buf[free_end:free_end + len(record)] = record
+            _SLOT.pack_into(buf, _PAGE_HEADER.size + slot * _SLOT.size,
+                            free_end, len(record))
+
+        _PAGE_HEADER.pack_into(buf, 0, page_type, count, free_end)
+
+    def _place(self, buf: bytearray, record: bytes) -> Optional[int]:
+        """
+        Store a record in a slotted page.
+
+        :returns: the slot number or ``None`` if the page is full
+        """
+        _, count, free_end = _PAGE_HEADER.unpack_from(buf)
+
+        slot = count
+        for i in range(count):
+            if not _SLOT.unpack_from(buf, _PAGE_HEADER.size + i * _SLOT.size)[1]:
+                slot = i
+                break
+
+        slots_end = _PAGE_HEADER.size + max(count, slot + 1) * _SLOT.size
+        if free_end - slots_end < len(record):
+            self._compact_page(buf)
+            _, count, free_end = _PAGE_HEADER.unpack_from(buf)
+
+            if free_end - slots_end < len(record):
+                return None
+
+        free_end -= len(record)
+        buf[free_end:free_end + len(record)] = record
+        _SLOT.pack_into(buf, _PAGE_HEADER.size + slot * _SLOT.size,
+                        free_end, len(record))
+        _PAGE_HEADER.pack_into(buf, 0, _SLOTTED_PAGE, max(count, slot + 1),
+                               free_end)
+
+        return slot
+
+    def _insert(self, name: str, record: bytes,
+                dirty: Dict[int, bytearray]) -> Location:
+        """
+        Store a record in one of the table's pages, allocating a new page
+        if none of them has enough room.
+        """
+        self._sizes[name] = self._sizes.get(name, 0) + len(record)
+
+        for page in list(self._open_pages.get(name, ())):
+            buf = self._page(page, dirty)
+            slot = self._place(buf, record)
+            self._update_free_space(name, page, buf)
+
+            if slot is not None:
+                return page, slot
+
+        page = self._allocate(1, dirty)
+        buf = dirty[page]
+        _PAGE_HEADER.pack_into(buf, 0, _SLOTTED_PAGE, 0, self._page_size)
+
+        slot = self._place(buf, record)
+        assert slot is not None
+
+        self._table_pages.setdefault(name, set()).add(page)
+        self._update_free_space(name, page, buf)
+
+        return page, slot
+
+    def _store(self, name: str, doc_id: int, doc,
+               dirty: Dict[int, bytearray]) -> Location:
+        """
+        Store a document, using overflow pages if it doesn't fit into a page.
+        """
+        payload = self._codec.encode(doc)
+        record = self._encode(name, doc_id, payload)
+
+        max_record = self._page_size - _PAGE_HEADER.size - _SLOT.size
+        if len(record) <= max_record:
+            return self._insert(name, record, dirty)
+
+        # Store the document in a run of pages and only keep a pointer to
+        # it in the table's page
+        header = _PAGE_HEADER.size + _OVERFLOW_LENGTH.size
+        count = -(-(header + len(payload)) // self._page_size)
+        first = self._allocate(count, dirty)
+
+        data = bytearray(count * self._page_size)
+        _PAGE_HEADER.pack_into(data, 0, _OVERFLOW_PAGE, count, 0)
+        _OVERFLOW_LENGTH.pack_into(data, _PAGE_HEADER.size, len(payload))
+        data[header:header + len(payload)] = payload
+
+        for i in range(count):
+            start = i * self._page_size
+            dirty[first + i] = data[start:start + self._page_size]
+
+        self._sizes[name] = self._sizes.get(name, 0) + len(payload)
+
+        pointer = _OVERFLOW_POINTER.pack(first, len(payload))
+        return self._insert(name, self._encode(name, doc_id, pointer,
+                                               _OVERFLOW_RECORD), dirty)
+
+    def _remove(self, name: str, location: Location,
+                dirty: Dict[int, bytearray]):
+        """
+        Remove the record at ``location`` and the overflow pages it uses.
+        """
+        page, slot = location
+        buf = self._page(page, dirty)
+
+        entry = _PAGE_HEADER.size + slot * _SLOT.size
+        offset, length = _SLOT.unpack_from(buf, entry)
+        kind, _, _, payload = self._parse(buf, offset)
+
+        self._sizes[name] -= length
+        if kind == _OVERFLOW_RECORD:
+            first, payload_length = _OVERFLOW_POINTER.unpack_from(buf, payload)
+            _, count, _ = _PAGE_HEADER.unpack_from(self._page(first, dirty))
+            self._free(first, count, dirty)
+            self._sizes[name] -= payload_length
+
+        _SLOT.pack_into(buf, entry, 0, 0)
+        self._update_free_space(name, page, buf)
+
+    def _drop(self, name: str, dirty: Dict[int, bytearray]):
+        """
+        Free all pages of a table.
+        """
+        for location in self._directory.pop(name, {}).values():
+            self._remove(name, location, dirty)
+
+        for page in self._table_pages.pop(name, ()):
+            self._free(page, 1, dirty)
+
+        self._open_pages.pop(name, None)
+        self._sizes.pop(name, None)
+        self._next_ids.pop(name, None)
+
+    def _flush(self, dirty: Dict[int, bytearray]):
+        """
+        Write modified pages to the file and map the file again if it has
+        grown.
+        """
+        if self._mode == 'rb':
+            raise IOError('Cannot write to the database. Access mode is "rb"')
+
+        header = self._page(0, dirty)
+        _FILE_HEADER.pack_into(header, 0, _MAGIC, _VERSION, self._page_size,
+                               self._page_count, self._codec.name.encode('ascii'))
+
+        for page in sorted(dirty):
+            if page:
+                os.pwrite(self._fd, dirty[page], page * self._page_size)
+
+        # The header holds the page count, so it's only written once the
+        # pages it counts are on disk. If we crash before, the file still
+        # has the old page count and the new pages are ignored.
+        os.fsync(self._fd)
+        os.pwrite(self._fd, header, 0)
+        os.fsync(self._fd)
+
+        if len(self._map) < self._page_count * self._page_size:
+            self._map.close()
+            self._map = mmap.mmap(self._fd, 0, access=mmap.ACCESS_READ)
+
+    # --- Storage interface ---------------------------------------------------
+
+    def read(self) -> Optional[Dict[str, Dict[str, Any]]]:
+        return {name: _PagedTable(self, name) for name in self._directory}
+
+    def write(self, data: Dict[str, Dict[str, Any]]):
+        # Without knowing what has changed, we rewrite every table
+        changes: Dict[str, Optional[Dict[str, Any]]] = \
+            {name: None for name in self._directory if name not in data}
+        for name, table in data.items():
+            changes[name] = dict(table.items())
+
+        dirty: Dict[int, bytearray] = {}
+        for name in list(self._directory):
+            if name in data:
+                # Decode all documents before their pages are reused
+                self._drop(name, dirty)
+
+        self._apply(changes, dirty)
+
+    def write_changes(self, data, changes):
+        self._apply(changes, {})
+
+    def _apply(self, changes: Dict[str, Optional[Dict[str, Any]]],
+               dirty: Dict[int, bytearray]):
+        for name, docs in changes.items():
+            if docs is None:
+                self._drop(name, dirty)
+                continue
+
+            if name not in self._directory:
+                # Record the table, so it is kept even if it is empty
+                self._directory[name] = {}
+                self._insert(name, self._encode(name, None, kind=_TABLE_RECORD),
+                             dirty)
+
+            locations = self._directory[name]
+            for doc_id, doc in docs.items():
+                if doc_id in locations:
+                    self._remove(name, locations.pop(doc_id), dirty)
+
+                if doc is not None:
+                    locations[doc_id] = self._store(name, doc_id, doc, dirty)
+                    if doc_id >= self._next_ids.get(name, doc_id + 1):
+                        self._next_ids[name] = doc_id + 1
+                elif self._next_ids.get(name) == doc_id + 1:
+                    # The last document has been removed
+                    del self._next_ids[name]
+
+        self._flush(dirty)
+
+    def table_meta(self, name: str) -> Optional[TableMeta]:
+        docs = self._directory.get(name)
+        if docs is None:
+            # The table doesn't exist, so it's empty
+            return TableMeta(1, 0, 0)
+
+        next_id = self._next_ids.get(name)
+        if next_id is None:
+            next_id = self._next_ids[name] = max(docs, default=0) + 1
+
+        return TableMeta(next_id, len(docs), self._sizes.get(name, 0))
+
+    def invalidate(self) -> None:
+        # Another process may have grown the file and moved documents, so we
+        # map the file again and rebuild the directory
+        self._map.close()
+        self._map = mmap.mmap(self._fd, 0, access=mmap.ACCESS_READ)
+        self._page_count = _FILE_HEADER.unpack_from(self._map)[3]
+
+        self._scan()
+
+    def close(self) -> None:
+        self._map.close()
+        self._handle.close()
@@ -0,0 +1,191 @@
+"""
+Contains a storage that splits every table into partitions which can be
+searched in parallel.
+"""
+
+import heapq
+import json
+import multiprocessing
+import os
+import pickle
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+from operator import itemgetter
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+from .multi_file_storage import MultiFileStorage
+from .query_compiler import compile_query
+from .serialization import Codec
+from .storages import write_atomic
+
+__all__ = ('PartitionedStorage',)
+
+# Forking a process that runs other threads (like the flusher of the
+# CachingMiddleware) can deadlock, so the workers are started from a fresh
+# process instead
+_START_METHOD = 'forkserver' \
+    if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+
+
+def _load_partition(path: str, codec: Optional[Codec]) -> Dict[int, Any]:
+    with open(path, 'rb') as handle:
+        data = handle.read()
+
+    partition = codec.decode(data) if codec is not None else json.loads(data)
+
+    return {int(doc_id): doc for doc_id, doc in partition.items()}
+
+
+def _scan_partition(path: str, codec: Optional[Codec],
+                    query: bytes) -> List[Tuple[int, Any]]:
+    """
+    Search a partition. Runs in a worker process.
+    """
+    cond = compile_query(pickle.loads(query))
+
+    return sorted(
+        ((doc_id, doc)
+         for doc_id, doc in _load_partition(path, codec).items()
+         if cond(doc)),
+        key=itemgetter(0)
+    )
+
+
+class PartitionedStorage(MultiFileStorage):
+    """
+    Split every table into ``partitions`` files by document ID.
+
+    Like with :class:`~tinydb.multi_file_storage.MultiFileStorage`, the files
+    live in the directory ``path`` along with a manifest. A document is
+    stored in the partition ``doc_id % partitions``, so writes only rewrite
+    the partitions of the documents that have changed.
+
+    Searching a large table scans its partitions in parallel in a pool of
+    up to ``workers`` processes (by default, one per CPU). The query is
+    sent to the workers by pickling it, which works for all cacheable
+    queries as long as the functions passed to
+    :meth:`~tinydb.queries.Query.test` can be pickled. Other queries, and
+    tables smaller than :attr:`PARALLEL_SCAN_MIN_BYTES`, are searched in
+    this process. Either way, the results are in document ID order.
+
+    The number of partitions is fixed when the directory is created.
+    """
+
+    #: The size of a table's files below which it isn't worth searching
+    #: the table in parallel
+    PARALLEL_SCAN_MIN_BYTES = 1024 * 1024
+
+    def __init__(self, path: str, partitions: int = 8,
+                 workers: Optional[int] = None,
+                 codec: Optional[Union[str, Codec]] = None, **kwargs):
+        """
+        Create a new instance.
+
+        Also creates the directory, if it doesn't exist.
+
+        :param path: The directory to store the partition files in.
+        :param partitions: The number of partitions per table.
+        :param workers: The maximum number of processes to search with.
+        :param codec: The codec (or name of the codec) to serialize
+                      partitions with.
+        """
+
+        super().__init__(path, codec=codec, **kwargs)
+
+        if 'partitions' not in self._manifest:
+            if self._manifest['tables']:
+                raise ValueError('{} does not contain partitioned tables'
+                                 .format(path))
+
+            self._manifest['partitions'] = partitions
+
+        self.partitions: int = self._manifest['partitions']
+        self.workers = workers
+
+        self._pool: Optional[ProcessPoolExecutor] = None
+
+    def _partition_path(self, name: str, partition: int) -> str:
+        root, extension = os.path.splitext(self._table_path(name))
+
+        return '{}.{}{}'.format(root, partition, extension)
+
+    def _table_paths(self, name: str) -> List[str]:
+        return [self._partition_path(name, partition)
+                for partition in range(self.partitions)]
+
+    def _read_table(self, name: str) -> Dict[int, Any]:
+        table: Dict[int, Any] = {}
+        for partition in range(self.partitions):
+            table.update(_load_partition(self._partition_path(name, partition),
+                                         self._codec))
+
+        # Keep the documents in the order of their IDs
+        return dict(sorted(table.items(), key=itemgetter(0)))
+
+    def _write_table(self, name: str, table, changed=None) -> bool:
+        new = name not in self._manifest['tables']
+        if new:
+            self._add_table(name)
+
+        if new or changed is None:
+            partitions = range(self.partitions)
+        else:
+            partitions = {doc_id % self.partitions for doc_id in changed}
+
+        # Collect the documents of the partitions that have changed
+        contents: Dict[int, Dict[int, Any]] = {
+            partition: {} for partition in partitions
+        }
+        for doc_id, doc in table.items():
+            partition = contents.get(doc_id % self.partitions)
+            if partition is not None:
+                partition[doc_id] = doc
+
+        for partition, docs in contents.items():
+            write_atomic(self._partition_path(name, partition),
+                         self._encode(docs))
+
+        return new
+
+    def _drop_table(self, name: str):
+        paths = self._table_paths(name)
+        del self._manifest['tables'][name]
+        self._manifest.get('meta', {}).pop(name, None)
+
+        # Remove the table from the manifest before removing its files, so
+        # the manifest never points to missing files
+        self._write_manifest()
+        for path in paths:
+            os.remove(path)
+
+    def search_table(self, name: str, cond) -> Optional[List[Tuple[int, Any]]]:
+        if name not in self._manifest['tables']:
+            return []
+
+        paths = [self._partition_path(name, partition)
+                 for partition in range(self.partitions)]
+
+        if sum(map(os.path.getsize, paths)) < self.PARALLEL_SCAN_MIN_BYTES:
+            return None
+
+        try:
+            query = pickle.dumps(cond)
+        except (pickle.PicklingError, TypeError, AttributeError):
+            # The query can't be sent to other processes
+            return None
+
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context(_START_METHOD))
+
+        results = self._pool.map(_scan_partition, paths, repeat(self._codec),
+                                 repeat(query))
+
+        # Every partition is sorted already
+        return list(heapq.merge(*results, key=itemgetter(0)))
+
+    def close(self) -> None:
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
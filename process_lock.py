@@ -0,0 +1,141 @@
+"""
+Contains a readers-writer lock that coordinates several processes using the
+same database files, see :class:`ProcessLock`.
+"""
+
+import os
+import struct
+from typing import Callable, List
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover
+    fcntl = None  # type: ignore
+
+from .utils import RWLock
+
+__all__ = ('ProcessLock',)
+
+# The generation counter at the start of the lock file
+_GENERATION = struct.Struct('>Q')
+
+
+class ProcessLock(RWLock):
+    """
+    A readers-writer lock that also coordinates processes.
+
+    Threads of a process coordinate like with :class:`~tinydb.utils.RWLock`.
+    In addition, the process holds a shared ``fcntl`` lock on the lock file
+    while any of its threads reads and an exclusive one while a thread
+    writes. So processes read in parallel, but a writing process excludes
+    all others.
+
+    The lock file also holds a generation counter that is incremented by
+    every write that has changed something (see :meth:`mark_written`). A
+    process that finds the counter changed when it takes the lock knows
+    that another process has written in the meantime and calls the
+    functions registered with :meth:`on_change`, so it can reload what it
+    has cached. If nobody else has written, caches are kept.
+
+    Functions registered with :meth:`on_commit` are called before a writer
+    releases the lock, to make sure everything it has written can be read
+    by other processes.
+
+    >>> db = TinyDB('db.json', lock_file='db.json.lock')
+
+    Only available on platforms that support ``fcntl``.
+    """
+
+    def __init__(self, path: str):
+        if fcntl is None:
+            raise RuntimeError('Locking across processes requires fcntl')
+
+        super().__init__()
+
+        self._fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+
+        self._change_callbacks: List[Callable[[], None]] = []
+        self._commit_callbacks: List[Callable[[], None]] = []
+
+        # Whether the current writer has changed anything
+        self._written = False
+
+        # The generation we have last seen. Everything cached before
+        # opening the lock is up to date.
+        self._generation = self._read_generation()
+
+    def on_change(self, callback: Callable[[], None]) -> None:
+        """
+        Call ``callback`` when another process has written.
+
+        The callback runs while the calling thread holds the lock and no
+        other thread of the process uses the database, so it must not take
+        the lock itself.
+        """
+        self._change_callbacks.append(callback)
+
+    def on_commit(self, callback: Callable[[], None]) -> None:
+        """
+        Call ``callback`` before a writer releases the lock.
+        """
+        self._commit_callbacks.append(callback)
+
+    def mark_written(self) -> None:
+        self._written = True
+
+    def close(self) -> None:
+        """
+        Close the lock file.
+        """
+        os.close(self._fd)
+
+    def _read_generation(self) -> int:
+        data = os.pread(self._fd, _GENERATION.size, 0)
+        if len(data) < _GENERATION.size:
+            # A new lock file
+            return 0
+
+        return _GENERATION.unpack(data)[0]
+
+    def _check_generation(self) -> None:
+        generation = self._read_generation()
+        if generation == self._generation:
+            return
+
+        for callback in self._change_callbacks:
+            callback()
+
+        self._generation = generation
+
+    def _lock(self, operation: int) -> None:
+        fcntl.flock(self._fd, operation)
+
+        try:
+            self._check_generation()
+        except BaseException:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+            raise
+
+    def _acquire_shared(self) -> None:
+        self._lock(fcntl.LOCK_SH)
+
+    def _release_shared(self) -> None:
+        fcntl.flock(self._fd, fcntl.LOCK_UN)
+
+    def _acquire_exclusive(self) -> None:
+        self._lock(fcntl.LOCK_EX)
+
+    def _release_exclusive(self) -> None:
+        try:
+            for callback in self._commit_callbacks:
+                callback()
+        finally:
+            # Tell the other processes about the write, even if it has only
+            # been written partly. Their caches are still up to date if we
+            # haven't written anything.
+            if self._written:
+                self._written = False
+                self._generation += 1
+                os.pwrite(self._fd, _GENERATION.pack(self._generation), 0)
+
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
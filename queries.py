@@ -16,12 +16,14 @@ True
 False
 """
 
+import functools
+import operator
 import re
 from typing import Mapping, Tuple, Callable, Any, Union, List, Optional, Protocol
 
-from .utils import freeze
+from .utils import freeze, thaw
 
-__all__ = ('Query', 'QueryLike', 'where')
+__all__ = ('Query', 'QueryLike', 'where', 'rebuild_query')
 
 
 def is_sequence(obj):
@@ -73,6 +75,16 @@ class QueryInstance:
         self._test = test
         self._hash = hashval
 
+        # The queries this query combines with ``&``, ``|`` or ``~``, in the
+        # order they are evaluated in
+        self._operands: Tuple['QueryInstance', ...] = ()
+
+        # How the query has been built. Like the hash, but with the combined
+        # queries in the order they are evaluated in and the values tested
+        # against as they have been passed (the hash only holds frozen
+        # copies). Used to rebuild the query elsewhere, see __reduce__.
+        self._spec: Optional[Tuple] = hashval
+
     def is_cacheable(self) -> bool:
         return self._hash is not None
 
@@ -102,6 +114,15 @@ class QueryInstance:
 
         return False
 
+    def __reduce__(self):
+        # The test function is usually a closure which can't be pickled, but
+        # the spec describes the query completely, so we pickle the spec and
+        # rebuild the query from it
+        if not self.is_cacheable():
+            raise TypeError('Only cacheable queries can be pickled')
+
+        return rebuild_query, (self._spec, False)
+
     # --- Query modifiers -----------------------------------------------------
 
     def __and__(self, other: 'QueryInstance') -> 'QueryInstance':
@@ -112,7 +133,11 @@ class QueryInstance:
             hashval = ('and', frozenset([self._hash, other._hash]))
         else:
             hashval = None
-        return QueryInstance(lambda value: self(value) and other(value), hashval)
+        query = QueryInstance(lambda value: self(value) and other(value), hashval)
+        query._operands = (self, other)
+        if hashval is not None:
+            query._spec = ('and', (self, other))
+        return query
 
     def __or__(self, other: 'QueryInstance') -> 'QueryInstance':
         # We use a frozenset for the hash as the OR operation is commutative
@@ -122,11 +147,19 @@ class QueryInstance:
             hashval = ('or', frozenset([self._hash, other._hash]))
         else:
             hashval = None
-        return QueryInstance(lambda value: self(value) or other(value), hashval)
+        query = QueryInstance(lambda value: self(value) or other(value), hashval)
+        query._operands = (self, other)
+        if hashval is not None:
+            query._spec = ('or', (self, other))
+        return query
 
     def __invert__(self) -> 'QueryInstance':
         hashval = ('not', self._hash) if self.is_cacheable() else None
-        return QueryInstance(lambda value: not self(value), hashval)
+        query = QueryInstance(lambda value: not self(value), hashval)
+        query._operands = (self,)
+        if hashval is not None:
+            query._spec = ('not', self)
+        return query
 
 
 class Query(QueryInstance):
@@ -192,6 +225,7 @@ class Query(QueryInstance):
 
         # ... and update the query hash
         query._hash = ('path', query._path) if self.is_cacheable() else None
+        query._spec = query._hash
 
         # print("2")
         return query
@@ -211,7 +245,8 @@ class Query(QueryInstance):
             self,
             test: Callable[[Any], bool],
             hashval: Tuple,
-            allow_empty_path: bool = False
+            allow_empty_path: bool = False,
+            spec: Optional[Tuple] = None
     ) -> QueryInstance:
         """
         Generate a query based on a test function that first resolves the query
@@ -219,6 +254,8 @@ class Query(QueryInstance):
 
         :param test: The test the query executes.
         :param hashval: The hash of the query.
+        :param spec: The hash with the values tested against as they have
+                     been passed, if the hash holds frozen copies.
         :return: A :class:`~tinydb.queries.QueryInstance` object
         """
         if not self._path and not allow_empty_path:
@@ -239,10 +276,14 @@ class Query(QueryInstance):
                 return test(value)
         # print("4")
 
-        return QueryInstance(
+        query = QueryInstance(
             lambda value: runner(value),
             (hashval if self.is_cacheable() else None)
         )
+        if query.is_cacheable() and spec is not None:
+            query._spec = spec
+
+        return query
 
     def __eq__(self, rhs: Any):
         """
@@ -255,7 +296,8 @@ class Query(QueryInstance):
         # print("3")
         return self._generate_test(
             lambda value: value == rhs,
-            ('==', self._path, freeze(rhs))
+            ('==', self._path, freeze(rhs)),
+            spec=('==', self._path, rhs)
         )
 
     def __ne__(self, rhs: Any):
@@ -268,7 +310,8 @@ class Query(QueryInstance):
         """
         return self._generate_test(
             lambda value: value != rhs,
-            ('!=', self._path, freeze(rhs))
+            ('!=', self._path, freeze(rhs)),
+            spec=('!=', self._path, rhs)
         )
 
     def __lt__(self, rhs: Any) -> QueryInstance:
@@ -349,7 +392,8 @@ class Query(QueryInstance):
 
             return re.match(regex, value, flags) is not None
 
-        return self._generate_test(test, ('matches', self._path, regex))
+        hashval = ('matches', self._path, regex) + ((flags,) if flags else ())
+        return self._generate_test(test, hashval)
 
     def search(self, regex: str, flags: int = 0) -> QueryInstance:
         """
@@ -368,7 +412,8 @@ class Query(QueryInstance):
 
             return re.search(regex, value, flags) is not None
 
-        return self._generate_test(test, ('search', self._path, regex))
+        hashval = ('search', self._path, regex) + ((flags,) if flags else ())
+        return self._generate_test(test, hashval)
 
     def test(self, func: Callable[[Mapping], bool], *args) -> QueryInstance:
         """
@@ -427,7 +472,8 @@ class Query(QueryInstance):
 
         return self._generate_test(
             lambda value: test(value),
-            ('any', self._path, freeze(cond))
+            ('any', self._path, freeze(cond)),
+            spec=('any', self._path, cond)
         )
 
     def all(self, cond: Union['QueryInstance', List[Any]]) -> QueryInstance:
@@ -460,7 +506,8 @@ class Query(QueryInstance):
 
         return self._generate_test(
             lambda value: test(value),
-            ('all', self._path, freeze(cond))
+            ('all', self._path, freeze(cond)),
+            spec=('all', self._path, cond)
         )
 
     def one_of(self, items: List[Any]) -> QueryInstance:
@@ -473,7 +520,8 @@ class Query(QueryInstance):
         """
         return self._generate_test(
             lambda value: value in items,
-            ('one_of', self._path, freeze(items))
+            ('one_of', self._path, freeze(items)),
+            spec=('one_of', self._path, items)
         )
 
     def fragment(self, document: Mapping) -> QueryInstance:
@@ -486,8 +534,9 @@ class Query(QueryInstance):
 
         return self._generate_test(
             lambda value: test(value),
-            ('fragment', freeze(document)),
-            allow_empty_path=True
+            ('fragment', freeze(document)) + ((self._path,) if self._path else ()),
+            allow_empty_path=True,
+            spec=('fragment', document) + ((self._path,) if self._path else ())
         )
 
     def noop(self) -> QueryInstance:
@@ -515,6 +564,7 @@ class Query(QueryInstance):
         # ... and kill the hash - callable objects can be mutable, so it's
         # harmful to cache their results.
         query._hash = None
+        query._spec = None
 
         return query
 
@@ -523,3 +573,95 @@ def where(key: str) -> Query:
     A shorthand for ``Query()[key]``
     """
     return Query()[key]
+
+
+def rebuild_query(hashval: Tuple, frozen: bool = True) -> QueryInstance:
+    """
+    Rebuild a query from its hash.
+
+    >>> query = where('f1') == 5
+    >>> rebuild_query(query._hash) == query
+    True
+
+    Queries are pickled (e.g. to evaluate them in another process) by
+    rebuilding them from their spec instead, which keeps the order of
+    combined queries and the values tested against as they have been
+    passed (``frozen=False``). Rebuilding from the hash turns frozen values
+    back into mutable ones, so e.g. a tuple compared with becomes a list.
+
+    :param hashval: The hash or spec of the query.
+    :param frozen: Whether the values in ``hashval`` are frozen.
+    """
+    if hashval is None:
+        raise ValueError('Only cacheable queries can be rebuilt')
+
+    if hashval == ():
+        return Query().noop()
+
+    op = hashval[0]
+
+    def rebuild(operand):
+        if isinstance(operand, QueryInstance):
+            return operand
+
+        return rebuild_query(operand, frozen)
+
+    if op in ('and', 'or'):
+        combine = operator.and_ if op == 'and' else operator.or_
+        return functools.reduce(combine, map(rebuild, hashval[1]))
+
+    if op == 'not':
+        return ~rebuild(hashval[1])
+
+    unfreeze = thaw if frozen else (lambda value: value)
+
+    if op == 'fragment':
+        path = hashval[2] if len(hashval) > 2 else ()
+    elif op is None:
+        path = ()
+    else:
+        path = hashval[1]
+
+    query = Query()
+    for part in path:
+        query = query[part]
+
+    if op in (None, 'path'):
+        return query
+    elif op == 'fragment':
+        return query.fragment(unfreeze(hashval[1]))
+    elif op == 'exists':
+        return query.exists()
+    elif op in ('==', '!=', 'one_of'):
+        rhs = unfreeze(hashval[2])
+    elif op in ('any', 'all'):
+        rhs = hashval[2]
+        if not isinstance(rhs, QueryInstance):
+            rhs = unfreeze(rhs)
+    else:
+        rhs = hashval[2]
+
+    if op == '==':
+        return query == rhs
+    elif op == '!=':
+        return query != rhs
+    elif op == '<':
+        return query < rhs
+    elif op == '<=':
+        return query <= rhs
+    elif op == '>':
+        return query > rhs
+    elif op == '>=':
+        return query >= rhs
+    elif op in ('matches', 'search'):
+        return getattr(query, op)(rhs, *hashval[3:])
+    elif op == 'test':
+        return query.test(rhs, *hashval[3])
+    elif op == 'any':
+        return query.any(rhs)
+    elif op == 'all':
+        return query.all(rhs)
+    elif op == 'one_of':
+        return query.one_of(rhs)
+
+    raise ValueError('Unknown query {!r}'.format(hashval))
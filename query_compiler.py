@@ -0,0 +1,236 @@
+"""
+Contains a compiler that turns queries into plain Python functions.
+
+Evaluating a :class:`~tinydb.queries.QueryInstance` calls a chain of closures
+for every document: one per ``&``, ``|`` and ``~`` and one that resolves the
+query path. The compiler generates a single function from the query's spec
+(see :class:`~tinydb.queries.QueryInstance`) instead, with the path lookups
+and the logic inlined:
+
+>>> test = compile_query((where('user').age >= 18) & (where('active') == True))
+>>> print(test.source)
+def test(doc):
+    try:
+        v = doc['user']['age']
+    except (KeyError, TypeError):
+        r = False
+    else:
+        r = v >= c0
+    if r:
+        try:
+            v = doc['active']
+        except (KeyError, TypeError):
+            r = False
+        else:
+            r = v == c1
+    return r
+"""
+
+import re
+from typing import Any, Callable, Dict, List, Mapping, Tuple
+
+from .queries import QueryInstance, is_sequence
+from .utils import LRUCache
+
+__all__ = ('compile_query',)
+
+#: The compiled queries by cache key, see _cache_key
+_compiled: LRUCache = LRUCache(capacity=256)
+
+
+class _NotCompilable(Exception):
+    pass
+
+
+def _cache_key(value: Any) -> Any:
+    """
+    The key a query's spec is cached by.
+
+    Unlike the hash, it keeps the order of combined queries (which decides
+    what ``&`` and ``|`` short-circuit) and tells lists and tuples apart.
+
+    :raises TypeError: if the spec holds unhashable values
+    """
+    if isinstance(value, QueryInstance):
+        return QueryInstance, _cache_key(value._spec)
+
+    if isinstance(value, (list, tuple)):
+        return type(value), tuple(_cache_key(item) for item in value)
+
+    if isinstance(value, dict):
+        return dict, tuple((key, _cache_key(item))
+                           for key, item in value.items())
+
+    if isinstance(value, set):
+        return set, frozenset(value)
+
+    hash(value)
+    return value
+
+
+class _Compiler:
+    def __init__(self):
+        self.lines: List[str] = []
+        self.namespace: Dict[str, Any] = {'is_sequence': is_sequence}
+
+    def const(self, value: Any) -> str:
+        """
+        Make a value available to the generated code.
+        """
+        name = 'c{}'.format(len(self.namespace) - 1)
+        self.namespace[name] = value
+
+        return name
+
+    def emit(self, indent: int, line: str) -> None:
+        self.lines.append('    ' * indent + line)
+
+    def query(self, spec: Tuple, indent: int) -> None:
+        """
+        Generate code that stores the result of a query in ``r``.
+
+        The spec holds the combined queries in the order they are evaluated
+        in and the values tested against as they have been passed.
+        """
+        if spec == ():
+            self.emit(indent, 'r = True')
+            return
+
+        op = spec[0]
+
+        if op in ('and', 'or'):
+            operands = spec[1]
+            if not all(isinstance(operand, QueryInstance)
+                       for operand in operands):
+                # A hash, which doesn't remember the order
+                raise _NotCompilable()
+
+            self.query(operands[0]._spec, indent)
+            for operand in operands[1:]:
+                # Short-circuit like ``and``/``or``
+                self.emit(indent, 'if r:' if op == 'and' else 'if not r:')
+                indent += 1
+                self.query(operand._spec, indent)
+
+        elif op == 'not':
+            if not isinstance(spec[1], QueryInstance):
+                raise _NotCompilable()
+
+            self.query(spec[1]._spec, indent)
+            self.emit(indent, 'r = not r')
+
+        elif op == 'fragment':
+            path = spec[2] if len(spec) > 2 else ()
+            document = self.const(tuple(spec[1].items()))
+            self.test(path, 'not any(k not in v or v[k] != x '
+                            'for k, x in {})'.format(document), indent)
+
+        else:
+            self.test(spec[1], self.expression(spec), indent)
+
+    def expression(self, spec: Tuple) -> str:
+        """
+        Generate the test of a query on a value ``v``.
+        """
+        op = spec[0]
+
+        if op == 'exists':
+            return 'True'
+
+        if op in ('==', '!=', '<', '<=', '>', '>='):
+            return 'v {} {}'.format(op, self.const(spec[2]))
+
+        if op in ('matches', 'search'):
+            flags = spec[3] if len(spec) > 3 else 0
+            pattern = self.const(re.compile(spec[2], flags))
+            return 'isinstance(v, str) and {}.{}(v) is not None'.format(
+                pattern, 'match' if op == 'matches' else 'search')
+
+        if op == 'test':
+            return '{}(v, *{})'.format(self.const(spec[2]),
+                                       self.const(spec[3]))
+
+        if op in ('any', 'all'):
+            cond = spec[2]
+            if isinstance(cond, QueryInstance):
+                return 'is_sequence(v) and {}({}(e) for e in v)'.format(
+                    op, self.const(compile_query(cond)))
+
+            items = self.const(cond)
+            if op == 'any':
+                return 'is_sequence(v) and any(e in {} for e in v)'.format(items)
+
+            return 'is_sequence(v) and all(e in v for e in {})'.format(items)
+
+        if op == 'one_of':
+            return 'v in {}'.format(self.const(spec[2]))
+
+        # E.g. a query without a test that would fail when evaluated
+        raise _NotCompilable()
+
+    def test(self, path: Tuple, expression: str, indent: int) -> None:
+        """
+        Generate code that resolves ``path`` into ``v`` and stores the result
+        of ``expression`` in ``r``, or ``False`` if the path doesn't exist.
+        """
+        if not path:
+            self.emit(indent, 'v = doc')
+            self.emit(indent, 'r = ' + expression)
+            return
+
+        if not all(isinstance(part, str) for part in path):
+            raise _NotCompilable()
+
+        self.emit(indent, 'try:')
+        self.emit(indent + 1,
+                  'v = doc' + ''.join('[{!r}]'.format(part) for part in path))
+        self.emit(indent, 'except (KeyError, TypeError):')
+        self.emit(indent + 1, 'r = False')
+        self.emit(indent, 'else:')
+        self.emit(indent + 1, 'r = ' + expression)
+
+
+def compile_query(cond) -> Callable[[Mapping], Any]:
+    """
+    Compile a query into a function that evaluates it.
+
+    The compiled function gives the same results as the query itself.
+    Compiled functions are cached by the query's spec. Queries that can't
+    be compiled (e.g. non-cacheable queries or custom query classes) are
+    returned unchanged, so the result can always be called in place of the
+    query.
+
+    :param cond: The query to compile.
+    """
+    if not isinstance(cond, QueryInstance) or not cond.is_cacheable():
+        return cond
+
+    try:
+        key = _cache_key(cond._spec)
+    except TypeError:
+        # Compiled, but not cached
+        key = None
+    else:
+        compiled = _compiled.get(key)
+        if compiled is not None:
+            return compiled
+
+    compiler = _Compiler()
+    compiler.lines.append('def test(doc):')
+    try:
+        compiler.query(cond._spec, 1)
+        compiler.emit(1, 'return r')
+        source = '\n'.join(compiler.lines)
+        exec(source, compiler.namespace)
+    except _NotCompilable:
+        return cond
+    except (SyntaxError, RecursionError):
+        # The query is nested too deeply
+        return cond
+
+    compiled = compiler.namespace['test']
+    compiled.source = source
+    if key is not None:
+        _compiled[key] = compiled
+
+    return compiled
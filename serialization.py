@@ -0,0 +1,168 @@
+"""
+Contains the :class:`base class <tinydb.serialization.Codec>` for codecs that
+storages use to (de)serialize data, and implementations.
+
+Codecs can be passed to storages by instance or by name:
+
+>>> db = TinyDB('db.bin', storage=PagedStorage, codec='marshal')
+
+The ``orjson`` and ``msgpack`` codecs are only available if the respective
+package is installed.
+"""
+
+import json
+import marshal
+import pickle
+from abc import ABC, abstractmethod
+from typing import Any, Dict, Type, Union
+
+__all__ = ('Codec', 'JSONCodec', 'PickleCodec', 'MarshalCodec', 'get_codec')
+
+
+class Codec(ABC):
+    """
+    The abstract base class for all codecs.
+
+    A codec turns the data of a storage into bytes and back.
+    """
+
+    #: The name the codec is registered under
+    name = ''
+
+    @abstractmethod
+    def encode(self, obj: Any) -> bytes:
+        """
+        Serialize ``obj``.
+        """
+
+        raise NotImplementedError('To be overridden!')
+
+    @abstractmethod
+    def decode(self, data: bytes) -> Any:
+        """
+        Deserialize data created by :meth:`encode`.
+        """
+
+        raise NotImplementedError('To be overridden!')
+
+
+class JSONCodec(Codec):
+    """
+    Serialize data as JSON.
+
+    By default, the output is as compact as possible and keys are not
+    sorted. Keyword arguments are passed to ``json.dumps``.
+    """
+
+    name = 'json'
+
+    def __init__(self, **kwargs):
+        kwargs.setdefault('separators', (',', ':'))
+        self.kwargs = kwargs
+
+    def encode(self, obj: Any) -> bytes:
+        return json.dumps(obj, **self.kwargs).encode('utf-8')
+
+    def decode(self, data: bytes) -> Any:
+        return json.loads(data)
+
+
+class PickleCodec(Codec):
+    """
+    Serialize data using ``pickle`` (protocol 5 by default).
+
+    Only open files written with this codec if you trust them, as
+    unpickling can execute arbitrary code.
+    """
+
+    name = 'pickle'
+
+    def __init__(self, protocol: int = 5):
+        self.protocol = protocol
+
+    def encode(self, obj: Any) -> bytes:
+        return pickle.dumps(obj, protocol=self.protocol)
+
+    def decode(self, data: bytes) -> Any:
+        return pickle.loads(data)
+
+
+class MarshalCodec(Codec):
+    """
+    Serialize data using ``marshal``.
+
+    This is the fastest built-in codec, but its format may change between
+    Python versions.
+    """
+
+    name = 'marshal'
+
+    def encode(self, obj: Any) -> bytes:
+        return marshal.dumps(obj)
+
+    def decode(self, data: bytes) -> Any:
+        return marshal.loads(data)
+
+
+#: All available codecs by name
+CODECS: Dict[str, Type[Codec]] = {
+    codec.name: codec for codec in (JSONCodec, PickleCodec, MarshalCodec)
+}
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover
+    pass
+else:
+    class OrjsonCodec(Codec):
+        """
+        Serialize data as JSON using ``orjson``.
+
+        Like with :class:`JSONCodec`, non-string keys are written as strings.
+        """
+
+        name = 'orjson'
+
+        def encode(self, obj: Any) -> bytes:
+            return orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS)
+
+        def decode(self, data: bytes) -> Any:
+            return orjson.loads(data)
+
+    CODECS[OrjsonCodec.name] = OrjsonCodec
+
+try:
+    import msgpack
+except ImportError:  # pragma: no cover
+    pass
+else:
+    class MsgpackCodec(Codec):
+        """
+        Serialize data using ``msgpack``.
+        """
+
+        name = 'msgpack'
+
+        def encode(self, obj: Any) -> bytes:
+            return msgpack.packb(obj)
+
+        def decode(self, data: bytes) -> Any:
+            return msgpack.unpackb(data, strict_map_key=False)
+
+    CODECS[MsgpackCodec.name] = MsgpackCodec
+
+
+def get_codec(codec: Union[str, Codec]) -> Codec:
+    """
+    Get a codec instance.
+
+    :param codec: A codec instance or the name of a codec.
+    """
+    if isinstance(codec, Codec):
+        return codec
+
+    try:
+        return CODECS[codec]()
+    except KeyError:
+        raise ValueError('Unknown codec {!r}. Available codecs: {}'.format(
+            codec, ', '.join(sorted(CODECS)))) from None
@@ -6,11 +6,14 @@ implementations.
 import io
 import json
 import os
+import threading
 import warnings
 from abc import ABC, abstractmethod
-from typing import Dict, Any, Optional
+from typing import Dict, Any, List, NamedTuple, Optional, Tuple, Union
 
-__all__ = ('Storage', 'JSONStorage', 'MemoryStorage')
+from .serialization import Codec, get_codec
+
+__all__ = ('Storage', 'JSONStorage', 'MemoryStorage', 'TableMeta')
 
 
 def touch(path: str, create_dirs: bool):
@@ -33,6 +36,132 @@ def touch(path: str, create_dirs: bool):
         pass
 
 
+def write_atomic(path: str, data: bytes, sync: bool = True) -> None:
+    """
+    Replace the contents of a file, making sure readers either see the old
+    or the new contents.
+
+    :param path: The file to write.
+    :param data: The new contents.
+    :param sync: Whether to wait for the new contents to reach the disk
+                 before replacing the file. Without, a crash may leave an
+                 empty or partial file behind.
+    """
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'wb') as handle:
+        handle.write(data)
+        if sync:
+            handle.flush()
+            os.fsync(handle.fileno())
+
+    os.replace(tmp_path, path)
+
+
+def _is_int_key(key) -> bool:
+    return isinstance(key, int) or (isinstance(key, str) and key.isdigit())
+
+
+def int_keys(data: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Convert the document IDs of all tables to ints.
+
+    TinyDB uses ints as document IDs, but some formats (most notably JSON)
+    only support string keys. Storages using such formats convert the IDs
+    back when reading the data.
+
+    Only tables whose keys all are integers are converted. Other values
+    (tables using a custom ``document_id_class`` or data that hasn't been
+    written by TinyDB at all) are returned as they are, the tables convert
+    their IDs themselves.
+
+    :param data: The database state as read from the storage, or changes as
+                 passed to :meth:`Storage.write_changes`.
+    """
+    return {
+        name: {int(doc_id): doc for doc_id, doc in table.items()}
+        if isinstance(table, dict) and all(map(_is_int_key, table))
+        else table
+        for name, table in data.items()
+    }
+
+
+def apply_changes(
+    data: Dict[str, Dict[str, Any]],
+    changes: Dict[str, Optional[Dict[str, Any]]]
+):
+    """
+    Apply changes as passed to :meth:`Storage.write_changes` to the state of
+    a database.
+
+    :param data: The database state to update in place.
+    :param changes: The changed documents, by table.
+    """
+    for name, docs in changes.items():
+        if docs is None:
+            # The table has been dropped
+            data.pop(name, None)
+            continue
+
+        table = data.setdefault(name, {})
+        for doc_id, doc in docs.items():
+            if doc is None:
+                table.pop(doc_id, None)
+            else:
+                table[doc_id] = doc
+
+
+class TableMeta(NamedTuple):
+    """
+    The metadata of a table, see :meth:`Storage.table_meta`.
+    """
+
+    #: The ID of the next inserted document: one more than the largest ID
+    #: in use, or 1 if the table is empty
+    next_id: int
+
+    #: The number of documents
+    count: int
+
+    #: The number of bytes the table takes up in the storage, ``None`` if
+    #: unknown
+    size: Optional[int]
+
+
+def table_meta(
+    table: Dict[int, Any],
+    size: Optional[int] = None,
+    previous: Optional[List] = None,
+    changed: Optional[Dict[int, Any]] = None
+) -> List:
+    """
+    Compute the metadata of a table, as a list that can be stored as JSON.
+
+    Given the table's ``previous`` metadata and the documents that have
+    ``changed`` since, the metadata is updated without looking at every
+    document, unless the document with the largest ID has been removed.
+    Only integer document IDs count towards the next ID.
+    """
+    if previous is not None and changed is not None:
+        next_id = previous[0]
+        for doc_id, doc in changed.items():
+            if not _is_int_key(doc_id):
+                continue
+
+            if doc is not None:
+                next_id = max(next_id, int(doc_id) + 1)
+            elif int(doc_id) + 1 >= next_id:
+                # The last document has been removed, so we have to look for
+                # the new one
+                break
+        else:
+            return [next_id, len(table), size]
+
+    max_id = max((int(doc_id) for doc_id in table if _is_int_key(doc_id)),
+                 default=0)
+
+    return [max_id + 1, len(table), size]
+
+
 class Storage(ABC):
     """
     The abstract base class for all Storages.
@@ -68,6 +197,93 @@ class Storage(ABC):
 
         raise NotImplementedError('To be overridden!')
 
+    def write_changes(
+        self,
+        data: Dict[str, Dict[str, Any]],
+        changes: Dict[str, Optional[Dict[str, Any]]]
+    ) -> None:
+        """
+        Optional: Write the current state of the database, knowing which
+        documents have changed since the last write.
+
+        ``changes`` maps table names to the documents that have been written
+        to them, with ``None`` marking a removed document. A table mapped to
+        ``None`` has been dropped. Storages that can persist partial updates
+        override this method, all others write the complete state.
+
+        :param data: The current state of the database.
+        :param changes: The changed documents, by table.
+        """
+
+        self.write(data)
+
+    def search_table(self, name: str, cond) -> Optional[List[Tuple[int, Any]]]:
+        """
+        Optional: Search a table without reading it.
+
+        Storages that can search a table faster than a scan over the whole
+        table (e.g. in parallel) override this method.
+
+        :param name: The name of the table.
+        :param cond: The query to search for.
+        :returns: the IDs and documents matching ``cond`` or ``None`` if the
+                  table has to be scanned instead
+        """
+
+        return None
+
+    def table_meta(self, name: str) -> Optional[TableMeta]:
+        """
+        Optional: Get the metadata of a table without reading it.
+
+        Storages that keep track of their tables' metadata override this
+        method, so the number of documents and the next document ID are
+        known without reading the table.
+
+        :param name: The name of the table.
+        :returns: the table's metadata or ``None`` if it's unknown
+        """
+
+        return None
+
+    def use_lock(self, lock) -> None:
+        """
+        Optional: Learn about the lock that guards the storage.
+
+        The database passes its :class:`~tinydb.utils.RWLock` when it opens
+        the storage. Storages that access the data outside of the
+        database's calls (e.g. from a background thread) hold it to see a
+        consistent state.
+
+        :param lock: The database's lock.
+        """
+
+        pass
+
+    def wait_durable(self) -> None:
+        """
+        Optional: Wait until the writes of the calling thread have reached
+        the disk.
+
+        Storages that make writes durable in the background (e.g. to sync
+        the writes of several threads together) override this method. The
+        database calls it after releasing its lock, so other threads can
+        write in the meantime.
+        """
+
+        pass
+
+    def invalidate(self) -> None:
+        """
+        Optional: Forget all data cached in memory.
+
+        Called when another process has written to the storage, so the next
+        read sees its changes. Storages that keep (parts of) the data in
+        memory override this method.
+        """
+
+        pass
+
     def close(self) -> None:
         """
         Optional: Close open file handles, etc.
@@ -79,9 +295,16 @@ class Storage(ABC):
 class JSONStorage(Storage):
     """
     Store the data in a JSON file.
+
+    The metadata of the tables (see :meth:`Storage.table_meta`) is kept in
+    a small file next to the database file (``<path>.meta``). It records
+    the size and modification time of the database file it describes, so
+    it's ignored once the database file has been changed without it.
     """
 
-    def __init__(self, path: str, create_dirs=False, encoding=None, access_mode='r+', **kwargs):
+    def __init__(self, path: Union[str, 'os.PathLike[str]'], create_dirs=False,
+                 encoding=None, access_mode='r+',
+                 codec: Optional[Union[str, Codec]] = None, **kwargs):
         """
         Create a new instance.
 
@@ -91,13 +314,24 @@ class JSONStorage(Storage):
         Note: Using an access mode other than `r` or `r+` will probably lead to
         data loss or data corruption!
 
+        By default, the data is serialized using ``json.dumps`` with the
+        given keyword arguments. Passing a ``codec`` (see
+        :mod:`~tinydb.serialization`) stores the data in the codec's format
+        instead, in which case the file is opened in binary mode.
+
         :param path: Where to store the JSON data.
         :param access_mode: mode in which the file is opened (r, r+)
         :type access_mode: str
+        :param codec: The codec (or name of the codec) to serialize with.
         """
 
         super().__init__()
 
+        self._codec = get_codec(codec) if codec is not None else None
+
+        if self._codec is not None and 'b' not in access_mode:
+            access_mode = access_mode[0] + 'b' + access_mode[1:]
+
         self._mode = access_mode
         self.kwargs = kwargs
 
@@ -113,48 +347,165 @@ class JSONStorage(Storage):
             touch(path, create_dirs=create_dirs)
 
         # Open the file for reading/writing
-        self._handle = open(path, mode=self._mode, encoding=encoding)
+        if 'b' in self._mode:
+            self._handle = open(path, mode=self._mode)
+        else:
+            self._handle = open(path, mode=self._mode, encoding=encoding)
+
+        # Reading and writing move the file's cursor, so only one thread may
+        # use the handle at a time
+        self._lock = threading.Lock()
+
+        # The metadata of the tables, read from its file when it's needed
+        self._meta_path = os.fspath(path) + '.meta'
+        self._meta: Optional[Dict[str, Any]] = None
 
     def close(self) -> None:
         self._handle.close()
 
     def read(self) -> Optional[Dict[str, Dict[str, Any]]]:
-        # Get the file size by moving the cursor to the file end and reading
-        # its location
-        self._handle.seek(0, os.SEEK_END)
-        size = self._handle.tell()
-
-        if not size:
-            # File is empty, so we return ``None`` so TinyDB can properly
-            # initialize the database
-            return None
-        else:
-            # Return the cursor to the beginning of the file
+        with self._lock:
+            # Get the file size by moving the cursor to the file end and
+            # reading its location
+            self._handle.seek(0, os.SEEK_END)
+            size = self._handle.tell()
+
+            if not size:
+                # File is empty, so we return ``None`` so TinyDB can properly
+                # initialize the database
+                return None
+            else:
+                # Return the cursor to the beginning of the file
+                self._handle.seek(0)
+
+                if self._codec is not None:
+                    data = self._codec.decode(self._handle.read())
+                else:
+                    # Load the JSON contents of the file
+                    data = json.load(self._handle)
+
+                # JSON only supports string keys, so we have to convert the
+                # document IDs back
+                return int_keys(data)
+
+    def write(self, data: Dict[str, Dict[str, Any]]):
+        self._write(data, None)
+
+    def write_changes(self, data, changes):
+        # The whole file is rewritten anyway, but the changes tell which
+        # tables' metadata has to be updated
+        self._write(data, changes)
+
+    def _write(self, data: Dict[str, Dict[str, Any]],
+               changes: Optional[Dict[str, Optional[Dict[str, Any]]]]):
+        with self._lock:
+            # The metadata of the file as it is before this write
+            previous = self._load_meta() if changes is not None else None
+
+            # Move the cursor to the beginning of the file just in case
             self._handle.seek(0)
 
-            # Load the JSON contents of the file
-            return json.load(self._handle)
+            # Serialize the database state using the codec or the
+            # user-provided arguments
+            if self._codec is not None:
+                serialized = self._codec.encode(data)
+            else:
+                serialized = json.dumps(data, **self.kwargs)
 
-    def write(self, data: Dict[str, Dict[str, Any]]):
-        # Move the cursor to the beginning of the file just in case
-        self._handle.seek(0)
+            # Write the serialized data to the file
+            try:
+                self._handle.write(serialized)
+            except io.UnsupportedOperation:
+                raise IOError('Cannot write to the database. Access mode is "{0}"'.format(self._mode))
+
+            # Ensure the file has been written
+            self._handle.flush()
+            os.fsync(self._handle.fileno())
 
-        # Serialize the database state using the user-provided arguments
-        serialized = json.dumps(data, **self.kwargs)
+            # Remove data that is behind the new cursor in case the file has
+            # gotten shorter
+            self._handle.truncate()
 
-        # Write the serialized data to the file
+            self._write_meta(data, previous, changes)
+
+    def _write_meta(self, data: Dict[str, Dict[str, Any]],
+                    previous: Optional[Dict[str, Any]],
+                    changes: Optional[Dict[str, Optional[Dict[str, Any]]]]):
+        """
+        Record the metadata of the tables just written, updating the
+        ``previous`` metadata with the ``changes`` if both are known. The
+        caller has to hold ``self._lock``.
+        """
+        previous_tables = previous['tables'] if previous is not None else {}
+
+        tables = {}
+        for name, table in data.items():
+            if not isinstance(table, dict):
+                # Not a table, e.g. in a file that TinyDB hasn't written
+                continue
+
+            changed = changes.get(name, {}) if changes is not None else None
+            tables[name] = table_meta(table, None, previous_tables.get(name),
+                                      changed)
+
+        stat = os.fstat(self._handle.fileno())
+        self._meta = {
+            'file': [stat.st_size, stat.st_mtime_ns],
+            'tables': tables,
+        }
+
+        # The metadata can always be recomputed from the database and is
+        # checked against it when it's read, so we don't wait for it to
+        # reach the disk
         try:
-            self._handle.write(serialized)
-        except io.UnsupportedOperation:
-            raise IOError('Cannot write to the database. Access mode is "{0}"'.format(self._mode))
+            write_atomic(self._meta_path,
+                         json.dumps(self._meta).encode('utf-8'), sync=False)
+        except OSError:
+            pass
+
+    def _load_meta(self) -> Optional[Dict[str, Any]]:
+        """
+        Get the metadata of the tables if it describes the current database
+        file, reading it from its file if needed. The caller has to hold
+        ``self._lock``.
+        """
+        if self._meta is None:
+            try:
+                with open(self._meta_path) as handle:
+                    meta = json.load(handle)
+            except (OSError, ValueError):
+                return None
+
+            # Ignore metadata that has been damaged
+            tables = meta.get('tables') if isinstance(meta, dict) else None
+            if not isinstance(tables, dict) or not all(
+                    isinstance(entry, list) and len(entry) == 3
+                    for entry in tables.values()):
+                return None
+
+            self._meta = meta
+
+        # Ignore metadata that doesn't describe the current file, e.g.
+        # because another program has written it
+        stat = os.fstat(self._handle.fileno())
+        if self._meta.get('file') != [stat.st_size, stat.st_mtime_ns]:
+            self._meta = None
+            return None
+
+        return self._meta
+
+    def table_meta(self, name: str) -> Optional[TableMeta]:
+        with self._lock:
+            meta = self._load_meta()
+            if meta is None:
+                return None
 
-        # Ensure the file has been written
-        self._handle.flush()
-        os.fsync(self._handle.fileno())
+            meta = meta['tables'].get(name)
+            if meta is None:
+                # The table doesn't exist, so it's empty
+                return TableMeta(1, 0, None)
 
-        # Remove data that is behind the new cursor in case the file has
-        # gotten shorter
-        self._handle.truncate()
+            return TableMeta(*meta)
 
 
 class MemoryStorage(Storage):
@@ -3,6 +3,12 @@ This module implements tables, the central place for accessing and manipulating
 data in TinyDB.
 """
 
+import copy
+import threading
+import time
+from collections.abc import Mapping as MappingABC, MutableMapping
+from contextlib import closing, contextmanager
+from itertools import islice
 from typing import (
     Callable,
     Dict,
@@ -16,11 +22,13 @@ from typing import (
     Tuple
 )
 
+from .columnar import ColumnStore
 from .queries import QueryLike
-from .storages import Storage
-from .utils import LRUCache
+from .query_compiler import compile_query
+from .storages import Storage, TableMeta
+from .utils import CostAwareCache, FrozenList, LRUCache, RWLock, estimate_size
 
-__all__ = ('Document', 'Table')
+__all__ = ('Document', 'DocumentView', 'Table', 'TableSnapshot', 'Transaction')
 
 
 class Document(dict):
@@ -36,6 +44,311 @@ class Document(dict):
         self.doc_id = doc_id
 
 
+class DocumentView(MappingABC):
+    """
+    A read-only view of a document stored in the database.
+
+    Unlike :class:`Document`, the view doesn't copy the document, it only
+    wraps the stored ``dict`` along with the document's ID in
+    ``view.doc_id``. This makes returning many documents cheap. To use it,
+    set it as the ``document_class`` of a table class:
+
+    >>> class ViewTable(Table):
+    ...     document_class = DocumentView
+    >>> TinyDB.table_class = ViewTable
+
+    As tables never modify stored documents in place, a view keeps showing
+    the document as it was when it has been read. Note that nested values
+    are not copied either, so they must not be modified.
+    """
+
+    __slots__ = ('_doc', 'doc_id')
+
+    def __init__(self, value: Mapping, doc_id: int):
+        self._doc = value
+        self.doc_id = doc_id
+
+    def __getitem__(self, key):
+        return self._doc[key]
+
+    def __iter__(self):
+        return iter(self._doc)
+
+    def __len__(self) -> int:
+        return len(self._doc)
+
+    def __contains__(self, key: object) -> bool:
+        return key in self._doc
+
+    def get(self, key, default=None):
+        return self._doc.get(key, default)
+
+    def keys(self):
+        return self._doc.keys()
+
+    def items(self):
+        return self._doc.items()
+
+    def values(self):
+        return self._doc.values()
+
+    def __eq__(self, other: object):
+        if isinstance(other, DocumentView):
+            other = other._doc
+
+        return self._doc == other
+
+    def __repr__(self):
+        return '{}({!r}, doc_id={!r})'.format(type(self).__name__, self._doc,
+                                              self.doc_id)
+
+
+class _QueryResults:
+    """
+    The cached results of a query.
+
+    The matching documents are kept by ID in table order, so they can be
+    patched when documents change. Searches get them as a
+    :class:`~tinydb.utils.FrozenList` that is only rebuilt after a change.
+    ``cost`` is the time it took to search, ``size`` a rough estimate of
+    the memory the documents take up.
+    """
+
+    __slots__ = ('docs', 'cost', 'size', '_documents')
+
+    #: The number of documents to estimate the size of the results from
+    SIZE_SAMPLE = 32
+
+    def __init__(self, docs: Dict[int, Document], cost: float):
+        self.docs = docs
+        self.cost = cost
+
+        sample = list(islice(docs.values(), self.SIZE_SAMPLE))
+        average = sum(map(estimate_size, sample)) / len(sample) if sample else 0
+        self.size = int(average * len(docs)) + 64
+
+        self._documents: Optional[FrozenList] = None
+
+    @property
+    def documents(self) -> FrozenList:
+        if self._documents is None:
+            self._documents = FrozenList(self.docs.values())
+
+        return self._documents
+
+    def changed(self) -> None:
+        self._documents = None
+
+
+class _TrackedTable(MutableMapping):
+    """
+    A view of a table's documents that records which documents have been
+    written or removed through it.
+
+    ``Table._update_table`` hands this view to updater functions so it can
+    tell the storage exactly which documents changed. ``changes`` maps
+    document IDs to their new contents, with ``None`` marking a removal.
+    """
+
+    def __init__(self, table: Dict[int, Mapping]):
+        self._table = table
+        self.changes: Dict[int, Optional[Mapping]] = {}
+
+        # The documents as they were before they have been changed, so the
+        # changes can be undone
+        self._originals: Dict[int, Optional[Mapping]] = {}
+
+    def _remember(self, doc_id: int) -> None:
+        if doc_id not in self._originals:
+            self._originals[doc_id] = self._table.get(doc_id)
+
+    def rollback(self) -> None:
+        """
+        Undo all changes made through this view.
+        """
+        for doc_id, doc in self._originals.items():
+            if doc is None:
+                self._table.pop(doc_id, None)
+            else:
+                self._table[doc_id] = doc
+
+        self._originals.clear()
+        self.changes.clear()
+
+    def __getitem__(self, doc_id: int) -> Mapping:
+        return self._table[doc_id]
+
+    def __setitem__(self, doc_id: int, doc: Mapping) -> None:
+        self._remember(doc_id)
+        self._table[doc_id] = doc
+        self.changes[doc_id] = doc
+
+    def __delitem__(self, doc_id: int) -> None:
+        self._remember(doc_id)
+        del self._table[doc_id]
+        self.changes[doc_id] = None
+
+    def __contains__(self, doc_id: object) -> bool:
+        return doc_id in self._table
+
+    def __iter__(self) -> Iterator[int]:
+        return iter(self._table)
+
+    def __len__(self) -> int:
+        return len(self._table)
+
+    def clear(self) -> None:
+        for doc_id in self._table:
+            self._remember(doc_id)
+            self.changes[doc_id] = None
+
+        self._table.clear()
+
+
+class Transaction:
+    """
+    The writes of a transaction, see
+    :meth:`~tinydb.database.TinyDB.transaction`.
+
+    Tables taking part in a transaction read the database state from the
+    transaction and record their changes in it instead of writing them to
+    the storage. On commit, all changes are written with a single storage
+    write. On rollback, the changes are undone.
+    """
+
+    def __init__(self, storage: Storage):
+        self._storage = storage
+
+        # The database state, read when it's first needed
+        self._tables: Optional[Dict[str, Dict[int, Mapping]]] = None
+
+        #: The changed documents by table, as passed to ``write_changes``
+        self.changes: Dict[str, Dict[int, Optional[Mapping]]] = {}
+
+        #: Whether the changes have been made durable. Once they are, they
+        #: are never rolled back.
+        self.committed = False
+
+        # Functions undoing the writes, in the order of the writes
+        self._undo: List[Callable[[], None]] = []
+
+        #: The tables that have been written to
+        self.tables: List['Table'] = []
+
+    def read(self) -> Dict[str, Dict[int, Mapping]]:
+        """
+        Get the database state including the changes made so far.
+        """
+        if self._tables is None:
+            self._tables = self._storage.read() or {}
+
+        return self._tables
+
+    def record(self, table: 'Table', changes: Dict[int, Optional[Mapping]],
+               undo: Callable[[], None]) -> None:
+        """
+        Record a write to a table.
+
+        :param table: the table that has been written to
+        :param changes: the written documents by ID, ``None`` for removed ones
+        :param undo: a function undoing the write
+        """
+        self.changes.setdefault(table.name, {}).update(changes)
+        self._undo.append(undo)
+
+        if table not in self.tables:
+            self.tables.append(table)
+
+    def commit(self) -> None:
+        """
+        Write all changes to the storage.
+        """
+        if self.changes:
+            self._storage.write_changes(self.read(), self.changes)
+
+        self.committed = True
+
+    def rollback(self) -> None:
+        """
+        Undo all changes, latest first.
+        """
+        for undo in reversed(self._undo):
+            undo()
+
+        self._undo.clear()
+        self.changes.clear()
+
+
+class TableSnapshot:
+    """
+    A version of a table as it was at some point, see
+    :meth:`Table.snapshot`.
+
+    The snapshot provides the reading methods of a table. Searches are
+    evaluated document by document, as the query cache and the projections
+    of the table only know its current version.
+    """
+
+    def __init__(self, table: 'Table', docs: Mapping[int, Mapping]):
+        self._table = table
+        self._docs = docs
+
+    def _document(self, doc_id: int, doc: Mapping) -> Document:
+        return self._table.document_class(
+            doc, self._table.document_id_class(doc_id))
+
+    def search(self, cond: QueryLike) -> List[Document]:
+        """
+        Search for all documents matching a 'where' cond.
+        """
+        test = compile_query(cond)
+
+        return [self._document(doc_id, doc)
+                for doc_id, doc in self._docs.items() if test(doc)]
+
+    def get(
+        self,
+        cond: Optional[QueryLike] = None,
+        doc_id: Optional[int] = None
+    ) -> Optional[Document]:
+        """
+        Get exactly one document specified by a query or a document ID.
+        """
+        if doc_id is not None:
+            doc = self._docs.get(doc_id)
+            return None if doc is None else self._document(doc_id, doc)
+
+        if cond is None:
+            raise RuntimeError('You have to pass either cond or doc_id')
+
+        test = compile_query(cond)
+        for doc_id_, doc in self._docs.items():
+            if test(doc):
+                return self._document(doc_id_, doc)
+
+        return None
+
+    def contains(
+        self,
+        cond: Optional[QueryLike] = None,
+        doc_id: Optional[int] = None
+    ) -> bool:
+        return self.get(cond, doc_id) is not None
+
+    def count(self, cond: QueryLike) -> int:
+        return len(self.search(cond))
+
+    def all(self) -> List[Document]:
+        return list(iter(self))
+
+    def __len__(self) -> int:
+        return len(self._docs)
+
+    def __iter__(self) -> Iterator[Document]:
+        for doc_id, doc in self._docs.items():
+            yield self._document(doc_id, doc)
+
+
 class Table:
     """
     Represents a single TinyDB table.
@@ -47,11 +360,17 @@ class Table:
         As an optimization, a query cache is implemented using a
         :class:`~tinydb.utils.LRUCache`. This class mimics the interface of
         a normal ``dict``, but starts to remove the least-recently used entries
-        once a threshold is reached.
+        once a threshold is reached. Tables of a
+        :class:`~tinydb.database.TinyDB` share a
+        :class:`~tinydb.utils.CostAwareCache` bounded in bytes instead.
+
+        Search results are returned as a :class:`~tinydb.utils.FrozenList`
+        that is shared with the query cache, so it can't be modified.
 
         The query cache is updated on every search operation. When writing
-        data, the whole cache is discarded as the query results may have
-        changed.
+        data, the cached results are patched by evaluating the cached queries
+        on the changed documents only, so repeated queries stay cached
+        through small writes. Large writes discard the whole cache.
 
     .. admonition:: Customization
 
@@ -65,14 +384,36 @@ class Table:
           cache
         - ``default_query_cache_capacity`` defines the default capacity of
           the query cache
+        - ``query_cache_patch_limit`` defines the maximum number of changed
+          documents the query cache is patched with
 
         .. versionadded:: 4.0
 
+    .. admonition:: Thread Safety
+
+        Tables can be used by many threads at once. Reads hold a
+        :class:`~tinydb.utils.RWLock` for reading, so they run in parallel,
+        while writes hold it exclusively. The tables of a
+        :class:`~tinydb.database.TinyDB` share a lock, as they share the
+        storage.
+
+        Searches only hold the lock to pin the current version of the
+        table, they scan it without holding the lock. A write that happens
+        while a version is pinned copies the table's ``dict`` and changes
+        the copy, sharing all untouched documents with the pinned version.
+        So scans never see partial writes and writes don't wait for scans.
+        See :meth:`snapshot` for reading a consistent version of the table
+        across several operations.
+
+        Several writes can be grouped into a transaction with
+        :meth:`~tinydb.database.TinyDB.transaction`.
 
     :param storage: The storage instance to use for this table
     :param name: The table name
     :param cache_size: Maximum capacity of query cache
     :param persist_empty: Store new table even with no operations on it
+    :param query_cache: A query cache to share with other tables
+    :param lock: A lock to share with other tables using the same storage
     """
 
     #: The class used to represent documents
@@ -95,12 +436,18 @@ class Table:
     #: .. versionadded:: 4.0
     default_query_cache_capacity = 10
 
+    #: The maximum number of documents a write may change for the cached
+    #: query results to be patched instead of discarded
+    query_cache_patch_limit = 1000
+
     def __init__(
         self,
         storage: Storage,
         name: str,
         cache_size: int = default_query_cache_capacity,
-        persist_empty: bool = False
+        persist_empty: bool = False,
+        query_cache: Optional[CostAwareCache] = None,
+        lock: Optional[RWLock] = None
     ):
         """
         Create a table instance.
@@ -108,10 +455,32 @@ class Table:
 
         self._storage = storage
         self._name = name
-        self._query_cache: LRUCache[QueryLike, List[Document]] \
-            = self.query_cache_class(capacity=cache_size)
+        self._lock = lock if lock is not None else RWLock()
+
+        # Use the shared query cache if there is one
+        self._query_cache: MutableMapping
+        if query_cache is not None:
+            self._query_cache = query_cache.view(name)
+        else:
+            self._query_cache = self.query_cache_class(capacity=cache_size)
 
         self._next_id = None
+
+        # The number of readers that have pinned a version of the table by
+        # the ``id`` of its ``dict``, see ``_pin_table``
+        self._pins: Dict[int, int] = {}
+        self._pins_lock = threading.Lock()
+
+        # Counts the writes, so searches can tell whether a write has
+        # happened while they have been scanning
+        self._version = 0
+
+        # Columnar projections of numeric fields, see ``create_projection``
+        self._columns: Optional[ColumnStore] = None
+
+        # The transaction the table takes part in, set by the database
+        self._transaction: Optional[Transaction] = None
+
         if persist_empty:
             self._update_table(lambda table: table.clear())
 
@@ -150,31 +519,34 @@ class Table:
         if not isinstance(document, Mapping):
             raise ValueError('Document is not a Mapping')
 
-        # First, we get the document ID for the new document
-        if isinstance(document, self.document_class):
-            # For a `Document` object we use the specified ID
-            doc_id = document.doc_id
-
-            # We also reset the stored next ID so the next insert won't
-            # re-use document IDs by accident when storing an old value
-            self._next_id = None
-        else:
-            # In all other cases we use the next free ID
-            doc_id = self._get_next_id()
+        # Hold the lock from picking the ID to writing the document, so no
+        # other thread picks the same ID
+        with self._lock.write():
+            # First, we get the document ID for the new document
+            if isinstance(document, self.document_class):
+                # For a `Document` object we use the specified ID
+                doc_id = document.doc_id
+
+                # We also reset the stored next ID so the next insert won't
+                # re-use document IDs by accident when storing an old value
+                self._next_id = None
+            else:
+                # In all other cases we use the next free ID
+                doc_id = self._get_next_id()
 
-        # Now, we update the table and add the document
-        def updater(table: dict):
-            if doc_id in table:
-                raise ValueError(f'Document with ID {str(doc_id)} '
-                                 f'already exists')
+            # Now, we update the table and add the document
+            def updater(table: dict):
+                if doc_id in table:
+                    raise ValueError(f'Document with ID {str(doc_id)} '
+                                     f'already exists')
 
-            # By calling ``dict(document)`` we convert the data we got to a
-            # ``dict`` instance even if it was a different class that
-            # implemented the ``Mapping`` interface
-            table[doc_id] = dict(document)
+                # By calling ``dict(document)`` we convert the data we got to
+                # a ``dict`` instance even if it was a different class that
+                # implemented the ``Mapping`` interface
+                table[doc_id] = dict(document)
 
-        # See below for details on ``Table._update``
-        self._update_table(updater)
+            # See below for details on ``Table._update``
+            self._update_table(updater)
 
         return doc_id
 
@@ -236,29 +608,58 @@ class Table:
 
         return list(iter(self))
 
-    def search(self, cond: QueryLike) -> List[Document]:
+    def search(self, cond: QueryLike,
+               limit: Optional[int] = None) -> List[Document]:
         """
         Search for all documents matching a 'where' cond.
 
         :param cond: the condition to check against
+        :param limit: the maximum number of documents to return. Stops
+                      searching once enough documents have been found.
         :returns: list of matching documents
         """
 
-        # First, we check the query cache to see if it has results for this
-        # query
-
-        cached_results = self._query_cache.get(cond)
-        if cached_results is not None:
-            return cached_results[:]
-
-        # Perform the search by applying the query to all documents.
-        # Then, only if the document matches the query, convert it
-        # to the document class and document ID class.
-        docs = [
-            self.document_class(doc, self.document_id_class(doc_id))
-            for doc_id, doc in self._read_table().items()
-            if cond(doc)
-        ]
+        if limit is not None:
+            # Close the iterator right away, so it unpins the table
+            with closing(self.iter_search(cond)) as documents:
+                return FrozenList(islice(documents, limit))
+
+        with self._lock.read():
+            # First, we check the query cache to see if it has results for
+            # this query
+            cached_results = self._query_cache.get(cond)
+            if cached_results is not None:
+                return cached_results.documents
+
+            start = time.perf_counter()
+            version = self._version
+
+            # Evaluate the query on the columnar projections if possible. If
+            # not, let the storage search the table if it can do so faster
+            # than we can.
+            matches = self._search_fast(cond)
+
+            if matches is None:
+                table = self._pin_table()
+
+        if matches is None:
+            # Perform the search by applying the query to all documents of
+            # the pinned version, without holding the lock. Compile the
+            # query so evaluating it doesn't cost more calls than necessary.
+            try:
+                test = compile_query(cond)
+                matches = [
+                    (doc_id, doc) for doc_id, doc in table.items() if test(doc)
+                ]
+            finally:
+                self._unpin_table(table)
+
+        # Convert the matching documents to the document class and document
+        # ID class
+        results = _QueryResults({
+            doc_id: self.document_class(doc, self.document_id_class(doc_id))
+            for doc_id, doc in matches
+        }, cost=time.perf_counter() - start)
 
         # Only cache cacheable queries.
         #
@@ -276,10 +677,103 @@ class Table:
         is_cacheable: Callable[[], bool] = getattr(cond, 'is_cacheable',
                                                    lambda: True)
         if is_cacheable():
-            # Update the query cache
-            self._query_cache[cond] = docs[:]
+            with self._lock.read():
+                # Results of a version that has been written to since are
+                # outdated, as the write hasn't patched them
+                if self._version == version:
+                    # Update the query cache
+                    self._query_cache[cond] = results
+
+        return results.documents
+
+    def _search_fast(
+        self,
+        cond: QueryLike
+    ) -> Optional[List[Tuple[int, Mapping]]]:
+        """
+        Search the columnar projections or let the storage search the table.
+        The caller has to hold the lock.
+
+        :returns: the matching documents by ID or ``None`` if neither can
+                  evaluate the query
+        """
+
+        if self._columns is not None:
+            table = self._read_table()
+            doc_ids = self._columns.search(cond, table)
+            if doc_ids is not None:
+                return [(doc_id, table[doc_id]) for doc_id in doc_ids]
+
+        # The storage doesn't know the changes of a transaction yet
+        if self._transaction is not None:
+            return None
 
-        return docs
+        return self._storage.search_table(self.name, cond)
+
+    def iter_search(self, cond: QueryLike) -> Iterator[Document]:
+        """
+        Search for documents matching a 'where' cond, one at a time.
+
+        Unlike :meth:`search`, the query is evaluated while iterating, so
+        stopping early doesn't cost evaluating it on the remaining documents.
+        The documents are those the table had when iterating started, writes
+        made while iterating don't show up (and don't wait for iterating to
+        finish).
+
+        Tables the storage keeps in a data structure of its own (e.g.
+        :class:`~tinydb.paged_storage.PagedStorage`) can't be pinned
+        without holding the lock. For them, the IDs of the documents are
+        taken when iterating starts and each document is read when it's
+        reached, so documents written while iterating show up in their new
+        version and removed ones are skipped.
+
+        :param cond: the condition to check against
+        :returns: an iterator over the matching documents
+        """
+
+        # Pin the current version of the table under the lock, but evaluate
+        # the query outside of it
+        with self._lock.read():
+            cached_results = self._query_cache.get(cond)
+            if cached_results is None:
+                table = self._read_table()
+
+                # The projections find all matching documents at once, which
+                # is cheap enough to do even if only a few of them are needed
+                doc_ids = None
+                if self._columns is not None:
+                    doc_ids = self._columns.search(cond, table)
+
+                pinned = isinstance(table, dict)
+                if pinned:
+                    self._pin_table(table)
+                elif doc_ids is None:
+                    doc_ids = list(table)
+
+        if cached_results is not None:
+            yield from cached_results.documents
+            return
+
+        if not pinned:
+            yield from self._iter_unpinned(doc_ids, compile_query(cond))
+            return
+
+        try:
+            if doc_ids is not None:
+                matches: Iterable = (
+                    (doc_id, table[doc_id]) for doc_id in doc_ids
+                )
+            else:
+                test = compile_query(cond)
+                matches = (
+                    (doc_id, doc) for doc_id, doc in table.items() if test(doc)
+                )
+
+            for doc_id, doc in matches:
+                yield self.document_class(doc, self.document_id_class(doc_id))
+        finally:
+            # Also runs when the iterator is closed or garbage collected
+            self._unpin_table(table)
 
     def get(
         self,
@@ -300,11 +794,10 @@ class Table:
 
         :returns: the document(s) or ``None``
         """
-        table = self._read_table()
-
         if doc_id is not None:
             # Retrieve a document specified by its ID
-            raw_doc = table.get(str(doc_id), None)
+            with self._lock.read():
+                raw_doc = self._read_table().get(doc_id, None)
 
             if raw_doc is None:
                 return None
@@ -312,37 +805,46 @@ class Table:
             # Convert the raw data to the document class
             return self.document_class(raw_doc, doc_id)
 
-        elif doc_ids is not None:
-            # Filter the table by extracting out all those documents which
-            # have doc id specified in the doc_id list.
+        if doc_ids is None and cond is None:
+            raise RuntimeError('You have to pass either cond or doc_id or '
+                               'doc_ids')
+
+        # Scan the current version of the table without holding the lock
+        with self._lock.read():
+            table = self._pin_table()
 
-            # Since document IDs will be unique, we make it a set to ensure
-            # constant time lookup
-            doc_ids_set = set(str(doc_id) for doc_id in doc_ids)
+        try:
+            if doc_ids is not None:
+                # Filter the table by extracting out all those documents which
+                # have doc id specified in the doc_id list.
 
-            # Now return the filtered documents in form of list
-            return [
-                self.document_class(doc, self.document_id_class(doc_id))
-                for doc_id, doc in table.items()
-                if doc_id in doc_ids_set
-            ]
+                # Since document IDs will be unique, we make it a set to ensure
+                # constant time lookup
+                doc_ids_set = set(doc_ids)
+
+                # Now return the filtered documents in form of list
+                return [
+                    self.document_class(doc, self.document_id_class(doc_id))
+                    for doc_id, doc in table.items()
+                    if doc_id in doc_ids_set
+                ]
 
-        elif cond is not None:
             # Find a document specified by a query
             # The trailing underscore in doc_id_ is needed so MyPy
-            # doesn't think that `doc_id_` (which is a string) needs
-            # to have the same type as `doc_id` which is this function's
-            # parameter and is an optional `int`.
-            for doc_id_, doc in self._read_table().items():
-                if cond(doc):
+            # doesn't think that `doc_id_` needs to have the same type as
+            # `doc_id` which is this function's parameter and is an
+            # optional `int`.
+            test = compile_query(cast(QueryLike, cond))
+            for doc_id_, doc in table.items():
+                if test(doc):
                     return self.document_class(
                         doc,
                         self.document_id_class(doc_id_)
                     )
 
             return None
-
-        raise RuntimeError('You have to pass either cond or doc_id or doc_ids')
+        finally:
+            self._unpin_table(table)
 
     def contains(
         self,
@@ -385,15 +887,22 @@ class Table:
         """
 
         # Define the function that will perform the update
+        # Documents are updated on a copy which is then stored back into the
+        # table, so the change gets recorded (see ``Table._update_table``)
         if callable(fields):
             def perform_update(table, doc_id):
                 # Update documents by calling the update function provided by
-                # the user
-                fields(table[doc_id])
+                # the user. It may change nested values in place, so it gets
+                # a deep copy to keep other versions of the document intact.
+                doc = copy.deepcopy(table[doc_id])
+                fields(doc)
+                table[doc_id] = doc
         else:
             def perform_update(table, doc_id):
                 # Update documents by setting all fields from the provided data
-                table[doc_id].update(fields)
+                doc = dict(table[doc_id])
+                doc.update(fields)
+                table[doc_id] = doc
 
         if doc_ids is not None:
             # Perform the update operation for documents specified by a list
@@ -418,7 +927,7 @@ class Table:
             updated_ids = []
 
             def updater(table: dict):
-                _cond = cast(QueryLike, cond)
+                _cond = compile_query(cast(QueryLike, cond))
 
                 # We need to convert the keys iterator to a list because
                 # we may remove entries from the ``table`` dict during
@@ -475,12 +984,18 @@ class Table:
         def perform_update(fields, table, doc_id):
             if callable(fields):
                 # Update documents by calling the update function provided
-                # by the user
-                fields(table[doc_id])
+                # by the user on a deep copy, as it may change nested values
+                # in place
+                doc = copy.deepcopy(table[doc_id])
+                fields(doc)
             else:
                 # Update documents by setting all fields from the provided
                 # data
-                table[doc_id].update(fields)
+                doc = dict(table[doc_id])
+                doc.update(fields)
+
+            # Store the updated copy so the change gets recorded
+            table[doc_id] = doc
 
         # Perform the update operation for documents specified by a query
 
@@ -495,7 +1010,7 @@ class Table:
             # during iteration)
             for doc_id in list(table.keys()):
                 for fields, cond in updates:
-                    _cond = cast(QueryLike, cond)
+                    _cond = compile_query(cast(QueryLike, cond))
 
                     # Pass through all documents to find documents matching the
                     # query. Call the processing callback with the document ID
@@ -537,20 +1052,24 @@ class Table:
                              "specify a doc_id. Hint: use a table.Document "
                              "object.")
 
-        # Perform the update operation
-        try:
-            updated_docs: Optional[List[int]] = self.update(document, cond, doc_ids)
-        except KeyError:
-            # This happens when a doc_id is specified, but it's missing
-            updated_docs = None
-
-        # If documents have been updated: return their IDs
-        if updated_docs:
-            return updated_docs
-
-        # There are no documents that match the specified query -> insert the
-        # data as a new document
-        return [self.insert(document)]
+        # Hold the lock throughout, so no other thread inserts a matching
+        # document in between
+        with self._lock.write():
+            # Perform the update operation
+            try:
+                updated_docs: Optional[List[int]] = self.update(document, cond,
+                                                                doc_ids)
+            except KeyError:
+                # This happens when a doc_id is specified, but it's missing
+                updated_docs = None
+
+            # If documents have been updated: return their IDs
+            if updated_docs:
+                return updated_docs
+
+            # There are no documents that match the specified query -> insert
+            # the data as a new document
+            return [self.insert(document)]
 
     def remove(
         self,
@@ -593,7 +1112,7 @@ class Table:
                 # We need to convince MyPy (the static type checker) that
                 # the ``cond is not None`` invariant still holds true when
                 # the updater function is called
-                _cond = cast(QueryLike, cond)
+                _cond = compile_query(cast(QueryLike, cond))
 
                 # We need to convert the keys iterator to a list because
                 # we may remove entries from the ``table`` dict during
@@ -620,11 +1139,12 @@ class Table:
         Truncate the table by removing all documents.
         """
 
-        # Update the table by resetting all data
-        self._update_table(lambda table: table.clear())
+        with self._lock.write():
+            # Update the table by resetting all data
+            self._update_table(lambda table: table.clear())
 
-        # Reset document ID counter
-        self._next_id = None
+            # Reset document ID counter
+            self._next_id = None
 
     def count(self, cond: QueryLike) -> int:
         """
@@ -635,6 +1155,29 @@ class Table:
 
         return len(self.search(cond))
 
+    def create_projection(self, path: str) -> None:
+        """
+        Keep the values of a numeric field in a columnar projection.
+
+        Searches that compare the field with a number (or use
+        :meth:`~tinydb.queries.Query.one_of`) are then evaluated on NumPy
+        arrays instead of document by document:
+
+        >>> table.create_projection('$.user.age')
+        >>> table.search((where('user').age >= 18) & (where('user').age < 30))
+
+        The projection is kept in memory and updated on every write through
+        this table. Requires NumPy.
+
+        :param path: the JSONPath of the field, e.g. ``'$.user.age'``
+        """
+
+        with self._lock.write():
+            if self._columns is None:
+                self._columns = ColumnStore()
+
+            self._columns.add(path, self._read_table())
+
     def clear_cache(self) -> None:
         """
         Clear the query cache.
@@ -642,12 +1185,105 @@ class Table:
 
         self._query_cache.clear()
 
+    def _reload(self) -> None:
+        """
+        Forget everything cached about the table's documents after another
+        process has written. The caller has to keep other threads from
+        using the table.
+        """
+
+        # Searches still scanning an older version must not cache it
+        self._version += 1
+
+        self.clear_cache()
+        self._next_id = None
+
+        if self._columns is not None:
+            self._columns.reset(self._read_table())
+
+    def _update_query_cache(
+        self,
+        changes: Dict[int, Optional[Mapping]],
+        originals: Dict[int, Optional[Mapping]]
+    ) -> None:
+        """
+        Patch the cached query results with the changed documents.
+
+        :param changes: the written documents by ID, ``None`` for removed ones
+        :param originals: the documents as they were before the write,
+                          ``None`` for new ones
+        """
+
+        if len(changes) > self.query_cache_patch_limit:
+            # Evaluating all cached queries on this many documents costs
+            # more than searching again when needed
+            self.clear_cache()
+            return
+
+        # Patching doesn't count as using the results. Custom cache classes
+        # may not be able to tell looking up from using, though.
+        peek = getattr(self._query_cache, 'peek', self._query_cache.get)
+
+        for cond in list(self._query_cache):
+            results = peek(cond)
+            if results is None:
+                continue
+
+            try:
+                patched = self._patch_results(results, compile_query(cond),
+                                              changes, originals)
+            except Exception:
+                # The query fails on a changed document. Searching again
+                # will report the error.
+                patched = False
+
+            if not patched:
+                del self._query_cache[cond]
+
+    def _patch_results(
+        self,
+        results: _QueryResults,
+        test: Callable[[Mapping], bool],
+        changes: Dict[int, Optional[Mapping]],
+        originals: Dict[int, Optional[Mapping]]
+    ) -> bool:
+        """
+        Patch the cached results of a query with the changed documents.
+
+        :returns: whether the results could be patched
+        """
+
+        docs = results.docs
+        results.changed()
+
+        for doc_id, doc in changes.items():
+            if doc is None or not test(doc):
+                docs.pop(doc_id, None)
+
+            elif doc_id in docs or originals.get(doc_id) is None:
+                # The results are in table order. Updated documents keep
+                # their position and new ones are added at the end.
+                docs[doc_id] = self.document_class(
+                    doc, self.document_id_class(doc_id))
+
+            else:
+                # An existing document now matches. We don't know where to
+                # put it without looking at the whole table.
+                return False
+
+        return True
+
     def __len__(self):
         """
         Count the total number of documents in this table.
         """
 
-        return len(self._read_table())
+        with self._lock.read():
+            meta = self._table_meta()
+            if meta is not None:
+                return meta.count
+
+            return len(self._read_table())
 
     def __iter__(self) -> Iterator[Document]:
         """
@@ -656,14 +1292,121 @@ class Table:
         :returns: an iterator over all documents.
         """
 
-        # Iterate all documents and their IDs
-        for doc_id, doc in self._read_table().items():
-            # Convert documents to the document class
-            yield self.document_class(doc, self.document_id_class(doc_id))
+        # Iterate over the current version of the table, so writes made
+        # while iterating don't get in the way
+        with self._lock.read():
+            table = self._read_table()
+            if isinstance(table, dict):
+                self._pin_table(table)
+            else:
+                doc_ids = list(table)
+
+        if not isinstance(table, dict):
+            # See iter_search
+            yield from self._iter_unpinned(doc_ids)
+            return
+
+        try:
+            # Iterate all documents and their IDs
+            for doc_id, doc in table.items():
+                # Convert documents to the document class
+                yield self.document_class(doc, self.document_id_class(doc_id))
+        finally:
+            self._unpin_table(table)
+
+    def _iter_unpinned(
+        self,
+        doc_ids: List[int],
+        test: Optional[Callable[[Mapping], bool]] = None
+    ) -> Iterator[Document]:
+        """
+        Iterate over the documents with the given IDs that pass ``test``,
+        reading each of them under the lock, but testing and yielding it
+        outside of the lock. Used for tables that can't be pinned without
+        holding the lock, see :meth:`iter_search`.
+        """
+
+        for doc_id in doc_ids:
+            with self._lock.read():
+                table = self._read_table()
+                doc = table[doc_id] if doc_id in table else None
+
+            if doc is not None and (test is None or test(doc)):
+                yield self.document_class(doc, self.document_id_class(doc_id))
+
+    @contextmanager
+    def snapshot(self) -> Iterator['TableSnapshot']:
+        """
+        Read a consistent version of the table.
+
+        The snapshot shows the table as it was when the snapshot has been
+        taken, even if it's written to meanwhile:
+
+        >>> with table.snapshot() as snapshot:
+        ...     adults = snapshot.search(where('age') >= 18)
+        ...     total = len(snapshot)
+
+        Writes don't wait for the snapshot to be closed. The first write
+        while the snapshot is open copies the table's ``dict``, the
+        documents themselves are shared.
+
+        Tables the storage keeps in a data structure of its own (e.g.
+        :class:`~tinydb.paged_storage.PagedStorage`) can't be copied
+        cheaply, so their snapshots hold the lock for reading instead.
+        Writes then wait for the snapshot to be closed, and writing from
+        the thread that holds it raises a :class:`RuntimeError`.
+
+        :returns: a context manager providing a :class:`TableSnapshot`
+        """
+
+        with self._lock.read():
+            table = self._pin_table()
+
+        try:
+            yield TableSnapshot(self, table)
+        finally:
+            self._unpin_table(table)
+
+    def _pin_table(
+        self,
+        table: Optional[Mapping[int, Mapping]] = None
+    ) -> Mapping[int, Mapping]:
+        """
+        Get the current version of the table and keep writers from changing
+        it until it's unpinned with :meth:`_unpin_table`. The caller has to
+        hold the lock for reading.
+
+        :param table: the current version, if the caller has read it already
+        """
+
+        if table is None:
+            table = self._read_table()
+
+        if isinstance(table, dict):
+            with self._pins_lock:
+                self._pins[id(table)] = self._pins.get(id(table), 0) + 1
+        else:
+            # Tables the storage keeps in a data structure of its own can't
+            # be copied cheaply, so the reader keeps holding the lock. That
+            # keeps the thread from writing until it unpins the table, so
+            # iterators don't pin these tables, see iter_search.
+            self._lock.acquire_read()
+
+        return table
+
+    def _unpin_table(self, table: Mapping[int, Mapping]) -> None:
+        if isinstance(table, dict):
+            with self._pins_lock:
+                count = self._pins.pop(id(table)) - 1
+                if count:
+                    self._pins[id(table)] = count
+        else:
+            self._lock.release_read()
 
     def _get_next_id(self):
         """
-        Return the ID for a newly inserted document.
+        Return the ID for a newly inserted document. The caller has to hold
+        the lock for writing.
         """
 
         # If we already know the next ID
@@ -673,6 +1416,15 @@ class Table:
 
             return next_id
 
+        # The storage may know the next ID without reading the table. It
+        # only knows about integer IDs.
+        meta = self._table_meta() if self.document_id_class is int else None
+        if meta is not None:
+            next_id = meta.next_id
+            self._next_id = next_id + 1
+
+            return next_id
+
         # Determine the next document ID by finding out the max ID value
         # of the current table documents
 
@@ -687,7 +1439,7 @@ class Table:
             return next_id
 
         # Determine the next ID based on the maximum ID that's currently in use
-        max_id = max(self.document_id_class(i) for i in table.keys())
+        max_id = max(table.keys())
         next_id = max_id + 1
 
         # The next ID we will return AFTER this call needs to be larger than
@@ -696,79 +1448,158 @@ class Table:
 
         return next_id
 
-    def _read_table(self) -> Dict[str, Mapping]:
+    def _table_meta(self) -> Optional[TableMeta]:
+        """
+        Get the table's metadata from the storage, if it knows it. The caller
+        has to hold the lock.
+        """
+
+        # The storage doesn't know the changes of a transaction yet
+        if self._transaction is not None:
+            return None
+
+        return self._storage.table_meta(self.name)
+
+    def _read_table(self) -> Dict[int, Mapping]:
         """
         Read the table data from the underlying storage.
 
-        Documents and doc_ids are NOT yet transformed, as
-        we may not want to convert *all* documents when returning
-        only one document for example.
+        Documents are NOT yet transformed, as we may not want to convert
+        *all* documents when returning only one document for example.
         """
 
-        # Retrieve the tables from the storage
-        tables = self._storage.read()
+        # Retrieve the tables from the storage, or from the transaction
+        # which knows the changes that haven't been written yet
+        if self._transaction is not None:
+            tables = self._transaction.read()
+        else:
+            tables = self._storage.read()
 
         if tables is None:
             # The database is empty
             return {}
 
         # Retrieve the current table's data
-        try:
-            table = tables[self.name]
-        except KeyError:
+        if self.name not in tables:
             # The table does not exist yet, so it is empty
             return {}
 
+        return self._convert_ids(tables)
+
+    def _convert_ids(self, tables: Dict[str, Dict]) -> Dict[int, Mapping]:
+        """
+        Get the table's data, making sure its document IDs are instances of
+        ``document_id_class``.
+
+        Storages convert document IDs to ints, which leaves the IDs of
+        tables with a custom ``document_id_class`` to us. The converted
+        table replaces the original one in ``tables``, so it's converted
+        once per read of the storage.
+        """
+
+        table = tables[self.name]
+
+        for doc_id in table:
+            if not isinstance(doc_id, self.document_id_class):
+                table = tables[self.name] = {
+                    self.document_id_class(doc_id): doc
+                    for doc_id, doc in table.items()
+                }
+            break
+
         return table
 
     def _update_table(self, updater: Callable[[Dict[int, Mapping]], None]):
         """
         Perform a table update operation.
 
-        The storage interface used by TinyDB only allows to read/write the
-        complete database data, but not modifying only portions of it. Thus,
-        to only update portions of the table data, we first perform a read
+        The storage interface used by TinyDB only allows to read the
+        complete database data, but not only portions of it. Thus, to only
+        update portions of the table data, we first perform a read
         operation, perform the update on the table data and then write
         the updated data back to the storage.
 
+        The updater works on a view of the table that records every
+        document it writes or removes. These changes are passed to
+        :meth:`~tinydb.storages.Storage.write_changes` so storages that can
+        persist partial updates only have to write the changed documents.
+        For this to work, updaters must store modified documents back into
+        the table instead of modifying them in place.
+
         As a further optimization, we don't convert the documents into the
         document class, as the table data will *not* be returned to the user.
         """
 
-        tables = self._storage.read()
-
-        if tables is None:
-            # The database is empty
-            tables = {}
-
-        try:
-            raw_table = tables[self.name]
-        except KeyError:
-            # The table does not exist yet, so it is empty
-            raw_table = {}
-
-        # Convert the document IDs to the document ID class.
-        # This is required as the rest of TinyDB expects the document IDs
-        # to be an instance of ``self.document_id_class`` but the storage
-        # might convert dict keys to strings.
-        table = {
-            self.document_id_class(doc_id): doc
-            for doc_id, doc in raw_table.items()
-        }
-
-        # Perform the table update operation
-        updater(table)
-
-        # Convert the document IDs back to strings.
-        # This is required as some storages (most notably the JSON file format)
-        # don't support IDs other than strings.
-        tables[self.name] = {
-            str(doc_id): doc
-            for doc_id, doc in table.items()
-        }
-
-        # Write the newly updated data back to the storage
-        self._storage.write(tables)
-
-        # Clear the query cache, as the table contents have changed
-        self.clear_cache()
+        with self._lock.write():
+            transaction = self._transaction
+            if transaction is not None:
+                tables = transaction.read()
+            else:
+                tables = self._storage.read()
+
+            if tables is None:
+                # The database is empty
+                tables = {}
+
+            # Document IDs are kept as ints all the way down to the storage.
+            # Storages that only support string keys (most notably the JSON
+            # file format) convert them when writing and reading the data, so
+            # we can update the table data in place.
+            created = self.name not in tables
+            if created:
+                # The table does not exist yet, so it is empty
+                tables[self.name] = {}
+
+            table = self._convert_ids(tables)
+
+            # Readers are scanning the current version of the table, so we
+            # write a new version instead. Copying the ``dict`` is enough, as
+            # documents are never modified in place.
+            copied = id(table) in self._pins
+            if copied:
+                table = dict(table)
+
+            original = tables[self.name]
+
+            def undo():
+                # As the table data is updated in place, we have to undo the
+                # changes the updater made (unless they have been made to a
+                # copy)
+                if created:
+                    del tables[self.name]
+                elif copied:
+                    tables[self.name] = original
+                else:
+                    tracked.rollback()
+
+            # Perform the table update operation, recording which documents
+            # have changed
+            tracked = _TrackedTable(table)
+            try:
+                updater(tracked)
+            except BaseException:
+                undo()
+                raise
+
+            if copied:
+                # Publish the new version
+                tables[self.name] = table
+
+            self._version += 1
+
+            if transaction is not None:
+                # The transaction writes the changes when it's committed
+                transaction.record(self, tracked.changes, undo)
+            else:
+                # Write the newly updated data back to the storage
+                self._storage.write_changes(tables, {self.name: tracked.changes})
+                if tracked.changes:
+                    self._lock.mark_written()
+                self._lock.after_write(self._storage.wait_durable)
+
+            # Update the projections with the changed documents
+            if self._columns is not None:
+                self._columns.apply(tracked.changes)
+
+            # Update the query cache, as the table contents have changed
+            self._update_query_cache(tracked.changes, tracked._originals)
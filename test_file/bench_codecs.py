@@ -0,0 +1,85 @@
+import time
+import random
+import argparse
+from tinydb_test.serialization import CODECS, JSONCodec, get_codec
+from insert_data_nested import build_nested_payload
+
+
+def normal_dataset():
+    ''' The documents inserted by insert_data_normal.py '''
+    return ([{"user": {'id': f'user_{i:06}', 'age': i}} for i in range(30000)] +
+            [{"user": {'id': f'user_{i:06}', 'age': i}} for i in range(15000)] +
+            [{"user": {
+                'hello': f'user_{i:06}',
+                'age': i,
+                'data': {
+                    'first': i,
+                    'second': i + i
+                }
+            }} for i in range(23000, 50000)])
+
+
+def nested_dataset(size):
+    ''' The documents inserted by insert_data_nested.py '''
+    docs = []
+    for lvl in [1, 3, 5, 7, 9, 11]:
+        docs.extend(build_nested_payload(i, lvl) for i in range(size))
+    return docs
+
+
+def as_database(docs):
+    ''' Lay the documents out the way a storage receives them '''
+    return {'_default': {str(doc_id): doc for doc_id, doc in enumerate(docs, 1)}}
+
+
+def run_benchmark(data, iterations):
+    # The settings the test scripts open their databases with
+    codecs = {'json (indent=4, sort_keys)': JSONCodec(sort_keys=True, indent=4,
+                                                      separators=(',', ': '))}
+    codecs.update((name, get_codec(name)) for name in CODECS)
+
+    def average_time(times):
+        return sum(times) / len(times) if times else float('inf')
+
+    results = {}
+    for name, codec in codecs.items():
+        encode_times = []
+        decode_times = []
+
+        for _ in range(iterations):
+            start = time.time()
+            encoded = codec.encode(data)
+            encode_times.append(time.time() - start)
+
+            start = time.time()
+            codec.decode(encoded)
+            decode_times.append(time.time() - start)
+
+        results[name] = (average_time(encode_times), average_time(decode_times), len(encoded))
+
+    baseline = results['json (indent=4, sort_keys)']
+    print(f"{'codec':<28}{'encode (s)':>12}{'decode (s)':>12}{'size (MB)':>12}{'size (%)':>10}")
+    for name, (encode_time, decode_time, size) in results.items():
+        print(f"{name:<28}{encode_time:>12.4f}{decode_time:>12.4f}"
+              f"{size / 2 ** 20:>12.2f}{size / baseline[2] * 100:>10.1f}")
+
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-i', type=int, default=5, help='runs per codec')
+    parser.add_argument('-n', type=int, default=3000, help='nested documents per level')
+    args = parser.parse_args()
+
+    random.seed(0)
+
+    print("=== Dataset: insert_data_normal ===")
+    run_benchmark(as_database(normal_dataset()), args.i)
+
+    print("\n=== Dataset: insert_data_nested ===")
+    run_benchmark(as_database(nested_dataset(args.n)), args.i)
+
+
+if __name__ == '__main__':
+    main()
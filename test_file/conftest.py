@@ -0,0 +1,22 @@
+"""
+Shared setup of the tests.
+
+Like the scripts in this directory, the tests import the package as
+``tinydb_test``, so run them from the directory that contains it:
+
+    python -m pytest tinydb_test/test_file
+"""
+
+import pytest
+
+# The query benchmarks are scripts plotting with matplotlib, not tests
+collect_ignore_glob = ['test_query_*.py']
+
+
+@pytest.fixture(autouse=True)
+def in_tmp_path(tmp_path, monkeypatch):
+    """
+    Run every test in a directory of its own, as indexes are created in the
+    working directory.
+    """
+    monkeypatch.chdir(tmp_path)
@@ -0,0 +1,166 @@
+import asyncio
+import threading
+
+from tinydb_test import TinyDB, where
+from tinydb_test.async_indexed_tinydb import AsyncIndexedTinyDB
+
+
+def run(test):
+    """Run a test coroutine with a fresh database."""
+    async def main():
+        async with AsyncIndexedTinyDB('db.json', max_workers=4) as db:
+            await db.create_index('$.name', 'name', 'TEXT')
+            await db.create_index('$.age', 'age', 'NUMERIC')
+            await test(db)
+
+    asyncio.run(main())
+
+
+def test_concurrent_inserts_are_batched():
+    async def test(db):
+        batches = []
+        insert_batch = db._insert_batch
+
+        def counting(documents):
+            batches.append(len(documents))
+            return insert_batch(documents)
+
+        db._insert_batch = counting
+
+        doc_ids = await asyncio.gather(*[
+            db.insert({'name': 'n%d' % i, 'age': i}) for i in range(50)
+        ])
+
+        assert doc_ids == list(range(1, 51))
+        assert sum(batches) == 50
+        assert len(batches) < 50
+        assert await db.search(('name', 'n7')) == [{'name': 'n7', 'age': 7}]
+        assert len(await db.search({'age': (10, 20)})) == 10
+
+    run(test)
+
+
+def test_invalid_documents_only_fail_their_insert():
+    async def test(db):
+        results = await asyncio.gather(
+            db.insert({'name': 'x' * 1000}),
+            db.insert({'name': 'ok', 'age': 99}),
+            return_exceptions=True
+        )
+
+        assert isinstance(results[0], ValueError)
+        assert results[1] == 1
+        assert await db.search(where('name').exists()) == [
+            {'name': 'ok', 'age': 99}
+        ]
+
+    run(test)
+
+
+def test_concurrent_searches_are_shared():
+    async def test(db):
+        await db.insert_multiple({'name': 'n%d' % i, 'age': i}
+                                 for i in range(20))
+
+        searches = []
+        search = db.db.search
+
+        def counting(*args, **kwargs):
+            searches.append(args)
+            return search(*args, **kwargs)
+
+        db.db.search = counting
+
+        results = await asyncio.gather(*[db.search(where('age') == 7)
+                                         for _ in range(10)])
+
+        assert len(searches) == 1
+        assert all(result == [{'name': 'n7', 'age': 7}]
+                   for result in results)
+
+    run(test)
+
+
+def test_reads_see_finished_writes():
+    async def test(db):
+        doc_id = await db.insert({'name': 'a', 'age': 1})
+        assert await db.get(doc_id=doc_id) == {'name': 'a', 'age': 1}
+
+        await db.update({'age': 2}, where('name') == 'a')
+        assert await db.get(doc_id=doc_id) == {'name': 'a', 'age': 2}
+        assert await db.search(where('age') == 2) == [{'name': 'a', 'age': 2}]
+
+        await db.remove(doc_ids=[doc_id])
+        assert await db.get(doc_id=doc_id) is None
+        assert await db.search(where('age') == 2) == []
+
+    run(test)
+
+
+def test_reads_made_during_a_write_arent_shared_after_it():
+    async def test(db):
+        await db.insert({'name': 'a', 'n': 1})
+
+        # The update waits for the search to read, the search finishes
+        # after the update
+        read, release = threading.Event(), threading.Event()
+        search, update = db.db.search, db.db.update
+
+        def slow_search(*args, **kwargs):
+            results = search(*args, **kwargs)
+            if not read.is_set():
+                read.set()
+                release.wait(5)
+            return results
+
+        def slow_update(*args, **kwargs):
+            read.wait(5)
+            return update(*args, **kwargs)
+
+        db.db.search, db.db.update = slow_search, slow_update
+        query = where('name') == 'a'
+
+        write = asyncio.ensure_future(db.update({'n': 2}, doc_ids=[1]))
+        await asyncio.sleep(0)
+        during = asyncio.ensure_future(db.search(query))
+        await write
+
+        after = asyncio.ensure_future(db.search(query))
+        await asyncio.sleep(0)
+        release.set()
+
+        assert await during == [{'name': 'a', 'n': 1}]
+        assert await after == [{'name': 'a', 'n': 2}]
+
+    run(test)
+
+
+def test_reads_during_inserts():
+    async def test(db):
+        inserts = [asyncio.ensure_future(db.insert({'name': 'n', 'age': i}))
+                   for i in range(20)]
+        found = await asyncio.gather(*[db.search(('name', 'n'))
+                                       for _ in range(5)])
+        await asyncio.gather(*inserts)
+
+        # Each batch is committed as a whole
+        assert all(len(docs) in (0, 20) for docs in found)
+        assert len(await db.search(('name', 'n'))) == 20
+
+    run(test)
+
+
+def test_close_writes_pending_inserts():
+    async def main():
+        db = AsyncIndexedTinyDB('db.json')
+        pending = [asyncio.ensure_future(db.insert({'n': i}))
+                   for i in range(10)]
+        await asyncio.sleep(0)
+        await db.close()
+        await asyncio.gather(*pending)
+
+    asyncio.run(main())
+
+    db = TinyDB('db.json')
+    assert len(db) == 10
+    db.close()
@@ -0,0 +1,150 @@
+import multiprocessing
+import os
+import threading
+
+import pytest
+
+from tinydb_test import where
+from tinydb_test.indexed_tinydb import IndexedTinyDB
+from tinydb_test.table import Transaction
+
+
+def open_db():
+    db = IndexedTinyDB('db.json')
+    db.create_index('$.n', 'n', 'NUMERIC')
+    db.create_index('$.s', 's', 'TEXT')
+    return db
+
+
+def crash(*args):
+    os._exit(3)
+
+
+def insert_and_crash(point, n):
+    db = open_db()
+    if point == 'storage':
+        # Before the documents are written
+        Transaction.commit = crash
+    elif point == 'index':
+        # Before the index entries are written
+        db.index_manager.write_pending = crash
+    elif point == 'sync':
+        # Before the posting lists reach the disk
+        db.index_manager.sync_pointer_stores = crash
+    elif point == 'log':
+        # Before the log record is complete
+        db.commit_log.commit = crash
+
+    db.insert({'n': n, 's': 'v%d' % n})
+
+
+def search(db, n):
+    return (db.search(('n', n)), db.search(('s', 'v%d' % n)),
+            db.search(where('n') == n))
+
+
+@pytest.fixture
+def existing():
+    db = open_db()
+    db.insert({'n': 1, 's': 'a'})
+    db.insert_multiple({'n': 10 + i, 's': 'm%d' % i} for i in range(5))
+    db.close()
+
+
+def test_commit_empties_the_log():
+    db = open_db()
+    db.insert({'n': 1, 's': 'a'})
+
+    assert os.path.getsize(db.commit_log.path) == 0
+    db.close()
+
+
+def test_rejected_documents_write_nothing():
+    db = open_db()
+    db.insert({'n': 1, 's': 'a'})
+
+    with pytest.raises(ValueError):
+        db.insert({'n': 2, 's': 'x' * 1000})
+
+    assert len(db) == 1
+    assert db.search(('n', 2)) == []
+    assert db.insert({'n': 3, 's': 'c'}) == 2
+    db.close()
+
+
+@pytest.mark.parametrize('point', ['storage', 'index', 'sync'])
+def test_committed_writes_are_recovered(existing, point):
+    process = multiprocessing.Process(target=insert_and_crash,
+                                      args=(point, 100))
+    process.start()
+    process.join()
+    assert process.exitcode == 3
+
+    db = open_db()
+    assert [len(found) for found in search(db, 100)] == [1, 1, 1]
+    assert os.path.getsize(db.commit_log.path) == 0
+    assert db.verify_index('n') == []
+    assert db.verify_index('s') == []
+    assert len(db.search(('n', 12))) == 1
+    db.close()
+
+
+def test_uncommitted_writes_are_discarded(existing):
+    process = multiprocessing.Process(target=insert_and_crash,
+                                      args=('log', 100))
+    process.start()
+    process.join()
+    assert process.exitcode == 3
+
+    db = open_db()
+    assert search(db, 100) == ([], [], [])
+    assert len(db) == 6
+    assert db.verify_index('n') == []
+    db.close()
+
+
+def test_recovery_only_redoes_the_logged_writes(existing, monkeypatch):
+    process = multiprocessing.Process(target=insert_and_crash,
+                                      args=('index', 100))
+    process.start()
+    process.join()
+
+    redone = []
+    recover = IndexedTinyDB.recover
+
+    def counting(self):
+        redone.extend(self.commit_log.records())
+        return recover(self)
+
+    monkeypatch.setattr(IndexedTinyDB, 'recover', counting)
+
+    db = open_db()
+    assert len(redone) == 1
+    assert list(redone[0]['changes']['_default']) == ['7']
+    db.close()
+
+
+def test_concurrent_writers_keep_indexes_consistent():
+    db = open_db()
+    errors = []
+
+    def insert(base):
+        try:
+            for i in range(base, base + 30):
+                db.insert({'n': i, 's': 'v%d' % i})
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=insert, args=(base,))
+               for base in (0, 100, 200, 300)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert errors == []
+    assert len(db) == 120
+    assert db.verify_index('n') == []
+    assert db.verify_index('s') == []
+    assert os.path.getsize(db.commit_log.path) == 0
+    db.close()
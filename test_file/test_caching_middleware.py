@@ -0,0 +1,270 @@
+import copy
+import os
+import threading
+import time
+
+import pytest
+
+from tinydb_test import TinyDB
+from tinydb_test.log_storage import LogStorage
+from tinydb_test.middlewares import CachingMiddleware
+from tinydb_test.storages import MemoryStorage
+
+
+class RecordingStorage(MemoryStorage):
+    """A storage remembering how it has been written to."""
+
+    def __init__(self):
+        super().__init__()
+        self.writes = []
+
+    def write(self, data):
+        self.writes.append(('write', None))
+        super().write(copy.deepcopy(data))
+
+    def write_changes(self, data, changes):
+        self.writes.append(('write_changes', copy.deepcopy(changes)))
+        super().write(copy.deepcopy(data))
+
+
+def test_flush_passes_the_changed_documents():
+    db = TinyDB(storage=CachingMiddleware(RecordingStorage))
+    db.insert_multiple({'n': i} for i in range(100))
+    db.storage.flush()
+    db.storage.writes.clear()
+
+    db.update({'n': -1}, doc_ids=[50])
+    db.table('other').insert({'m': 1})
+    db.storage.flush()
+
+    assert db.storage.writes == [
+        ('write_changes', {'_default': {50: {'n': -1}},
+                           'other': {1: {'m': 1}}})
+    ]
+    assert db.storage.memory['_default'][50] == {'n': -1}
+
+
+def test_flush_merges_changes_since_the_last_flush():
+    db = TinyDB(storage=CachingMiddleware(RecordingStorage))
+    db.insert_multiple({'n': i} for i in range(3))
+    db.storage.flush()
+    db.storage.writes.clear()
+
+    db.update({'n': 10}, doc_ids=[1])
+    db.update({'n': 20}, doc_ids=[1])
+    db.remove(doc_ids=[2])
+    db.storage.flush()
+
+    assert db.storage.writes == [
+        ('write_changes', {'_default': {1: {'n': 20}, 2: None}})
+    ]
+
+
+def test_flush_without_changes_writes_nothing():
+    db = TinyDB(storage=CachingMiddleware(RecordingStorage))
+    db.insert({'n': 1})
+    db.storage.flush()
+    db.storage.writes.clear()
+
+    db.storage.flush()
+
+    assert db.storage.writes == []
+
+
+def test_dropped_and_recreated_table_writes_everything():
+    db = TinyDB(storage=CachingMiddleware(RecordingStorage))
+    db.table('t').insert({'n': 1})
+    db.storage.flush()
+    db.storage.writes.clear()
+
+    db.drop_table('t')
+    db.table('t').insert({'n': 2})
+    db.storage.flush()
+
+    assert db.storage.writes == [('write', None)]
+    assert db.storage.memory['t'] == {1: {'n': 2}}
+
+
+def test_unknown_changes_write_everything():
+    db = TinyDB(storage=CachingMiddleware(RecordingStorage))
+    db.insert({'n': 1})
+    db.storage.flush()
+    db.storage.writes.clear()
+
+    # A plain write doesn't say what has changed
+    db.storage.write({'_default': {1: {'n': 2}}})
+    db.storage.flush()
+
+    assert db.storage.writes == [('write', None)]
+
+
+def test_storages_without_partial_writes_get_the_whole_state():
+    class FullStorage(MemoryStorage):
+        def __init__(self):
+            super().__init__()
+            self.written = []
+
+        def write(self, data):
+            self.written.append(copy.deepcopy(data))
+            super().write(data)
+
+    db = TinyDB(storage=CachingMiddleware(FullStorage))
+    db.insert_multiple({'n': i} for i in range(3))
+    db.update({'n': -1}, doc_ids=[2])
+    db.storage.flush()
+
+    assert db.storage.written == [
+        {'_default': {1: {'n': 0}, 2: {'n': -1}, 3: {'n': 2}}}
+    ]
+
+
+def test_flush_to_log_storage_costs_the_changes(tmp_path):
+    path = str(tmp_path / 'db')
+
+    def size():
+        return sum(os.path.getsize(os.path.join(path, name))
+                   for name in os.listdir(path) if name.endswith('.log'))
+
+    db = TinyDB(path, storage=CachingMiddleware(LogStorage))
+    db.insert_multiple({'n': i, 'pad': 'x' * 100} for i in range(1000))
+    db.storage.flush()
+
+    before = size()
+    db.update({'n': -1}, doc_ids=[5])
+    db.storage.flush()
+
+    assert 0 < size() - before < 300
+    db.close()
+
+    db = TinyDB(path, storage=LogStorage)
+    assert db.get(doc_id=5)['n'] == -1
+    assert len(db) == 1000
+    db.close()
+
+
+def wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.01)
+
+    return True
+
+
+class ThreadRecordingStorage(MemoryStorage):
+    """A storage remembering which threads have written to it."""
+
+    def __init__(self):
+        super().__init__()
+        self.threads = []
+
+    def write_changes(self, data, changes):
+        self.threads.append(threading.current_thread())
+        super().write(copy.deepcopy(data))
+
+
+def test_max_age_flushes_in_the_background():
+    db = TinyDB(storage=CachingMiddleware(ThreadRecordingStorage,
+                                          max_age=0.05))
+    db.insert({'n': 1})
+
+    assert wait_for(lambda: db.storage.memory is not None)
+    assert db.storage.memory == {'_default': {1: {'n': 1}}}
+    assert threading.current_thread() not in db.storage.threads
+    db.close()
+
+
+def test_max_bytes_flushes_in_the_background():
+    db = TinyDB(storage=CachingMiddleware(ThreadRecordingStorage,
+                                          max_bytes=1000))
+    db.insert({'pad': 'x' * 100})
+    time.sleep(0.1)
+    assert db.storage.memory is None
+
+    db.insert_multiple({'pad': 'x' * 100} for _ in range(20))
+
+    assert wait_for(lambda: db.storage.memory is not None)
+    assert threading.current_thread() not in db.storage.threads
+    db.close()
+
+
+def test_full_cache_is_flushed_in_the_background(monkeypatch):
+    monkeypatch.setattr(CachingMiddleware, 'WRITE_CACHE_SIZE', 10)
+    db = TinyDB(storage=CachingMiddleware(ThreadRecordingStorage,
+                                          max_age=60))
+    for i in range(10):
+        db.insert({'n': i})
+
+    assert wait_for(lambda: db.storage.memory is not None)
+    assert threading.current_thread() not in db.storage.threads
+    db.close()
+
+
+def test_close_flushes_and_stops_the_flusher():
+    db = TinyDB(storage=CachingMiddleware(ThreadRecordingStorage,
+                                          max_age=60))
+    db.insert({'n': 1})
+    flusher = db.storage._flusher
+    db.close()
+
+    assert not flusher.is_alive()
+    assert db.storage.memory == {'_default': {1: {'n': 1}}}
+
+
+def test_writes_while_flushing_are_not_lost():
+    db = TinyDB(storage=CachingMiddleware(ThreadRecordingStorage,
+                                          max_age=0.001))
+    for i in range(500):
+        db.insert({'n': i})
+    db.close()
+
+    assert len(db.storage.memory['_default']) == 500
+
+
+def test_transactions_are_flushed_when_committed():
+    db = TinyDB(storage=CachingMiddleware(ThreadRecordingStorage,
+                                          max_age=0.01))
+
+    try:
+        with db.transaction():
+            db.insert({'n': 1})
+            time.sleep(0.1)
+            assert db.storage.memory is None
+            raise KeyError
+    except KeyError:
+        pass
+
+    time.sleep(0.1)
+    assert db.storage.memory is None
+
+    with db.transaction():
+        db.insert({'n': 2})
+        time.sleep(0.1)
+        assert db.storage.memory is None
+
+    assert wait_for(lambda: db.storage.memory is not None)
+    assert db.storage.memory == {'_default': {1: {'n': 2}}}
+    db.close()
+
+
+def test_failed_background_flush_is_retried():
+    class FlakyStorage(ThreadRecordingStorage):
+        failures = 1
+
+        def write_changes(self, data, changes):
+            if self.failures:
+                self.failures -= 1
+                raise OSError('disk full')
+
+            super().write_changes(data, changes)
+
+    db = TinyDB(storage=CachingMiddleware(FlakyStorage, max_age=0.01))
+    with pytest.warns(UserWarning, match='disk full'):
+        db.insert({'n': 1})
+        assert wait_for(lambda: db.storage.failures == 0)
+        # Retried after the flusher's pause
+        assert wait_for(lambda: db.storage.memory is not None)
+
+    assert db.storage.memory == {'_default': {1: {'n': 1}}}
+    db.close()
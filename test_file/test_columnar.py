@@ -0,0 +1,179 @@
+import random
+import threading
+
+import pytest
+
+from tinydb_test import Query, TinyDB, where
+from tinydb_test.storages import MemoryStorage
+
+pytest.importorskip('numpy')
+
+VALUES = [1, 2.5, 3, True, None, 'x', [1], {'a': 1}, 2 ** 60, 7, 10, 42]
+
+AGE = where('user').age
+
+# Queries that work with values of any type
+EQUALITY_QUERIES = [
+    AGE == 3,
+    AGE != 3,
+    AGE.one_of([1, 'x', 42]),
+    AGE == 'x',
+    AGE.exists(),
+    ~(AGE == 1) | (AGE == 'x'),
+    Query().noop(),
+]
+
+# Queries that only work with numbers
+ORDER_QUERIES = [
+    AGE < 7,
+    AGE >= 2.5,
+    AGE > 2 ** 60 - 5,
+    ~(AGE < 7),
+    (AGE > 2) & ~(AGE == 10) | (AGE == 'x'),
+]
+
+
+def documents(count):
+    rng = random.Random(1)
+    docs = []
+    for i in range(count):
+        if i % 7:
+            docs.append({'user': {'age': rng.choice(VALUES)}})
+        elif i % 2:
+            docs.append({'user': 5})
+        else:
+            docs.append({'other': 1})
+
+    return docs
+
+
+@pytest.fixture
+def tables():
+    docs = documents(1000)
+
+    projected = TinyDB(storage=MemoryStorage).table('t')
+    projected.insert_multiple(docs)
+    projected.create_projection('$.user.age')
+
+    plain = TinyDB(storage=MemoryStorage).table('t')
+    plain.insert_multiple(docs)
+
+    return projected, plain
+
+
+def only_numbers(tables):
+    for table in tables:
+        table.remove(AGE.test(
+            lambda value: not isinstance(value, (int, float))))
+
+
+def assert_same_results(projected, plain, queries=EQUALITY_QUERIES):
+    for query in queries:
+        expected = [(doc.doc_id, doc) for doc in plain.search(query)]
+        assert [(doc.doc_id, doc) for doc in projected.search(query)] \
+            == expected, query
+
+
+def test_search_matches_plain_search(tables):
+    assert_same_results(*tables)
+
+    only_numbers(tables)
+    assert_same_results(*tables, EQUALITY_QUERIES + ORDER_QUERIES)
+
+
+def test_numeric_queries_are_evaluated_on_the_projection(tables):
+    only_numbers(tables)
+    projected, plain = tables
+
+    doc_ids = projected._columns.search(AGE >= 10, projected._read_table())
+
+    assert doc_ids == [doc.doc_id for doc in plain.search(AGE >= 10)]
+
+
+def test_other_queries_are_not_evaluated_on_the_projection(tables):
+    projected, _ = tables
+    table = projected._read_table()
+
+    assert projected._columns.search(AGE == 'x', table) is None
+    assert projected._columns.search(where('other') == 1, table) is None
+    assert projected._columns.search(
+        AGE.map(lambda value: value) == 1, table) is None
+
+
+def test_projection_is_updated_on_writes(tables):
+    only_numbers(tables)
+    for table in tables:
+        table.remove(AGE == 3)
+        table.update({'user': {'age': 3}}, AGE == 42)
+        table.insert({'user': {'age': -1}})
+        table.update({'user': 'gone'}, AGE == 7)
+        table.insert_multiple({'user': {'age': i}} for i in range(500))
+
+    assert_same_results(*tables, EQUALITY_QUERIES + ORDER_QUERIES)
+
+
+def test_projection_grows_and_shrinks(tables):
+    projected, _ = tables
+    projected.truncate()
+    projected.insert_multiple({'user': {'age': i}} for i in range(5000))
+    projected.remove(AGE >= 100)
+
+    assert [doc['user']['age'] for doc in projected.search(AGE > 97)] \
+        == [98, 99]
+    assert projected._columns._size <= len(projected._columns._doc_ids)
+
+
+def test_concurrent_searches_resync_once(tables, monkeypatch):
+    only_numbers(tables)
+    projected, plain = tables
+    columns = projected._columns
+
+    resets = []
+    reset = columns.reset
+    monkeypatch.setattr(columns, 'reset',
+                        lambda table: resets.append(1) or reset(table))
+
+    # Change the table behind the projection's back
+    for table in tables:
+        del table._read_table()[next(iter(table._read_table()))]
+
+    expected = [doc.doc_id for doc in plain.search(AGE >= 10)]
+    barrier = threading.Barrier(8, timeout=5)
+    results = []
+
+    def search():
+        barrier.wait()
+        results.append(columns.search(AGE >= 10, projected._read_table()))
+
+    threads = [threading.Thread(target=search) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert resets == [1]
+    assert results == [expected] * 8
+
+
+def test_bracket_and_index_paths():
+    table = TinyDB(storage=MemoryStorage).table('t')
+    table.insert_multiple([{'scores': [5, 1]}, {'scores': [1]},
+                           {'scores': 'x'}, {'a b': 3}])
+    table.create_projection('$.scores[0]')
+    table.create_projection('$["a b"]')
+
+    assert table._columns.paths == ['$.scores[0]', '$["a b"]']
+
+    query = Query()['scores'][0] >= 2
+    assert table._columns.search(query, table._read_table()) == [1]
+    assert table.search(query) == [{'scores': [5, 1]}]
+    assert table._columns.search(Query()['a b'] == 3,
+                                 table._read_table()) == [4]
+
+
+@pytest.mark.parametrize('path', ['$.users[*].age', '$..age', '$.user.*'])
+def test_paths_to_many_fields_are_rejected(path):
+    table = TinyDB(storage=MemoryStorage).table('t')
+
+    with pytest.raises(ValueError):
+        table.create_projection(path)
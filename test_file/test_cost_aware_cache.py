@@ -0,0 +1,173 @@
+import pickle
+import threading
+
+import pytest
+
+from tinydb_test import TinyDB, where
+from tinydb_test.indexed_tinydb import IndexedTinyDB
+from tinydb_test.storages import MemoryStorage
+from tinydb_test.utils import CostAwareCache, FrozenList, LRUCache
+
+
+@pytest.fixture
+def db():
+    db = TinyDB(storage=MemoryStorage)
+    db.insert_multiple({'v': i} for i in range(1000))
+    return db
+
+
+def test_hits_return_the_same_frozen_results(db):
+    first = db.search(where('v') < 10)
+    second = db.search(where('v') < 10)
+
+    assert first is second
+    assert isinstance(first, FrozenList)
+    assert first == [{'v': i} for i in range(10)]
+    with pytest.raises(TypeError):
+        first.append({'v': -1})
+    with pytest.raises(TypeError):
+        first[0] = {'v': -1}
+
+
+def test_frozen_results_can_be_pickled(db):
+    results = db.search(where('v') < 3)
+
+    assert pickle.loads(pickle.dumps(results)) == results
+
+
+def test_writes_dont_change_returned_results(db):
+    first = db.search(where('v') < 10)
+    db.insert({'v': 5})
+    second = db.search(where('v') < 10)
+
+    assert second is not first
+    assert len(first) == 10
+    assert len(second) == 11
+
+
+def test_tables_share_the_database_cache(db):
+    db.search(where('v') == 1)
+    db.table('other').search(where('v') == 1)
+
+    assert len(db._query_cache) == 2
+
+    db.drop_table('other')
+    assert len(db._query_cache) == 1
+
+    db.drop_tables()
+    assert len(db._query_cache) == 0
+
+
+def test_tables_with_a_cache_size_have_their_own_cache(db):
+    table = db.table('own', cache_size=3)
+
+    assert isinstance(table._query_cache, LRUCache)
+
+
+def test_database_cache_can_be_disabled():
+    class Uncached(TinyDB):
+        query_cache_bytes = None
+
+    db = Uncached(storage=MemoryStorage)
+
+    assert db._query_cache is None
+    assert isinstance(db.table('t')._query_cache, LRUCache)
+
+
+def test_cheap_large_entries_are_evicted_first():
+    cache = CostAwareCache(max_bytes=1000)
+    cache.set('a', 1, 'expensive', cost=10, size=100)
+    cache.set('a', 2, 'cheap', cost=0.1, size=800)
+    cache.set('b', 3, 'new', cost=1, size=200)
+
+    assert cache.peek('a', 1) == 'expensive'
+    assert cache.peek('a', 2) is None
+    assert cache.peek('b', 3) == 'new'
+
+
+def test_entries_larger_than_the_cache_are_not_added():
+    cache = CostAwareCache(max_bytes=1000)
+    cache.set('a', 1, 'huge', size=5000)
+
+    assert cache.peek('a', 1) is None
+    assert cache.size == 0
+
+
+def test_size_stays_bounded():
+    cache = CostAwareCache(max_bytes=1000)
+    for i in range(5000):
+        cache.set('a', i, i, cost=i % 7 + 1, size=50)
+        cache.get('a', i // 2)
+
+    assert cache.size <= 1000
+    assert len(cache._heap) <= 2 * len(cache) + 65
+
+
+def test_lru_policy():
+    cache = CostAwareCache(max_bytes=300, policy='lru')
+    for key in 'abc':
+        cache.set(0, key, key, size=100)
+
+    cache.get(0, 'a')
+    cache.set(0, 'd', 'd', size=100)
+
+    assert cache.keys(0) == ['a', 'c', 'd']
+
+
+def test_unknown_policy_is_rejected():
+    with pytest.raises(ValueError):
+        CostAwareCache(policy='random')
+
+
+def test_views_only_see_their_entries():
+    cache = CostAwareCache()
+    first, second = cache.view('first'), cache.view('second')
+    first['key'] = 1
+    second['key'] = 2
+
+    assert first['key'] == 1
+    assert list(second) == ['key']
+
+    first.clear()
+    assert 'key' not in first
+    assert second['key'] == 2
+
+
+def test_concurrent_use():
+    cache = CostAwareCache(max_bytes=10000)
+    errors = []
+
+    def use(owner):
+        try:
+            for i in range(2000):
+                cache.set(owner, i % 100, i, cost=i % 5 + 1, size=100)
+                cache.get(owner, (i * 7) % 100)
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=use, args=(owner,))
+               for owner in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert errors == []
+    assert cache.size == 100 * len(cache) <= 10000
+
+
+def test_indexed_searches_return_frozen_results():
+    db = IndexedTinyDB('db.json')
+    db.create_index('$.name', 'name', 'TEXT')
+    db.create_index('$.age', 'age', 'NUMERIC')
+    db.insert_multiple({'name': 'n%d' % (i % 5), 'age': i} for i in range(50))
+
+    for results in (db.search(('name', 'n1')),
+                    db.search(('name', 'n1'), limit=3),
+                    db.search(('name', 'missing')),
+                    db.search({'age': (10, 20)}),
+                    db.search(where('age') > 40)):
+        assert isinstance(results, FrozenList)
+
+    assert len(db.search(('name', 'n1'))) == 10
+    db.close()
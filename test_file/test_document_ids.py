@@ -0,0 +1,110 @@
+import json
+
+import pytest
+
+from tinydb_test import TinyDB, where
+from tinydb_test.storages import JSONStorage, MemoryStorage, int_keys
+from tinydb_test.table import Table
+
+
+def test_writes_keep_the_table():
+    db = TinyDB(storage=MemoryStorage)
+    db.insert_multiple({'n': i} for i in range(100))
+    table = db.storage.read()['_default']
+
+    db.insert({'n': 100})
+    db.update({'n': -1}, doc_ids=[5])
+    db.remove(doc_ids=[6])
+
+    # The table is changed in place instead of being converted back and
+    # forth between string and int IDs
+    assert db.storage.read()['_default'] is table
+    assert all(isinstance(doc_id, int) for doc_id in table)
+
+
+def test_failed_updates_are_undone():
+    db = TinyDB(storage=MemoryStorage)
+    db.insert_multiple({'n': i} for i in range(3))
+
+    def fail(doc):
+        if doc['n'] == 1:
+            raise ValueError
+        doc['n'] += 10
+
+    with pytest.raises(ValueError):
+        db.update(fail)
+
+    assert [doc['n'] for doc in db] == [0, 1, 2]
+
+
+def test_json_ids_are_converted_back_to_ints(tmp_path):
+    path = str(tmp_path / 'db.json')
+    db = TinyDB(path)
+    db.insert_multiple({'n': i} for i in range(3))
+    db.close()
+
+    db = TinyDB(path)
+    assert [doc.doc_id for doc in db] == [1, 2, 3]
+    assert db.get(doc_id=2) == {'n': 1}
+    db.close()
+
+
+def test_int_keys_only_converts_tables():
+    data = {'t': {'1': {}, '2': {}}, 'names': {'a': 1}, 'version': 3,
+            'list': [1, 2]}
+
+    assert int_keys(data) == {'t': {1: {}, 2: {}}, 'names': {'a': 1},
+                              'version': 3, 'list': [1, 2]}
+
+
+def test_generic_json_survives_a_round_trip(tmp_path):
+    path = tmp_path / 'data.json'
+    data = {'settings': {'a': 1, 'b': [1, 2]}, 'version': 3, 'tags': ['x']}
+    path.write_text(json.dumps(data))
+
+    storage = JSONStorage(str(path))
+    storage.write(storage.read())
+    storage.close()
+
+    assert json.loads(path.read_text()) == data
+
+
+def test_custom_document_id_class(tmp_path):
+    class StrTable(Table):
+        document_id_class = str
+
+        def _get_next_id(self):
+            return 'id{}'.format(len(self) + 1)
+
+    class StrDB(TinyDB):
+        table_class = StrTable
+
+    path = str(tmp_path / 'db.json')
+    db = StrDB(path)
+    db.insert({'n': 1})
+    db.insert({'n': 2})
+    assert db.get(doc_id='id2') == {'n': 2}
+    db.close()
+
+    db = StrDB(path)
+    assert [doc.doc_id for doc in db] == ['id1', 'id2']
+    db.update({'n': 20}, doc_ids=['id2'])
+    assert db.search(where('n') == 20)[0].doc_id == 'id2'
+    db.close()
+
+
+def test_numeric_str_ids_stay_strs(tmp_path):
+    class StrTable(Table):
+        document_id_class = str
+
+    class StrDB(TinyDB):
+        table_class = StrTable
+
+    path = str(tmp_path / 'db.json')
+    with open(path, 'w') as handle:
+        json.dump({'_default': {'1': {'n': 1}, '2': {'n': 2}}}, handle)
+
+    db = StrDB(path)
+    assert [doc.doc_id for doc in db] == ['1', '2']
+    assert db.get(doc_id='2') == {'n': 2}
+    db.close()
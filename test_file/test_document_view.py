@@ -0,0 +1,90 @@
+import pickle
+
+import pytest
+
+from tinydb_test import TinyDB, where
+from tinydb_test.storages import MemoryStorage
+from tinydb_test.table import DocumentView, Table
+
+
+class ViewTable(Table):
+    document_class = DocumentView
+
+
+class ViewDB(TinyDB):
+    table_class = ViewTable
+
+
+@pytest.fixture
+def db():
+    db = ViewDB(storage=MemoryStorage)
+    db.insert_multiple({'n': i, 'user': {'name': 'u%d' % i}} for i in range(10))
+    return db
+
+
+def test_views_wrap_the_stored_documents(db):
+    stored = db.table('_default')._read_table()
+
+    doc = db.get(doc_id=3)
+    assert isinstance(doc, DocumentView)
+    assert doc._doc is stored[3]
+
+    for doc in db:
+        assert doc._doc is stored[doc.doc_id]
+    for doc in db.search(where('n') < 5):
+        assert doc._doc is stored[doc.doc_id]
+
+
+def test_views_act_like_documents(db):
+    doc = db.get(doc_id=3)
+
+    assert doc == {'n': 2, 'user': {'name': 'u2'}}
+    assert doc == db.get(doc_id=3)
+    assert doc.doc_id == 3
+    assert dict(doc) == {'n': 2, 'user': {'name': 'u2'}}
+    assert 'n' in doc and 'x' not in doc
+    assert doc.get('x') is None
+    assert doc.get('x', 1) == 1
+    assert len(doc) == 2
+    assert list(doc.keys()) == ['n', 'user']
+    assert repr(doc) == \
+        "DocumentView({'n': 2, 'user': {'name': 'u2'}}, doc_id=3)"
+
+
+def test_views_are_read_only(db):
+    doc = db.get(doc_id=3)
+
+    with pytest.raises(TypeError):
+        doc['n'] = 3
+    with pytest.raises(AttributeError):
+        doc.extra = 1
+
+
+def test_views_keep_the_document_as_it_was_read(db):
+    doc = db.get(doc_id=3)
+
+    db.update({'n': 100}, doc_ids=[3])
+
+    assert doc['n'] == 2
+    assert db.get(doc_id=3)['n'] == 100
+
+
+def test_views_can_be_pickled(db):
+    doc = db.get(doc_id=3)
+    loaded = pickle.loads(pickle.dumps(doc))
+
+    assert loaded == doc
+    assert loaded.doc_id == 3
+
+
+def test_views_can_be_inserted(db):
+    db.insert(DocumentView({'n': -1}, 20))
+
+    assert db.get(doc_id=20) == {'n': -1}
+
+
+def test_queries_match_views(db):
+    assert db.search(where('user').name == 'u4') == [
+        {'n': 4, 'user': {'name': 'u4'}}
+    ]
+    assert db.count(where('n') >= 5) == 5
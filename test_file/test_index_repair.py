@@ -0,0 +1,217 @@
+import multiprocessing
+import os
+import subprocess
+import sys
+import threading
+
+import pytest
+
+import tinydb_test
+from tinydb_test.index_manager import external_sort
+from tinydb_test.index_tool import main
+from tinydb_test.indexed_tinydb import IndexedTinyDB
+
+INDEX_ARGS = ['--index', 'n', '$.n', 'NUMERIC', '--index', 's', '$.s', 'TEXT']
+
+
+def open_db():
+    db = IndexedTinyDB('db.json')
+    db.create_index('$.n', 'n', 'NUMERIC')
+    db.create_index('$.s', 's', 'TEXT')
+    return db
+
+
+@pytest.fixture
+def db():
+    db = open_db()
+    db.insert_multiple({'n': i % 50, 's': 'k%d' % (i % 30)}
+                       for i in range(200))
+    yield db
+    db.close()
+
+
+def diverge(db):
+    """Write to the documents without updating the indexes."""
+    table = db.table('_default')
+    table.remove(doc_ids=[1, 2])
+    table.insert({'n': 500, 's': 'new'})
+    table.update({'n': 7}, doc_ids=[60])
+
+
+def test_intact_indexes(db):
+    assert db.verify_index('n') == []
+    assert db.verify_index('s') == []
+
+
+def test_verify_reports_divergent_keys(db):
+    diverge(db)
+
+    divergent = {key: (expected, indexed)
+                 for key, expected, indexed in db.verify_index('n')}
+
+    assert set(divergent) == {0, 1, 7, 9, 500}
+    assert divergent[500] == ([201], [])
+    assert 1 not in divergent[0][0] and 1 in divergent[0][1]
+    assert 60 in divergent[7][0] and 60 not in divergent[7][1]
+    assert 60 not in divergent[9][0] and 60 in divergent[9][1]
+
+
+def test_repair_only_fixes_divergent_keys(db, monkeypatch):
+    diverge(db)
+    numbers = db.index_manager.index_specs['n'][2]
+    tree_class = type(numbers)
+    inserted = []
+    insert = tree_class.insert
+
+    def counting(tree, key, value, replace=False):
+        if tree is numbers:
+            inserted.append(key)
+        return insert(tree, key, value, replace=replace)
+
+    monkeypatch.setattr(tree_class, 'insert', counting)
+
+    fixed = db.repair_index('n')
+    db.repair_index('s')
+
+    assert sorted(key for key, _, _ in fixed) == [0, 1, 7, 9, 500]
+    assert sorted(inserted) == [0, 1, 7, 9, 500]
+    assert db.verify_index('n') == []
+    assert db.verify_index('s') == []
+    assert [doc.doc_id for doc in db.search(('n', 500))] == [201]
+    assert 1 not in [doc.doc_id for doc in db.search(('n', 0))]
+    assert [doc.doc_id for doc in db.search(('s', 'new'))] == [201]
+
+
+def test_verify_sorts_in_runs(db, monkeypatch):
+    diverge(db)
+    expected = db.verify_index('n')
+
+    monkeypatch.setattr(db.index_manager, 'verify_run_size', 7)
+    assert db.verify_index('n') == expected
+    assert db.repair_index('n') == expected
+    assert db.verify_index('n') == []
+
+
+@pytest.mark.parametrize('count', [0, 5, 10, 11, 95])
+def test_external_sort(count):
+    items = [((i * 37) % 13, i) for i in range(count)]
+
+    assert list(external_sort(items, lambda item: item[0], 10)) == \
+        sorted(items, key=lambda item: item[0])
+
+
+def test_writes_and_verify_agree_on_the_keys(db):
+    # Values a TEXT index doesn't index
+    db.insert({'n': 300, 's': 5})
+    db.insert({'n': 301, 's': ['a', 'b']})
+    db.table('_default').insert({'n': 302, 's': 'x' * 100})
+
+    assert db.verify_index('s') == []
+    assert db.verify_index('n') == [(302, [203], [])]
+    assert db.document_keys('s', {'s': 'x' * 100}, check=False) == []
+    with pytest.raises(ValueError):
+        db.document_keys('s', {'s': 'x' * 100})
+
+
+def test_unknown_index(db):
+    with pytest.raises(KeyError):
+        db.verify_index('missing')
+    with pytest.raises(KeyError):
+        db.repair_index('missing')
+
+
+def test_verify_while_writing(db):
+    errors = []
+    done = threading.Event()
+
+    def write():
+        for i in range(50):
+            db.insert({'n': 1000 + i, 's': 'w%d' % i})
+        done.set()
+
+    def verify():
+        try:
+            while not done.is_set():
+                assert db.verify_index('n') == []
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=write), threading.Thread(target=verify)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert errors == []
+
+
+def test_cli(db, capsys):
+    assert main(['db.json'] + INDEX_ARGS) == 0
+    assert capsys.readouterr().out == \
+        'n: found 0 divergent keys\ns: found 0 divergent keys\n'
+
+    diverge(db)
+    db.close()
+
+    assert main(['db.json'] + INDEX_ARGS) == 1
+    out = capsys.readouterr().out
+    assert out.startswith('n: found 5 divergent keys\n  0: documents')
+    assert "'new': documents [201], index []" in out
+
+    assert main(['db.json', '--repair'] + INDEX_ARGS) == 0
+    assert 'n: repaired 5 divergent keys' in capsys.readouterr().out
+
+    assert main(['db.json'] + INDEX_ARGS) == 0
+
+
+def test_cli_as_module(db):
+    db.table('_default').insert({'n': 900, 's': 'zz'})
+    db.close()
+
+    # Run the tool on the package under test
+    root = os.path.dirname(os.path.dirname(os.path.abspath(
+        tinydb_test.__file__)))
+    env = dict(os.environ, PYTHONPATH=root)
+
+    def run(*args):
+        return subprocess.run(
+            [sys.executable, '-m', 'tinydb_test.index_tool', 'db.json']
+            + INDEX_ARGS + list(args),
+            capture_output=True, text=True, env=env)
+
+    result = run()
+    assert result.returncode == 1, result.stderr
+    assert 'n: found 1 divergent keys' in result.stdout
+
+    assert run('--repair').returncode == 0
+    assert run().returncode == 0
+
+
+def insert_and_crash():
+    db = open_db()
+    # Crash after writing the documents, before writing the indexes
+    db.index_manager.write_pending = lambda pending: os._exit(3)
+    db.insert({'n': 700, 's': 'crash'})
+
+
+def test_repair_after_losing_the_commit_log(db):
+    commit_log = db.commit_log.path
+    db.close()
+
+    process = multiprocessing.Process(target=insert_and_crash)
+    process.start()
+    process.join()
+    assert process.exitcode == 3
+
+    # Without the log, the crashed write can't be redone
+    os.remove(commit_log)
+
+    db = open_db()
+    assert db.search(('n', 700)) == []
+    assert [key for key, _, _ in db.verify_index('n')] == [700]
+
+    db.repair_index('n')
+    db.repair_index('s')
+    assert len(db.search(('n', 700))) == 1
+    assert len(db.search(('s', 'crash'))) == 1
+    db.close()
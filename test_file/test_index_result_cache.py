@@ -0,0 +1,113 @@
+import pytest
+
+from tinydb_test import index_manager
+from tinydb_test.indexed_tinydb import IndexedTinyDB
+
+
+@pytest.fixture
+def walks(monkeypatch):
+    """Count the walks over B+Trees."""
+    count = [0]
+    iter_bplustree = index_manager.iter_bplustree
+
+    def counting(tree, slice_=None):
+        count[0] += 1
+        return iter_bplustree(tree, slice_)
+
+    monkeypatch.setattr(index_manager, 'iter_bplustree', counting)
+    return count
+
+
+@pytest.fixture
+def db():
+    db = IndexedTinyDB('db.json')
+    db.create_index('$.user.age', 'age', 'NUMERIC')
+    db.create_index('$.name', 'name', 'TEXT')
+    db.insert_multiple({'user': {'age': i % 50}, 'name': 'n%02d' % (i % 50)}
+                       for i in range(200))
+    yield db
+    db.close()
+
+
+def test_repeated_searches_are_served_from_memory(db, walks):
+    manager = db.index_manager
+    first = manager.search_btree_range('age', 10, 20)
+    second = manager.search_btree_range('age', 10, 20)
+
+    assert first is second
+    assert walks[0] == 1
+    assert len(first) == 40
+
+
+def test_text_bounds_are_normalized(db, walks):
+    manager = db.index_manager
+    first = manager.search_btree_range('name', 'n10', 'n20')
+
+    assert manager.search_btree_range('name', 'n10', 'n20') is first
+    assert walks[0] == 1
+    assert len(first) == 40
+
+
+def test_writes_only_invalidate_their_ranges(db, walks):
+    manager = db.index_manager
+    low = manager.search_btree_range('age', 10, 20)
+    high = manager.search_btree_range('age', 30, 40)
+
+    db.insert({'user': {'age': 35}, 'name': 'n35'})
+
+    assert manager.search_btree_range('age', 10, 20) is low
+    assert walks[0] == 2
+
+    updated = manager.search_btree_range('age', 30, 40)
+    assert updated is not high
+    assert walks[0] == 3
+    assert len(updated) == 41
+
+
+def test_batch_writes_invalidate_their_ranges(db):
+    manager = db.index_manager
+    low = manager.search_btree_range('age', 10, 20)
+    high = manager.search_btree_range('age', 50, 80)
+
+    # Batches can only add keys above the ones in the tree
+    db.insert_multiple([{'user': {'age': 60}, 'name': 'n60'},
+                        {'user': {'age': 70}, 'name': 'n70'}])
+
+    assert manager.search_btree_range('age', 10, 20) is low
+    assert len(high) == 0
+    assert len(manager.search_btree_range('age', 50, 80)) == 2
+
+
+def test_open_ranges(db):
+    manager = db.index_manager
+    manager.search_btree_range('age', None, 10)
+    manager.search_btree_range('age', 40, None)
+
+    db.insert({'user': {'age': 45}, 'name': 'n45'})
+    db.insert({'user': {'age': 1000}, 'name': 'n1000'})
+
+    assert len(manager.search_btree_range('age', None, 10)) == 40
+    assert len(manager.search_btree_range('age', 40, None)) == 42
+
+
+def test_repair_invalidates_the_repaired_ranges(db):
+    manager = db.index_manager
+    _, _, _, pointer_store = manager.index_specs['age']
+    results = manager.search_btree_range('age', 10, 20)
+
+    # Lose the entries of a key
+    del pointer_store[manager.pointer_for('NUMERIC', 12)]
+    db.repair_index('age')
+
+    assert manager.search_btree_range('age', 10, 20) is not results
+    assert len(manager.search_btree_range('age', 10, 20)) == 40
+
+
+def test_indexed_range_searches(db):
+    assert len(db.search({'age': (10, 20)})) == 40
+
+    db.insert({'user': {'age': 15}, 'name': 'n15'})
+
+    results = db.search({'age': (10, 20)})
+    assert len(results) == 41
+    assert sorted(doc['user']['age'] for doc in results)[-2:] == [19, 19]
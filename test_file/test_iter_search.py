@@ -0,0 +1,160 @@
+import threading
+
+import pytest
+
+from tinydb_test import TinyDB, where
+from tinydb_test.indexed_tinydb import IndexedTinyDB
+from tinydb_test.storages import MemoryStorage
+
+
+@pytest.fixture
+def db():
+    db = TinyDB(storage=MemoryStorage)
+    db.insert_multiple({'v': i} for i in range(10000))
+    return db
+
+
+@pytest.fixture
+def indexed():
+    db = IndexedTinyDB('db.json')
+    db.create_index('$.n', 'n', 'NUMERIC')
+    db.create_index('$.name', 'name', 'TEXT')
+    db.insert_multiple({'n': i, 'name': 'n%d' % (i % 5)} for i in range(50))
+    yield db
+    db.close()
+
+
+def test_search_with_limit_stops_early(db):
+    calls = []
+
+    def even(value):
+        calls.append(value)
+        return value % 2 == 0
+
+    results = db.search(where('v').test(even), limit=50)
+
+    assert [doc['v'] for doc in results] == list(range(0, 100, 2))
+    assert len(calls) == 99
+
+
+def test_iter_search_is_lazy(db):
+    calls = []
+
+    def small(value):
+        calls.append(value)
+        return value < 3
+
+    documents = db.table('_default').iter_search(where('v').test(small))
+
+    assert calls == []
+    assert next(documents) == {'v': 0}
+    assert len(calls) == 1
+    assert list(documents) == [{'v': 1}, {'v': 2}]
+
+
+def test_iter_search_uses_cached_results(db):
+    table = db.table('_default')
+    results = table.search(where('v') < 10)
+
+    assert next(table.iter_search(where('v') < 10)) is results[0]
+
+
+def test_limit_with_projection(db):
+    pytest.importorskip('numpy')
+    table = db.table('_default')
+    table.create_projection('$.v')
+
+    results = table.search(where('v') >= 9990, limit=5)
+
+    assert [doc['v'] for doc in results] == [9990, 9991, 9992, 9993, 9994]
+
+
+def test_limit_larger_than_the_results(db):
+    assert db.search(where('v') > 9997, limit=10) == [{'v': 9998}, {'v': 9999}]
+    assert db.search(where('v') < 0, limit=10) == []
+
+
+def test_indexed_search_with_limit(indexed):
+    results = indexed.search(('name', 'n1'), limit=3)
+
+    assert len(results) == 3
+    assert all(doc['n'] % 5 == 1 for doc in results)
+    assert len(indexed.search({'n': (0, 1000)}, limit=5)) == 5
+    assert len(indexed.search(where('n') > 40, limit=4)) == 4
+
+
+def test_indexed_range_past_the_last_key(indexed):
+    assert len(indexed.search({'n': (0, 1000)})) == 50
+    assert len(indexed.search({'n': (10, 20)})) == 10
+    assert indexed.search({'n': (100, 200)}) == []
+    assert [doc['n'] for doc in indexed.iter_search({'n': (45, 1000)})] \
+        == [45, 46, 47, 48, 49]
+
+
+def test_writing_while_iterating_an_index(indexed, monkeypatch):
+    monkeypatch.setattr(indexed.index_manager, 'range_chunk_size', 10)
+    ranged = indexed.iter_search({'n': (0, 1000)})
+    exact = indexed.iter_search(('name', 'n1'))
+    next(ranged)
+    next(exact)
+
+    # Neither the same thread nor other threads wait for the iterators
+    indexed.insert({'n': 61, 'name': 'n1'})
+    writer = threading.Thread(
+        target=lambda: indexed.insert({'n': 62, 'name': 'n1'}))
+    writer.start()
+    writer.join(5)
+    assert not writer.is_alive()
+
+    # Range searches see the writes in later chunks, exact matches see the
+    # table as it was
+    assert [doc['n'] for doc in ranged][-2:] == [61, 62]
+    assert len(list(exact)) == 9
+    assert len(indexed.search({'n': (60, 70)})) == 2
+
+
+@pytest.mark.parametrize('chunk_size', [1, 3, 64])
+def test_indexed_range_in_chunks(indexed, monkeypatch, chunk_size):
+    monkeypatch.setattr(indexed.index_manager, 'range_chunk_size', chunk_size)
+    # Several documents per key
+    indexed.insert_multiple({'n': 50 + i // 3, 'name': 'x'} for i in range(9))
+
+    for low, high in [(0, 1000), (10, 20), (48, 53), (100, 200)]:
+        indexed.index_manager.result_cache.clear()
+        assert list(indexed.iter_search({'n': (low, high)})) == \
+            indexed.search({'n': (low, high)})
+
+
+def test_search_with_limit_releases_the_lock(indexed):
+    indexed.search({'n': (0, 1000)}, limit=5)
+
+    indexed.insert({'n': 60, 'name': 'n0'})
+    assert len(indexed.search({'n': (0, 1000)})) == 51
+
+
+def test_concurrent_index_readers_and_writers(indexed):
+    errors = []
+
+    def write():
+        for i in range(100, 150):
+            indexed.insert({'n': i, 'name': 'n%d' % (i % 5)})
+
+    def read():
+        try:
+            for _ in range(20):
+                values = [doc['n'] for doc
+                          in indexed.iter_search({'n': (0, 10 ** 6)})]
+                assert values == sorted(values)
+                assert values[:50] == list(range(50))
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=write)] + \
+        [threading.Thread(target=read) for _ in range(3)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert errors == []
+    assert len(indexed.search({'n': (0, 10 ** 6)})) == 100
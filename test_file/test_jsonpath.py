@@ -0,0 +1,129 @@
+import pytest
+
+from tinydb_test.indexed_tinydb import IndexedTinyDB
+from tinydb_test.jsonpath import compile_jsonpath, parse_jsonpath
+from tinydb_test.utils import str_to_bytes
+
+DOC = {
+    'a': {'b': [{'c': 1}, {'c': 2}, {'d': {'c': 3}}]},
+    's': 'xyz',
+    'n': [5, 6],
+}
+
+# A path with 11 levels, like the ones of insert_data_nested.py
+DEEP_PATH = '$.' + '.'.join('l%d' % i for i in range(1, 12))
+
+
+def deep_document(value):
+    doc = current = {}
+    for i in range(1, 11):
+        current['l%d' % i] = {}
+        current = current['l%d' % i]
+    current['l11'] = value
+
+    return doc
+
+
+@pytest.mark.parametrize('path, expected', [
+    ('$.a.b[0].c', 1),
+    ('$.a.b[-1].d.c', 3),
+    ("$['a']['b'][1]['c']", 2),
+    ('$.a.b[5].c', None),
+    ('$.s[0]', None),
+    ('$.s.x', None),
+    ('$.missing.x', None),
+])
+def test_single_values(path, expected):
+    extract = compile_jsonpath(path)
+
+    assert not extract.multiple
+    assert extract(DOC) == expected
+
+
+@pytest.mark.parametrize('path, expected', [
+    ('$.a.b[*].c', [1, 2]),
+    ('$..c', [1, 2, 3]),
+    ('$.n[*]', [5, 6]),
+    ('$.n.*', [5, 6]),
+    ('$..n[1]', [6]),
+    ('$.x[*]', []),
+    ('$.a.b[*].d..c', [3]),
+])
+def test_many_values(path, expected):
+    extract = compile_jsonpath(path)
+
+    assert extract.multiple
+    assert extract(DOC) == expected
+
+
+def test_values_are_not_copied():
+    assert compile_jsonpath('$.a.b')(DOC) is DOC['a']['b']
+
+
+def test_deep_paths():
+    extract = compile_jsonpath(DEEP_PATH)
+
+    assert extract(deep_document(42)) == 42
+    # Compiled into a single lookup
+    assert extract.source.count('try:') == 1
+
+
+@pytest.mark.parametrize('path', ['a.b', '$', '$.a[', '$.a[x]', '$a'])
+def test_invalid_paths(path):
+    with pytest.raises(ValueError):
+        compile_jsonpath(path)
+    with pytest.raises(ValueError):
+        parse_jsonpath(path)
+
+
+@pytest.fixture
+def db():
+    db = IndexedTinyDB('db.json')
+    db.create_index('$.tags[*]', 'tags', 'TEXT')
+    db.create_index(DEEP_PATH, 'deep', 'NUMERIC')
+    db.create_index('$..score', 'score', 'NUMERIC')
+    yield db
+    db.close()
+
+
+def test_invalid_paths_create_no_index(db):
+    with pytest.raises(ValueError):
+        db.create_index('$.bad[', 'bad', 'TEXT')
+
+    assert 'bad' not in db.index_manager.index_specs
+
+
+def test_index_keys(db):
+    doc = dict(deep_document(7), tags=['x', 'y', 'x'], m={'score': 3})
+
+    max_len = db.index_manager.max_index_text_len
+
+    # Repeated values give one key
+    assert db.index_keys(doc) == {
+        'tags': [str_to_bytes('x', max_len), str_to_bytes('y', max_len)],
+        'deep': [7],
+        'score': [3],
+    }
+
+
+def test_indexes_with_wildcards_and_descent(db):
+    db.insert_multiple([{'tags': ['a'], 'score': 1},
+                        {'tags': [], 'k': [{'score': 3}]}])
+    db.insert(dict(deep_document(42), tags=['x', 'y', 'x'], m={'score': 3}))
+    db.insert({'tags': ['a', 'y']})
+
+    for alias in ('tags', 'deep', 'score'):
+        assert db.verify_index(alias) == []
+
+    assert [doc.doc_id for doc in db.search(('tags', 'y'))] == [3, 4]
+    assert [doc.doc_id for doc in db.search(('tags', 'a'))] == [1, 4]
+    assert sorted(doc.doc_id for doc in db.search(('score', 3))) == [2, 3]
+    assert [doc.doc_id for doc in db.search(('deep', 42))] == [3]
+
+
+def test_too_long_values_are_rejected(db):
+    with pytest.raises(ValueError):
+        db.insert({'tags': ['ok', 'x' * 500]})
+
+    assert len(db) == 0
+    assert db.search(('tags', 'ok')) == []
@@ -0,0 +1,118 @@
+import os
+
+import pytest
+
+from tinydb_test import TinyDB
+from tinydb_test.log_storage import LogStorage
+
+
+def segments(path):
+    return sorted(name for name in os.listdir(path) if name.endswith('.log'))
+
+
+def log_size(path):
+    return sum(os.path.getsize(os.path.join(path, name))
+               for name in segments(path))
+
+
+def test_round_trip(tmp_path):
+    path = str(tmp_path / 'db')
+    db = TinyDB(path, storage=LogStorage)
+    db.insert_multiple({'n': i} for i in range(10))
+    db.update({'n': 100}, doc_ids=[3])
+    db.remove(doc_ids=[4])
+    db.table('empty', persist_empty=True)
+    db.close()
+
+    db = TinyDB(path, storage=LogStorage)
+    assert db.get(doc_id=3) == {'n': 100}
+    assert db.get(doc_id=4) is None
+    assert len(db) == 9
+    assert db.tables() == {'_default', 'empty'}
+    db.close()
+
+
+def test_writes_only_append_changed_documents(tmp_path):
+    path = str(tmp_path / 'db')
+    db = TinyDB(path, storage=LogStorage)
+    db.insert_multiple({'n': i, 'pad': 'x' * 100} for i in range(1000))
+
+    size = log_size(path)
+    db.update({'n': -1}, doc_ids=[500])
+
+    assert 0 < log_size(path) - size < 300
+    db.close()
+
+
+def test_interrupted_record_is_discarded(tmp_path):
+    path = str(tmp_path / 'db')
+    db = TinyDB(path, storage=LogStorage)
+    db.insert({'n': 1})
+    db.close()
+
+    with open(os.path.join(path, segments(path)[-1]), 'ab') as handle:
+        handle.write(b'{"t": "_default", "k": "2", "v": {"n"')
+
+    db = TinyDB(path, storage=LogStorage)
+    assert db.all() == [{'n': 1}]
+    assert db.insert({'n': 2}) == 2
+    db.close()
+
+    db = TinyDB(path, storage=LogStorage)
+    assert db.all() == [{'n': 1}, {'n': 2}]
+    db.close()
+
+
+def test_compaction_drops_obsolete_records(tmp_path, monkeypatch):
+    monkeypatch.setattr(LogStorage, 'COMPACTION_MIN_RECORDS', 100)
+    path = str(tmp_path / 'db')
+    db = TinyDB(path, storage=LogStorage)
+    db.insert_multiple({'n': i} for i in range(10))
+
+    for i in range(500):
+        db.update({'n': i}, doc_ids=[1])
+    db.storage._wait_for_compaction()
+
+    assert sum(db.storage._segments.values()) < 300
+    db.close()
+
+    db = TinyDB(path, storage=LogStorage)
+    assert db.get(doc_id=1) == {'n': 499}
+    assert len(db) == 10
+    db.close()
+
+
+def test_compaction_ignores_uncommitted_writes(tmp_path):
+    path = str(tmp_path / 'db')
+    db = TinyDB(path, storage=LogStorage)
+    db.insert({'n': 1})
+
+    # Transactions change the tables in memory before committing. A
+    # compaction running meanwhile must not write these changes.
+    with pytest.raises(KeyError):
+        with db.transaction():
+            db.insert({'n': 2})
+            db.update({'n': 10}, doc_ids=[1])
+            db.storage._compact()
+            raise KeyError
+
+    db.close()
+
+    db = TinyDB(path, storage=LogStorage)
+    assert db.all() == [{'n': 1}]
+    db.close()
+
+
+def test_writes_during_compaction_are_kept(tmp_path):
+    path = str(tmp_path / 'db')
+    db = TinyDB(path, storage=LogStorage)
+    db.insert_multiple({'n': i} for i in range(100))
+
+    db.storage.compact()
+    db.insert_multiple({'n': i} for i in range(100, 200))
+    db.storage._wait_for_compaction()
+    db.close()
+
+    db = TinyDB(path, storage=LogStorage)
+    assert [doc['n'] for doc in db] == list(range(200))
+    db.close()
@@ -0,0 +1,166 @@
+import json
+import os
+
+import pytest
+
+from tinydb_test import TinyDB, where
+from tinydb_test.middlewares import CachingMiddleware
+from tinydb_test.multi_file_storage import MultiFileStorage
+
+
+@pytest.fixture
+def read_tables(monkeypatch):
+    """The names of the tables read from their files."""
+    names = []
+    read_table = MultiFileStorage._read_table
+
+    def spy(self, name):
+        names.append(name)
+        return read_table(self, name)
+
+    monkeypatch.setattr(MultiFileStorage, '_read_table', spy)
+    return names
+
+
+@pytest.fixture
+def written_tables(monkeypatch):
+    """The names of the tables written to their files."""
+    names = []
+    write_table = MultiFileStorage._write_table
+
+    def spy(self, name, table, changed=None):
+        names.append(name)
+        return write_table(self, name, table, changed)
+
+    monkeypatch.setattr(MultiFileStorage, '_write_table', spy)
+    return names
+
+
+def manifest(path):
+    with open(os.path.join(path, MultiFileStorage.MANIFEST)) as handle:
+        return json.load(handle)
+
+
+@pytest.mark.parametrize('codec', [None, 'marshal'])
+def test_round_trip(tmp_path, codec):
+    path = str(tmp_path / 'db')
+    db = TinyDB(path, storage=MultiFileStorage, codec=codec)
+    db.insert_multiple({'n': i} for i in range(10))
+    db.table('audit').insert({'event': 'created'})
+    db.update({'n': 100}, doc_ids=[3])
+    db.close()
+
+    db = TinyDB(path, storage=MultiFileStorage, codec=codec)
+    assert db.tables() == {'_default', 'audit'}
+    assert db.get(doc_id=3) == {'n': 100}
+    assert db.table('audit').all() == [{'event': 'created'}]
+    assert db.insert({'n': 10}) == 11
+    db.close()
+
+
+def test_one_file_per_table(tmp_path):
+    path = str(tmp_path / 'db')
+    db = TinyDB(path, storage=MultiFileStorage)
+    db.insert({'n': 1})
+    db.table('audit').insert({'event': 'created'})
+
+    files = manifest(path)['tables']
+    assert set(files) == {'_default', 'audit'}
+    assert sorted(os.listdir(path)) == sorted(
+        [MultiFileStorage.MANIFEST] + list(files.values()))
+    db.close()
+
+
+def test_writes_only_write_their_table(tmp_path, written_tables):
+    db = TinyDB(str(tmp_path / 'db'), storage=MultiFileStorage)
+    db.insert_multiple({'n': i} for i in range(1000))
+    written_tables.clear()
+
+    db.table('audit').insert({'event': 'created'})
+    db.table('audit').update({'event': 'changed'})
+
+    assert written_tables == ['audit', 'audit']
+    db.close()
+
+
+def test_tables_only_read_the_manifest(tmp_path, read_tables):
+    path = str(tmp_path / 'db')
+    db = TinyDB(path, storage=MultiFileStorage)
+    db.insert_multiple({'n': i} for i in range(100))
+    db.table('audit').insert({'event': 'created'})
+    db.close()
+
+    db = TinyDB(path, storage=MultiFileStorage)
+    assert db.tables() == {'_default', 'audit'}
+    assert read_tables == []
+
+    db.table('audit').all()
+    assert read_tables == ['audit']
+    db.close()
+
+
+def test_counting_only_reads_the_manifest(tmp_path, read_tables):
+    path = str(tmp_path / 'db')
+    db = TinyDB(path, storage=MultiFileStorage)
+    db.insert_multiple({'n': i} for i in range(100))
+    db.close()
+
+    db = TinyDB(path, storage=MultiFileStorage)
+    assert len(db) == 100
+    assert read_tables == []
+    db.close()
+
+
+def test_drop_table_only_removes_its_file(tmp_path, read_tables):
+    path = str(tmp_path / 'db')
+    db = TinyDB(path, storage=MultiFileStorage)
+    db.insert({'n': 1})
+    db.table('audit').insert({'event': 'created'})
+    audit_file = manifest(path)['tables']['audit']
+    db.close()
+
+    db = TinyDB(path, storage=MultiFileStorage)
+    db.drop_table('audit')
+
+    assert read_tables == []
+    assert audit_file not in os.listdir(path)
+    assert set(manifest(path)['tables']) == {'_default'}
+    assert db.tables() == {'_default'}
+    db.close()
+
+
+def test_stale_metadata_is_ignored(tmp_path):
+    path = str(tmp_path / 'db')
+    db = TinyDB(path, storage=MultiFileStorage)
+    db.insert_multiple({'n': i} for i in range(3))
+    db.close()
+
+    # The table has been written, but the manifest hasn't
+    table_path = os.path.join(path, manifest(path)['tables']['_default'])
+    with open(table_path, 'w') as handle:
+        json.dump({'1': {'n': 0}, '7': {'n': 1}}, handle)
+
+    db = TinyDB(path, storage=MultiFileStorage)
+    assert db.storage.table_meta('_default') is None
+    assert len(db) == 2
+    assert db.insert({'n': 2}) == 8
+    db.close()
+
+
+def test_caching_middleware(tmp_path, written_tables):
+    path = str(tmp_path / 'db')
+    db = TinyDB(path, storage=CachingMiddleware(MultiFileStorage))
+    db.insert_multiple({'n': i} for i in range(10))
+    db.table('audit').insert({'event': 'created'})
+    db.storage.flush()
+    written_tables.clear()
+
+    db.table('audit').insert({'event': 'changed'})
+    db.close()
+
+    assert written_tables == ['audit']
+
+    db = TinyDB(path, storage=MultiFileStorage)
+    assert len(db) == 10
+    assert db.table('audit').count(where('event') == 'changed') == 1
+    db.close()
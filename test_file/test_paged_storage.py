@@ -0,0 +1,149 @@
+import multiprocessing
+import os
+
+import pytest
+
+from tinydb_test import TinyDB, where
+from tinydb_test.paged_storage import PagedStorage
+
+
+def open_db(path, **kwargs):
+    return TinyDB(path, storage=PagedStorage, **kwargs)
+
+
+def test_round_trip(tmp_path):
+    path = str(tmp_path / 'db.pages')
+    db = open_db(path)
+    db.insert_multiple({'n': i, 'tags': ['a', 'b']} for i in range(500))
+    db.update({'n': -1}, where('n') == 10)
+    db.remove(where('n') == 20)
+    db.table('empty', persist_empty=True)
+    db.table('gone').insert({'x': 1})
+    db.drop_table('gone')
+    db.close()
+
+    db = open_db(path)
+    assert len(db) == 499
+    assert db.get(doc_id=11) == {'n': -1, 'tags': ['a', 'b']}
+    assert db.get(doc_id=21) is None
+    assert db.tables() == {'_default', 'empty'}
+    assert db.insert({'n': 500}) == 501
+    db.close()
+
+
+def test_large_documents_use_overflow_pages(tmp_path):
+    path = str(tmp_path / 'db.pages')
+    db = open_db(path, page_size=1024)
+    big = {'blob': 'x' * 10000}
+    db.insert_multiple([{'n': 1}, big, {'n': 2}])
+    db.close()
+
+    db = open_db(path)
+    assert db.get(doc_id=2) == big
+    assert db.storage._page_size == 1024
+
+    db.update({'blob': 'y'}, doc_ids=[2])
+    assert db.get(doc_id=2) == {'blob': 'y'}
+    db.close()
+
+
+def test_updates_reuse_space(tmp_path):
+    path = str(tmp_path / 'db.pages')
+    db = open_db(path)
+    db.insert_multiple({'n': i, 'pad': 'x' * 50} for i in range(200))
+    size = os.path.getsize(path)
+
+    for i in range(20):
+        db.update({'n': i}, doc_ids=list(range(1, 201)))
+
+    assert os.path.getsize(path) <= 2 * size
+    db.close()
+
+
+def test_reading_a_document_only_decodes_it(tmp_path, monkeypatch):
+    path = str(tmp_path / 'db.pages')
+    db = open_db(path)
+    db.insert_multiple({'n': i} for i in range(1000))
+    db.close()
+
+    db = open_db(path)
+    decoded = []
+    codec = db.storage._codec
+    decode = codec.decode
+    monkeypatch.setattr(codec, 'decode',
+                        lambda data: decoded.append(1) or decode(data))
+
+    assert db.get(doc_id=500) == {'n': 499}
+    assert len(decoded) == 1
+    db.close()
+
+
+def test_codec_is_recorded_in_the_file(tmp_path):
+    path = str(tmp_path / 'db.pages')
+    db = TinyDB(path, storage=PagedStorage, codec='json')
+    db.insert({'n': 1})
+    db.close()
+
+    db = TinyDB(path, storage=PagedStorage, codec='pickle')
+    assert db.storage._codec.name == 'json'
+    assert db.all() == [{'n': 1}]
+    db.close()
+
+
+def test_invalid_arguments(tmp_path):
+    with pytest.raises(ValueError):
+        PagedStorage(str(tmp_path / 'a.pages'), page_size=1000)
+
+    with pytest.raises(ValueError):
+        PagedStorage(str(tmp_path / 'b.pages'), access_mode='r+')
+
+    not_paged = tmp_path / 'c.pages'
+    not_paged.write_bytes(b'{"_default": {}}' + bytes(100))
+    with pytest.raises(ValueError):
+        PagedStorage(str(not_paged))
+
+
+def insert_and_crash(path):
+    db = open_db(path)
+    pwrite = os.pwrite
+
+    def crash(fd, data, offset):
+        # Crash once the first page is written
+        pwrite(fd, data, offset)
+        os._exit(3)
+
+    os.pwrite = crash
+    db.insert_multiple({'n': i, 'pad': 'x' * 500} for i in range(100))
+
+
+def test_crash_while_writing_pages(tmp_path):
+    path = str(tmp_path / 'db.pages')
+    db = open_db(path, page_size=2048)
+    db.insert_multiple({'n': i} for i in range(10))
+    db.close()
+
+    process = multiprocessing.Process(target=insert_and_crash, args=(path,))
+    process.start()
+    process.join()
+    assert process.exitcode == 3
+
+    # The header still has the old page count
+    db = open_db(path)
+    assert [db.get(doc_id=i) for i in range(1, 11)] == \
+        [{'n': i} for i in range(10)]
+    doc_id = db.insert({'n': 10})
+    db.close()
+
+    db = open_db(path)
+    assert db.get(doc_id=doc_id) == {'n': 10}
+    db.close()
+
+
+def test_empty_file_cant_be_opened_read_only(tmp_path):
+    path = tmp_path / 'db.pages'
+    path.write_bytes(b'')
+
+    with pytest.raises(IOError):
+        PagedStorage(str(path), access_mode='rb')
+
+    assert path.read_bytes() == b''
@@ -0,0 +1,163 @@
+import os
+import pickle
+
+import pytest
+
+from tinydb_test import TinyDB, where
+from tinydb_test.middlewares import CachingMiddleware
+from tinydb_test.multi_file_storage import MultiFileStorage
+from tinydb_test.partitioned_storage import PartitionedStorage
+
+
+@pytest.fixture
+def parallel(monkeypatch):
+    """Search every table in parallel, however small it is."""
+    monkeypatch.setattr(PartitionedStorage, 'PARALLEL_SCAN_MIN_BYTES', 0)
+
+
+@pytest.fixture
+def db(tmp_path):
+    db = TinyDB(str(tmp_path / 'db'), storage=PartitionedStorage,
+                partitions=4, workers=2)
+    db.insert_multiple({'n': i, 's': 'x%d' % i} for i in range(200))
+    yield db
+    db.close()
+
+
+def test_round_trip(tmp_path):
+    path = str(tmp_path / 'db')
+    db = TinyDB(path, storage=PartitionedStorage, partitions=4)
+    db.insert_multiple({'n': i} for i in range(10))
+    db.remove(doc_ids=[3])
+    db.close()
+
+    # The number of partitions is fixed when the directory is created
+    db = TinyDB(path, storage=PartitionedStorage, partitions=9)
+    assert db.storage.partitions == 4
+    assert len(db) == 9
+    assert [doc.doc_id for doc in db.all()] == [1, 2, 4, 5, 6, 7, 8, 9, 10]
+    db.close()
+
+
+def test_writes_only_write_changed_partitions(db):
+    path = db.storage._path
+    mtimes = {name: os.stat(os.path.join(path, name)).st_mtime_ns
+              for name in os.listdir(path)}
+
+    db.update({'s': 'changed'}, doc_ids=[5])
+
+    changed = [name for name in os.listdir(path)
+               if os.stat(os.path.join(path, name)).st_mtime_ns != mtimes[name]]
+    assert sorted(changed) == [MultiFileStorage.MANIFEST,
+                               os.path.basename(
+                                   db.storage._partition_path('_default', 1))]
+
+
+def test_parallel_search(db, parallel):
+    db.remove(where('n') == 150)
+    db.update({'s': 'changed'}, where('n') == 7)
+
+    result = db.search((where('n') >= 100) & where('s').matches('x.*'))
+
+    assert db.storage._pool is not None
+    assert [doc.doc_id for doc in result] == [
+        i + 1 for i in range(100, 200) if i != 150
+    ]
+    assert [doc.doc_id for doc in db.search(where('s') == 'changed')] == [8]
+
+
+def test_workers_are_not_forked(db, parallel):
+    db.search(where('n') >= 100)
+
+    assert db.storage._pool._mp_context.get_start_method() != 'fork'
+
+
+def test_parallel_search_with_test_function(db, parallel):
+    db.insert({'n': -1, 's': 'UPPER'})
+
+    result = db.search(where('s').test(str.isupper))
+
+    assert db.storage._pool is not None
+    assert result == [{'n': -1, 's': 'UPPER'}]
+
+
+def test_parallel_search_matches_serial_search(db, parallel, monkeypatch):
+    query = (where('n') < 10) | (where('s') == 'x150')
+    parallel_result = db.search(query)
+
+    monkeypatch.setattr(PartitionedStorage, 'PARALLEL_SCAN_MIN_BYTES',
+                        float('inf'))
+    db.clear_cache()
+
+    assert parallel_result == db.search(query)
+    assert [doc.doc_id for doc in parallel_result] == \
+        [doc.doc_id for doc in db.search(query)]
+
+
+def test_unpicklable_queries_are_searched_serially(db, parallel):
+    query = where('n').map(lambda value: value * 2) == 10
+
+    assert db.storage.search_table('_default', query) is None
+    assert db.search(query) == [{'n': 5, 's': 'x5'}]
+
+
+def test_small_tables_are_searched_serially(db):
+    assert db.storage.search_table('_default', where('n') == 5) is None
+    assert db.search(where('n') == 5) == [{'n': 5, 's': 'x5'}]
+    assert db.storage._pool is None
+
+
+def test_missing_table_has_no_results(db, parallel):
+    assert db.storage.search_table('missing', where('n') == 5) == []
+
+
+def test_drop_table(db):
+    db.table('other').insert({'a': 1})
+    paths = db.storage._table_paths('other')
+    db.drop_table('other')
+
+    assert not any(os.path.exists(path) for path in paths)
+    assert db.tables() == {'_default'}
+
+
+def test_not_partitioned_directory_is_rejected(tmp_path):
+    path = str(tmp_path / 'db')
+    db = TinyDB(path, storage=MultiFileStorage)
+    db.insert({'n': 1})
+    db.close()
+
+    with pytest.raises(ValueError):
+        TinyDB(path, storage=PartitionedStorage)
+
+
+def test_caching_middleware_searches_unwritten_changes(tmp_path, parallel):
+    path = str(tmp_path / 'db')
+    db = TinyDB(path, storage=CachingMiddleware(PartitionedStorage))
+    db.insert_multiple({'n': i} for i in range(100))
+    db.storage.flush()
+
+    db.insert({'n': 1000})
+    assert db.search(where('n') > 98) == [{'n': 99}, {'n': 1000}]
+
+    db.storage.flush()
+    db.clear_cache()
+    assert db.search(where('n') > 98) == [{'n': 99}, {'n': 1000}]
+    db.close()
+
+
+def test_pickled_queries_keep_their_operands():
+    query = (where('x') != 0) & (where('t') == (1, 2))
+    loaded = pickle.loads(pickle.dumps(query))
+
+    assert loaded == query
+    assert [operand == original for operand, original
+            in zip(loaded._operands, query._operands)] == [True, True]
+    assert loaded({'x': 1, 't': (1, 2)})
+    assert not loaded({'x': 1, 't': [1, 2]})
+
+
+def test_uncacheable_queries_cant_be_pickled():
+    query = where('n').map(lambda value: value) == 1
+
+    with pytest.raises(TypeError):
+        pickle.dumps(query)
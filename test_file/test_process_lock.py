@@ -0,0 +1,207 @@
+import multiprocessing
+import os
+
+import pytest
+
+from tinydb_test import JSONStorage, TinyDB, where
+from tinydb_test.indexed_tinydb import IndexedTinyDB
+from tinydb_test.middlewares import CachingMiddleware
+from tinydb_test.multi_file_storage import MultiFileStorage
+from tinydb_test.paged_storage import PagedStorage
+from tinydb_test.process_lock import ProcessLock
+
+pytest.importorskip('fcntl')
+
+STORAGES = {
+    'json': ('db.json', {}),
+    'paged': ('db.db', {'storage': PagedStorage}),
+    'multi': ('db', {'storage': MultiFileStorage}),
+}
+
+
+def open_db(path, **kwargs):
+    return TinyDB(path, lock_file=path + '.lock', **kwargs)
+
+
+def count_and_insert(path, count, kwargs):
+    db = open_db(path, **kwargs)
+    for i in range(count):
+        # Read and write the counter without another process in between
+        with db._lock.write():
+            counter = db.get(where('k') == 'counter')
+            if counter is None:
+                db.insert({'k': 'counter', 'v': 1})
+            else:
+                db.update({'v': counter['v'] + 1}, where('k') == 'counter')
+
+        db.insert({'k': 'pid', 'pid': os.getpid()})
+        # Our own inserts are never lost
+        assert db.count(where('pid') == os.getpid()) == i + 1
+
+    db.close()
+
+
+def run_processes(target, *args, count=4):
+    processes = [multiprocessing.Process(target=target, args=args)
+                 for _ in range(count)]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join()
+
+    assert [process.exitcode for process in processes] == [0] * count
+
+
+@pytest.mark.parametrize('storage', sorted(STORAGES))
+def test_processes_dont_lose_writes(storage):
+    path, kwargs = STORAGES[storage]
+
+    run_processes(count_and_insert, path, 25, kwargs)
+
+    db = open_db(path, **kwargs)
+    assert db.get(where('k') == 'counter')['v'] == 100
+    assert db.count(where('k') == 'pid') == 100
+    db.close()
+
+
+def test_caches_are_only_reloaded_after_other_writers():
+    db = open_db('db.json')
+    db.insert({'k': 'counter', 'v': 0})
+    reloads = []
+    db._lock.on_change(lambda: reloads.append(1))
+
+    db.search(where('k') == 'counter')
+    db.insert({'a': 1})
+    db.search(where('a') == 1)
+    assert reloads == []
+
+    run_processes(count_and_insert, 'db.json', 1, {}, count=1)
+
+    assert db.get(where('k') == 'counter')['v'] == 1
+    assert reloads == [1]
+    db.close()
+
+
+def test_caching_middleware_reloads_clean_caches():
+    db = open_db('db.json', storage=CachingMiddleware(JSONStorage))
+    db.insert({'k': 'counter', 'v': 0})
+    db.storage.flush()
+
+    run_processes(count_and_insert, 'db.json', 1, {}, count=1)
+
+    assert db.get(where('k') == 'counter')['v'] == 1
+    db.close()
+
+
+def insert_from(path, name):
+    db = open_db(path)
+    db.insert({'from': name})
+    db.close()
+
+
+def test_caching_middleware_doesnt_overwrite_other_writers():
+    db = open_db('db.json', storage=CachingMiddleware(JSONStorage))
+    db.insert({'from': 'a'})
+
+    run_processes(insert_from, 'db.json', 'b', count=1)
+
+    db.insert({'from': 'a2'})
+    db.close()
+
+    db = open_db('db.json')
+    assert sorted(doc['from'] for doc in db) == ['a', 'a2', 'b']
+    assert len({doc.doc_id for doc in db}) == 3
+    db.close()
+
+
+def test_generation_counts_writes(tmp_path):
+    path = str(tmp_path / 'lock')
+    lock = ProcessLock(path)
+    other = ProcessLock(path)
+    changes = []
+    other.on_change(lambda: changes.append(1))
+
+    with lock.read():
+        pass
+    with other.read():
+        pass
+    assert changes == []
+
+    # Writers that haven't changed anything don't count
+    with lock.write():
+        pass
+    with other.read():
+        pass
+    assert changes == []
+    assert lock._read_generation() == 0
+
+    with lock.write():
+        lock.mark_written()
+    with other.read():
+        pass
+    assert changes == [1]
+    assert lock._read_generation() == 1
+
+    lock.close()
+    other.close()
+
+
+def open_indexed():
+    db = IndexedTinyDB('db.json', lock_file='db.json.lock')
+    db.create_index('$.n', 'n', 'NUMERIC')
+    db.create_index('$.s', 's', 'TEXT')
+    return db
+
+
+def insert_indexed(base):
+    db = open_indexed()
+    for i in range(base, base + 20):
+        db.insert({'n': i, 's': 'w%d' % i})
+        # Other processes' entries don't hide ours
+        assert db.search(('n', i))
+    db.close()
+
+
+def test_only_writes_change_the_generation():
+    db = open_indexed()
+    generation = db._lock._read_generation
+
+    before = generation()
+    other = open_indexed()
+    other.search(('n', 1))
+    other.search(where('n') == 1)
+    db.update({'s': 'x'}, where('n') == 1)
+    assert generation() == before
+
+    other.insert({'n': 1, 's': 'a'})
+    assert generation() == before + 1
+    db.close()
+    other.close()
+
+
+def test_processes_share_indexes():
+    open_indexed().close()
+
+    processes = [multiprocessing.Process(target=insert_indexed, args=(base,))
+                 for base in (0, 1000, 2000)]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join()
+    assert [process.exitcode for process in processes] == [0, 0, 0]
+
+    db = open_indexed()
+    assert len(db) == 60
+    for base in (0, 1000, 2000):
+        for i in range(base, base + 20):
+            assert len(db.search(('n', i))) == 1
+            assert len(db.search(('s', 'w%d' % i))) == 1
+
+    # Open databases see the entries of later writers
+    process = multiprocessing.Process(target=insert_indexed, args=(5000,))
+    process.start()
+    process.join()
+    assert process.exitcode == 0
+    assert len(db.search(('n', 5010))) == 1
+    assert len(db.search({'n': (5000, 6000)})) == 20
+    db.close()
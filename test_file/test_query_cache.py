@@ -0,0 +1,141 @@
+import random
+
+import pytest
+
+from tinydb_test import TinyDB, where
+from tinydb_test.storages import MemoryStorage
+from tinydb_test.table import Table
+
+
+@pytest.fixture
+def table():
+    table = TinyDB(storage=MemoryStorage).table('t')
+    table.insert_multiple({'v': i, 'k': 'abc'[i % 3]} for i in range(100))
+    return table
+
+
+def scan(table, query):
+    return [(doc_id, doc) for doc_id, doc in table._read_table().items()
+            if query(doc)]
+
+
+def search(table, query):
+    return [(doc.doc_id, doc) for doc in table.search(query)]
+
+
+def test_results_stay_cached_through_writes(table):
+    query = where('v') >= 90
+    table.search(query)
+
+    table.insert({'v': 95, 'k': 'a'})
+    table.insert({'v': 5, 'k': 'a'})
+    table.update({'k': 'b'}, doc_ids=[95])
+    table.update({'v': 1}, doc_ids=[96])
+    table.remove(doc_ids=[97])
+
+    assert query in table._query_cache
+    assert search(table, query) == scan(table, query)
+    assert [doc.doc_id for doc in table.search(query)] == \
+        [91, 92, 93, 94, 95, 98, 99, 100, 101]
+
+
+def test_documents_starting_to_match_drop_the_results(table):
+    query = where('v') >= 90
+    table.search(query)
+
+    # Where the document belongs in the results isn't known
+    table.update({'v': 1000}, doc_ids=[1])
+
+    assert query not in table._query_cache
+    assert search(table, query) == scan(table, query)
+
+
+def test_many_changes_clear_the_cache(table, monkeypatch):
+    monkeypatch.setattr(table, 'query_cache_patch_limit', 10)
+    query = where('v') >= 90
+    table.search(query)
+
+    table.insert({'v': 95})
+    assert query in table._query_cache
+
+    table.insert_multiple({'v': 95} for _ in range(11))
+    assert query not in table._query_cache
+    assert len(table.search(query)) == 22
+
+
+def test_failing_queries_are_dropped(table):
+    query = where('v') > 50
+    table.search(query)
+
+    table.insert({'v': 'text'})
+
+    assert query not in table._query_cache
+    with pytest.raises(TypeError):
+        table.search(query)
+
+
+def test_truncate_clears_the_cache(table):
+    query = where('v') >= 90
+    table.search(query)
+
+    table.truncate()
+
+    assert table.search(query) == []
+
+
+def test_results_match_a_scan_under_random_writes():
+    rng = random.Random(5)
+    table = TinyDB(storage=MemoryStorage).table('t', cache_size=50)
+    table.insert_multiple({'v': rng.randrange(100), 'k': rng.choice('abc')}
+                          for _ in range(300))
+    queries = [
+        where('v') > 50,
+        where('v') < 10,
+        where('k') == 'a',
+        where('v').one_of([1, 2, 3]) | (where('k') == 'b'),
+    ]
+
+    hits = 0
+    for _ in range(200):
+        for query in queries:
+            assert search(table, query) == scan(table, query), query
+
+        kind = rng.random()
+        doc_ids = list(table._read_table())
+        if kind < .3:
+            table.insert({'v': rng.randrange(100), 'k': rng.choice('abc')})
+        elif kind < .6:
+            table.update({'v': rng.randrange(100)},
+                         doc_ids=[rng.choice(doc_ids)])
+        elif kind < .8:
+            table.remove(doc_ids=[rng.choice(doc_ids)])
+        elif kind < .9:
+            table.upsert({'v': 1, 'k': 'b'}, where('v') == 99)
+        else:
+            table.update({'k': 'a'}, where('v') > 90)
+
+        hits += sum(query in table._query_cache for query in queries)
+
+    # Most results survive the writes
+    assert hits > 200 * len(queries) / 2
+
+
+def test_cache_classes_without_peek():
+    class DictCache(dict):
+        def __init__(self, capacity=None):
+            super().__init__()
+
+    class DictCacheTable(Table):
+        query_cache_class = DictCache
+
+    db = TinyDB(storage=MemoryStorage)
+    table = DictCacheTable(db.storage, 't', cache_size=10)
+    table.insert_multiple({'v': i} for i in range(10))
+    query = where('v') >= 5
+    table.search(query)
+
+    table.insert({'v': 7})
+
+    assert isinstance(table._query_cache, DictCache)
+    assert search(table, query) == scan(table, query)
+    assert len(table._query_cache[query].docs) == 6
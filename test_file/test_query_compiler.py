@@ -0,0 +1,138 @@
+import random
+import re
+
+import pytest
+
+from tinydb_test import Query, where
+from tinydb_test.query_compiler import compile_query
+
+Q = Query()
+
+
+def divisible(value, divisor):
+    return isinstance(value, int) and value % divisor == 0
+
+
+LEAVES = [
+    Q.a == 1,
+    Q.a != [1, 2],
+    Q.a < 5,
+    Q.b.c >= 2,
+    Q.s.matches('x', re.I),
+    Q.s.search('y'),
+    Q.a.test(divisible, 2),
+    Q.l.any(Q.x == 1),
+    Q.l.any([1, 3]),
+    Q.l.all([1]),
+    Q.l.all(Q.x.exists()),
+    Q.a.one_of([1, 3, 'q']),
+    Q.fragment({'a': 1}),
+    Q.b.fragment({'c': 2}),
+    Q.noop(),
+    Q.a.exists(),
+    Q.b == {'c': 2},
+]
+
+
+def random_document(rng):
+    doc = {}
+    if rng.random() < .8:
+        doc['a'] = rng.choice([1, 2, 3, 4, 6, [1, 2], 'q'])
+    if rng.random() < .5:
+        doc['b'] = rng.choice([{'c': 1}, {'c': 2}, 3, {'d': 1}])
+    if rng.random() < .5:
+        doc['s'] = rng.choice(['X', 'xy', 'abc', 5])
+    if rng.random() < .5:
+        doc['l'] = rng.choice([[1, 2], [{'x': 1}], [3], []])
+
+    return doc
+
+
+def random_query(rng, depth):
+    if depth == 0 or rng.random() < .3:
+        return rng.choice(LEAVES)
+
+    kind = rng.random()
+    if kind < .4:
+        return random_query(rng, depth - 1) & random_query(rng, depth - 1)
+    if kind < .8:
+        return random_query(rng, depth - 1) | random_query(rng, depth - 1)
+
+    return ~random_query(rng, depth - 1)
+
+
+def outcome(test, doc):
+    try:
+        return bool(test(doc))
+    except Exception as e:
+        return type(e)
+
+
+def test_compiled_queries_match_queries():
+    rng = random.Random(3)
+    docs = [random_document(rng) for _ in range(100)]
+
+    for _ in range(200):
+        query = random_query(rng, 4)
+        compiled = compile_query(query)
+
+        assert compiled is not query
+        for doc in docs:
+            assert outcome(compiled, doc) == outcome(query, doc), \
+                (query, doc, compiled.source)
+
+
+def test_operands_are_evaluated_in_order():
+    def inverse(value):
+        return 1 / value > 0
+
+    guarded = (where('x') != 0) & where('x').test(inverse)
+    unguarded = where('x').test(inverse) & (where('x') != 0)
+
+    assert compile_query(guarded)({'x': 0}) is False
+    with pytest.raises(ZeroDivisionError):
+        compile_query(unguarded)({'x': 0})
+    with pytest.raises(ZeroDivisionError):
+        unguarded({'x': 0})
+
+
+def test_tuples_and_lists_are_told_apart():
+    as_tuple = compile_query(Q.a == (1, 2))
+    as_list = compile_query(Q.a == [1, 2])
+
+    assert as_tuple is not as_list
+    assert as_tuple({'a': (1, 2)}) and not as_tuple({'a': [1, 2]})
+    assert as_list({'a': [1, 2]}) and not as_list({'a': (1, 2)})
+
+
+def test_compiled_queries_are_cached():
+    assert compile_query(where('n') == 1) is compile_query(where('n') == 1)
+    assert compile_query(where('n') == 1) is not \
+        compile_query(where('n') == 2)
+
+
+def test_uncacheable_queries_are_not_compiled():
+    query = Q.a.map(len) == 1
+
+    assert compile_query(query) is query
+    assert compile_query(query)({'a': 'x'}) is True
+
+
+def test_other_callables_are_not_compiled():
+    def test(doc):
+        return True
+
+    path = Q.a
+
+    assert compile_query(test) is test
+    assert compile_query(path) is path
+
+
+def test_source_inlines_the_path_lookup():
+    compiled = compile_query((where('user').age >= 18)
+                             & (where('active') == True))  # noqa: E712
+
+    assert "doc['user']['age']" in compiled.source
+    assert compiled({'user': {'age': 20}, 'active': True})
+    assert not compiled({'user': {'age': 20}})
+    assert not compiled({'user': 20, 'active': True})
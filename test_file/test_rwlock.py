@@ -0,0 +1,183 @@
+import random
+import threading
+import time
+
+import pytest
+
+from tinydb_test import JSONStorage, TinyDB, where
+from tinydb_test.middlewares import CachingMiddleware
+from tinydb_test.storages import MemoryStorage
+from tinydb_test.utils import RWLock
+
+
+def wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline
+        time.sleep(0.001)
+
+
+def start(target, *args):
+    thread = threading.Thread(target=target, args=args)
+    thread.start()
+    return thread
+
+
+def test_lock_is_reentrant():
+    lock = RWLock()
+
+    with lock.read():
+        with lock.read():
+            pass
+
+    with lock.write():
+        with lock.read():
+            with lock.write():
+                pass
+
+    # Released completely, so other threads can write
+    def write():
+        with lock.write():
+            pass
+
+    thread = start(write)
+    thread.join(5)
+    assert not thread.is_alive()
+
+
+def test_readers_cant_start_writing():
+    lock = RWLock()
+
+    with lock.read():
+        with pytest.raises(RuntimeError):
+            lock.acquire_write()
+
+    with lock.write():
+        pass
+
+
+def test_readers_read_at_the_same_time():
+    lock = RWLock()
+    barrier = threading.Barrier(4, timeout=5)
+
+    def read():
+        with lock.read():
+            # Only passes if all readers hold the lock at once
+            barrier.wait()
+
+    threads = [start(read) for _ in range(4)]
+    for thread in threads:
+        thread.join()
+
+
+def test_writers_wait_for_readers():
+    lock = RWLock()
+    events = []
+
+    def write():
+        with lock.write():
+            events.append('w')
+
+    lock.acquire_read()
+    writer = start(write)
+    wait_for(lambda: lock._writers_waiting == 1)
+    assert events == []
+
+    lock.release_read()
+    writer.join(5)
+    assert events == ['w']
+
+
+def test_waiting_writers_go_before_new_readers():
+    lock = RWLock()
+    order = []
+    release = threading.Event()
+
+    def long_read():
+        with lock.read():
+            release.wait(5)
+            order.append('r1')
+
+    def write():
+        with lock.write():
+            order.append('w')
+
+    def late_read():
+        with lock.read():
+            order.append('r2')
+
+    threads = [start(long_read)]
+    wait_for(lambda: lock._readers == 1)
+    threads.append(start(write))
+    wait_for(lambda: lock._writers_waiting == 1)
+    threads.append(start(late_read))
+    time.sleep(0.05)
+    release.set()
+
+    for thread in threads:
+        thread.join()
+
+    assert order == ['r1', 'w', 'r2']
+
+
+def test_after_write_runs_once_the_lock_is_released():
+    lock = RWLock()
+    calls = []
+
+    def callback():
+        calls.append(lock._writer)
+
+    with lock.write():
+        lock.after_write(callback)
+        lock.after_write(callback)
+        assert calls == []
+
+    assert calls == [None]
+
+    lock.after_write(callback)
+    assert calls == [None, None]
+
+
+@pytest.mark.parametrize('storage', ['json', 'caching', 'memory'])
+def test_concurrent_readers_and_writers(storage):
+    if storage == 'json':
+        db = TinyDB('db.json')
+    elif storage == 'caching':
+        db = TinyDB('db.json', storage=CachingMiddleware(JSONStorage))
+    else:
+        db = TinyDB(storage=MemoryStorage)
+
+    errors = []
+
+    def write(key):
+        try:
+            for i in range(100):
+                db.insert({'k': key, 'i': i})
+                if i % 10 == 0:
+                    db.update({'x': i}, where('k') == key)
+        except Exception as e:
+            errors.append(e)
+
+    def read():
+        rng = random.Random()
+        try:
+            for _ in range(100):
+                db.search(where('i') < 50)
+                db.get(doc_id=rng.randint(1, 100))
+                len(db)
+                for _ in db.iter_search(where('k') == 1):
+                    pass
+                list(db)
+        except Exception as e:
+            errors.append(e)
+
+    threads = [start(write, key) for key in range(4)] + \
+        [start(read) for _ in range(4)]
+    for thread in threads:
+        thread.join()
+
+    assert errors == []
+    doc_ids = [doc.doc_id for doc in db]
+    assert len(doc_ids) == len(set(doc_ids)) == len(db) == 400
+    assert len(db.search(where('i') < 50)) == 200
+    db.close()
@@ -0,0 +1,69 @@
+import pytest
+
+from tinydb_test import TinyDB, where
+from tinydb_test.serialization import CODECS, Codec, JSONCodec, get_codec
+
+DATA = {'_default': {1: {'s': 'text', 'n': 1, 'f': 1.5, 'l': [1, 'a', None],
+                         'd': {'nested': True}}}}
+
+
+@pytest.mark.parametrize('name', sorted(CODECS))
+def test_codec_round_trip(name):
+    codec = get_codec(name)
+    assert codec.name == name
+
+    decoded = codec.decode(codec.encode(DATA))
+    table = decoded['_default']
+    assert table[next(iter(table))] == DATA['_default'][1]
+
+
+@pytest.mark.parametrize('name', sorted(CODECS))
+def test_database_with_codec(tmp_path, name):
+    path = str(tmp_path / 'db')
+    db = TinyDB(path, codec=name)
+    db.insert_multiple({'n': i} for i in range(10))
+    db.remove(where('n') == 3)
+    db.close()
+
+    db = TinyDB(path, codec=name)
+    assert len(db) == 9
+    assert db.get(doc_id=5) == {'n': 4}
+    assert db.insert({'n': 10}) == 11
+    db.close()
+
+
+def test_codec_instances_are_used_as_they_are(tmp_path):
+    codec = JSONCodec(sort_keys=True)
+    assert get_codec(codec) is codec
+
+    path = tmp_path / 'db.json'
+    db = TinyDB(str(path), codec=codec)
+    db.insert({'b': 1, 'a': 2})
+    db.close()
+
+    assert path.read_bytes().index(b'"a"') < path.read_bytes().index(b'"b"')
+
+
+def test_custom_codec(tmp_path):
+    class ReprCodec(Codec):
+        name = 'repr'
+
+        def encode(self, obj):
+            return repr(obj).encode('utf-8')
+
+        def decode(self, data):
+            return eval(data.decode('utf-8'))
+
+    path = str(tmp_path / 'db')
+    db = TinyDB(path, codec=ReprCodec())
+    db.insert({'n': 1})
+    db.close()
+
+    db = TinyDB(path, codec=ReprCodec())
+    assert db.all() == [{'n': 1}]
+    db.close()
+
+
+def test_unknown_codec():
+    with pytest.raises(ValueError, match='Unknown codec'):
+        get_codec('yaml')
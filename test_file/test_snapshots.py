@@ -0,0 +1,146 @@
+import threading
+
+import pytest
+
+from tinydb_test import Query, TinyDB, where
+from tinydb_test.operations import add
+from tinydb_test.paged_storage import PagedStorage
+from tinydb_test.storages import MemoryStorage
+
+
+@pytest.fixture
+def db():
+    db = TinyDB(storage=MemoryStorage)
+    db.insert_multiple({'i': i, 'tags': ['a']} for i in range(100))
+    return db
+
+
+def pins(db):
+    return db.table('_default')._pins
+
+
+def test_snapshots_dont_see_later_writes(db):
+    with db.snapshot() as snapshot:
+        db.insert({'i': 5000, 'tags': []})
+        db.update({'i': -1}, doc_ids=[1])
+        db.update(add('tags', ['b']), doc_ids=[2])
+        db.remove(doc_ids=[3])
+
+        assert len(snapshot) == 100
+        assert len(db) == 100
+        assert snapshot.get(doc_id=1)['i'] == 0
+        assert db.get(doc_id=1)['i'] == -1
+        assert snapshot.get(doc_id=2)['tags'] == ['a']
+        assert db.get(doc_id=2)['tags'] == ['a', 'b']
+        assert snapshot.contains(doc_id=3)
+        assert not db.contains(doc_id=3)
+        assert snapshot.count(where('i') < 10) == 10
+        assert snapshot.search(where('i') == 5000) == []
+
+    assert pins(db) == {}
+
+
+def test_untouched_documents_are_shared(db):
+    with db.snapshot() as snapshot:
+        db.update({'i': -1}, doc_ids=[1])
+
+        stored = db.table('_default')._read_table()
+        assert snapshot.get(doc_id=2) == stored[2]
+        assert snapshot._docs[2] is stored[2]
+
+
+def test_iterators_dont_see_later_writes(db):
+    documents = db.iter_search(where('i') >= 0)
+    next(documents)
+
+    db.insert({'i': 7777, 'tags': []})
+    db.remove(doc_ids=[4])
+    rest = list(documents)
+
+    assert len(rest) == 99
+    assert not any(doc['i'] == 7777 for doc in rest)
+    assert any(doc.doc_id == 4 for doc in rest)
+    assert pins(db) == {}
+
+
+def test_abandoned_iterators_release_their_version(db):
+    documents = iter(db)
+    next(documents)
+    assert pins(db) != {}
+
+    del documents
+    assert pins(db) == {}
+
+
+def test_writes_dont_wait_for_scans(db):
+    scanning = threading.Event()
+    written = threading.Event()
+
+    def slow(value):
+        if value == 50:
+            scanning.set()
+            assert written.wait(5)
+        return True
+
+    results = []
+    scan = threading.Thread(
+        target=lambda: results.extend(db.search(Query().i.test(slow))))
+    scan.start()
+
+    assert scanning.wait(5)
+    db.insert({'i': -5, 'tags': []})
+    written.set()
+    scan.join()
+
+    assert len(results) == 100
+    assert len(db.search(Query().i.test(slow))) == 101
+
+
+@pytest.mark.parametrize('storage', [None, PagedStorage])
+def test_writing_while_iterating(storage):
+    if storage is None:
+        db = TinyDB('db.json')
+    else:
+        db = TinyDB('db.db', storage=storage)
+
+    table = db.table('t')
+    table.insert_multiple({'n': i} for i in range(10))
+
+    seen = []
+    for doc in table.iter_search(where('n') >= 0):
+        seen.append(doc.doc_id)
+        if doc['n'] == 2:
+            table.remove(where('n') == 5)
+            table.update({'n': 70}, where('n') == 7)
+
+    # Tables that can be pinned are iterated as they were, the others
+    # as they are
+    if storage is None:
+        assert seen == list(range(1, 11))
+    else:
+        assert seen == [1, 2, 3, 4, 5, 7, 8, 9, 10]
+
+    seen = []
+    for doc in table:
+        seen.append(doc['n'])
+        if len(seen) == 1:
+            table.insert({'n': 100})
+
+    assert len(seen) == len(set(seen))
+    assert len(table) == 10
+    assert table.search(where('n') > 50, limit=1) == [{'n': 70}]
+    db.close()
+
+
+def test_snapshots_of_unpinnable_tables_block_writes_from_their_thread():
+    db = TinyDB('db.db', storage=PagedStorage)
+    db.insert({'n': 1})
+
+    with db.snapshot() as snapshot:
+        assert len(snapshot) == 1
+        with pytest.raises(RuntimeError):
+            db.insert({'n': 2})
+
+    db.insert({'n': 2})
+    assert len(db) == 2
+    db.close()
@@ -0,0 +1,185 @@
+import json
+import os
+
+import pytest
+
+from tinydb_test import JSONStorage, TinyDB
+from tinydb_test.middlewares import CachingMiddleware
+from tinydb_test.multi_file_storage import MultiFileStorage
+from tinydb_test.paged_storage import PagedStorage
+from tinydb_test.partitioned_storage import PartitionedStorage
+from tinydb_test.storages import MemoryStorage, table_meta
+from tinydb_test.table import Table
+
+STORAGES = {
+    'json': lambda: TinyDB('db.json'),
+    'multi': lambda: TinyDB('db', storage=MultiFileStorage),
+    'partitioned': lambda: TinyDB('db', storage=PartitionedStorage,
+                                  partitions=3),
+    'paged': lambda: TinyDB('db.db', storage=PagedStorage),
+}
+
+
+@pytest.fixture
+def table_reads(monkeypatch):
+    """Count how often tables are read."""
+    reads = [0]
+    read_table = Table._read_table
+
+    def counting(self):
+        reads[0] += 1
+        return read_table(self)
+
+    monkeypatch.setattr(Table, '_read_table', counting)
+    return reads
+
+
+@pytest.mark.parametrize('storage', sorted(STORAGES))
+def test_counting_doesnt_read_the_table(storage, table_reads):
+    db = STORAGES[storage]()
+    table = db.table('t')
+    table.insert_multiple({'a': i} for i in range(10))
+    table.remove(doc_ids=[10])
+    table.remove(doc_ids=[3])
+    db.close()
+
+    db = STORAGES[storage]()
+    table = db.table('t')
+    table_reads[0] = 0
+
+    assert len(table) == 8
+    assert table.insert({'a': 99}) == 10
+    assert table_reads[0] == 0
+
+    meta = db.storage.table_meta('t')
+    assert (meta.next_id, meta.count) == (11, 9)
+    assert len(db.table('none')) == 0
+
+    table.truncate()
+    assert len(table) == 0
+    assert table.insert({'a': 1}) == 1
+
+    with db.transaction():
+        table.insert({'b': 1})
+        assert len(table) == 2
+    assert db.storage.table_meta('t').next_id == 3
+
+    db.drop_table('t')
+    assert len(db.table('t')) == 0
+    db.close()
+
+
+def test_metadata_is_updated_incrementally():
+    table = {1: {}, 2: {}, 5: {}}
+    meta = table_meta(table)
+    assert meta == [6, 3, None]
+
+    table[6] = {}
+    del table[2]
+    assert table_meta(table, 10, meta, {6: {}, 2: None}) == [7, 3, 10]
+
+    # Removing the last document requires looking at all IDs
+    del table[6]
+    assert table_meta(table, None, [7, 3, None], {6: None}) == [6, 2, None]
+
+
+def test_only_int_ids_count():
+    assert table_meta({1: {}, 'a': {}}) == [2, 2, None]
+    assert table_meta({'a': {}}, None, [1, 0, None], {'a': {}}) == \
+        [1, 1, None]
+
+
+def test_metadata_is_written_next_to_the_file(tmp_path):
+    path = tmp_path / 'db.json'
+    db = TinyDB(path)
+    db.insert({'a': 1})
+    db.close()
+
+    assert sorted(os.listdir(tmp_path)) == ['db.json', 'db.json.meta']
+
+
+def test_missing_metadata_is_recomputed():
+    db = TinyDB('db.json')
+    db.insert_multiple({'a': i} for i in range(3))
+    db.close()
+    os.remove('db.json.meta')
+
+    db = TinyDB('db.json')
+    assert db.storage.table_meta('_default') is None
+    assert len(db) == 3
+    assert db.insert({}) == 4
+    assert db.storage.table_meta('_default').next_id == 5
+    db.close()
+
+
+@pytest.mark.parametrize('junk', [
+    '{',
+    '[]',
+    '"x"',
+    '{"file": [1, 2], "tables": 5}',
+    '{"tables": {"_default": [1]}}',
+])
+def test_corrupt_metadata_is_ignored(junk):
+    db = TinyDB('db.json')
+    db.insert_multiple({'a': i} for i in range(3))
+    db.close()
+    with open('db.json.meta', 'w') as handle:
+        handle.write(junk)
+
+    db = TinyDB('db.json')
+    assert db.storage.table_meta('_default') is None
+    assert len(db) == 3
+    assert db.insert({}) == 4
+    db.close()
+
+
+def test_stale_metadata_is_ignored():
+    db = TinyDB('db.json')
+    db.insert({'x': 1})
+    db.insert({'x': 2})
+    db.close()
+
+    # Another program rewrites the file
+    with open('db.json', 'w') as handle:
+        json.dump({'_default': {'1': {'x': 1}, '7': {'x': 7}, '8': {}}},
+                  handle)
+
+    db = TinyDB('db.json')
+    assert db.storage.table_meta('_default') is None
+    assert len(db) == 3
+    assert db.insert({}) == 9
+    db.close()
+
+
+def test_values_other_than_tables_are_kept(tmp_path):
+    path = tmp_path / 'db.json'
+    with open(path, 'w') as handle:
+        json.dump({'version': 3, 't': {'a': {'x': 1}}}, handle)
+
+    storage = JSONStorage(path)
+    storage.write(storage.read())
+
+    with open(path) as handle:
+        assert json.load(handle) == {'version': 3, 't': {'a': {'x': 1}}}
+    assert storage.table_meta('t').count == 1
+    storage.close()
+
+
+def test_caching_middleware_only_knows_flushed_metadata():
+    db = TinyDB('db.json', storage=CachingMiddleware(JSONStorage))
+    db.insert({'a': 1})
+
+    assert db.storage.table_meta('_default') is None
+    assert len(db) == 1
+
+    db.storage.flush()
+    assert db.storage.table_meta('_default').count == 1
+    db.close()
+
+
+def test_memory_storage_has_no_metadata():
+    db = TinyDB(storage=MemoryStorage)
+    db.insert({})
+
+    assert db.storage.table_meta('_default') is None
+    assert len(db) == 1
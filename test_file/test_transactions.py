@@ -0,0 +1,229 @@
+import multiprocessing
+import os
+import threading
+
+import pytest
+
+from tinydb_test import JSONStorage, TinyDB, where
+from tinydb_test import index_manager
+from tinydb_test.indexed_tinydb import IndexedTinyDB
+from tinydb_test.middlewares import CachingMiddleware
+from tinydb_test.paged_storage import PagedStorage
+from tinydb_test.storages import MemoryStorage
+
+
+def open_db(storage):
+    if storage == 'json':
+        return TinyDB('db.json')
+    if storage == 'caching':
+        return TinyDB('db.json', storage=CachingMiddleware(JSONStorage))
+    if storage == 'paged':
+        return TinyDB('db.db', storage=PagedStorage)
+
+    return TinyDB(storage=MemoryStorage)
+
+
+@pytest.fixture(params=['json', 'memory', 'caching', 'paged'])
+def db(request):
+    db = open_db(request.param)
+    db.insert({'a': 0})
+    yield db
+    db.close()
+
+
+@pytest.fixture
+def write_changes(db):
+    """Count the writes to the storage."""
+    calls = []
+    write_changes = db.storage.write_changes
+
+    def counting(data, changes):
+        calls.append(changes)
+        return write_changes(data, changes)
+
+    db.storage.write_changes = counting
+    return calls
+
+
+def test_transaction_is_written_once(db, write_changes):
+    with db.transaction():
+        for i in range(1, 10):
+            db.insert({'a': i})
+        db.update({'b': 1}, where('a') == 3)
+        db.table('t2').insert({'x': 1})
+
+        # Reads see the writes made so far
+        assert len(db) == 10
+        assert db.get(where('a') == 3)['b'] == 1
+        assert db.count(where('a') >= 0) == 10
+
+    assert len(write_changes) == 1
+    assert len(db) == 10
+    assert len(db.table('t2')) == 1
+
+
+def test_failed_transaction_is_rolled_back(db, write_changes):
+    with pytest.raises(KeyError):
+        with db.transaction():
+            db.insert({'a': 100})
+            db.remove(where('a') == 0)
+            db.table('t3').insert({'y': 1})
+            raise KeyError
+
+    assert write_changes == []
+    assert db.all() == [{'a': 0}]
+    assert db.search(where('a') == 100) == []
+    assert 't3' not in db.tables()
+    # The IDs of the rolled back documents are used again
+    assert db.insert({'a': 1}) == 2
+
+
+def test_nested_transactions_are_part_of_the_outer_one(db, write_changes):
+    with pytest.raises(KeyError):
+        with db.transaction():
+            with db.transaction():
+                db.insert({'a': 1})
+            assert len(db) == 2
+            raise KeyError
+
+    assert write_changes == []
+    assert len(db) == 1
+
+
+def test_tables_cant_be_dropped_in_a_transaction(db):
+    with pytest.raises(RuntimeError):
+        with db.transaction():
+            db.drop_table('_default')
+
+    assert len(db) == 1
+
+
+def test_transactions_are_persisted():
+    for storage in ('json', 'caching'):
+        db = open_db(storage)
+        with db.transaction():
+            db.insert_multiple({'a': i} for i in range(5))
+        db.close()
+
+    db = TinyDB('db.json')
+    assert len(db) == 10
+    db.close()
+
+
+def test_snapshots_dont_see_transactions():
+    db = TinyDB(storage=MemoryStorage)
+    db.insert_multiple({'a': i} for i in range(5))
+
+    with db.snapshot() as snapshot:
+        with pytest.raises(ValueError):
+            with db.transaction():
+                db.insert({'a': 9})
+                db.remove(doc_ids=[1])
+                assert len(snapshot) == 5
+                raise ValueError
+
+        with db.transaction():
+            db.insert({'a': 9})
+        assert len(snapshot) == 5
+
+    assert len(db) == 6
+    assert db.get(doc_id=1) is not None
+
+
+def test_other_threads_wait_for_the_transaction():
+    db = TinyDB(storage=MemoryStorage)
+    started = threading.Event()
+    seen = []
+
+    def read():
+        started.set()
+        seen.append(len(db))
+
+    with db.transaction():
+        db.insert({'a': 1})
+        reader = threading.Thread(target=read)
+        reader.start()
+        assert started.wait(5)
+        reader.join(0.05)
+        db.insert({'a': 2})
+
+    reader.join(5)
+    assert seen == [2]
+
+
+def test_concurrent_transactions_dont_lose_updates():
+    db = TinyDB(storage=MemoryStorage)
+    db.insert({'counter': 0})
+    errors = []
+
+    def increment():
+        try:
+            for _ in range(50):
+                with db.transaction():
+                    counter = db.get(doc_id=1)['counter']
+                    db.update({'counter': counter + 1}, doc_ids=[1])
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=increment) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert errors == []
+    assert db.get(doc_id=1)['counter'] == 200
+
+
+def insert_and_crash(path):
+    db = TinyDB(path)
+    with db.transaction():
+        db.insert({'a': 1})
+        db.insert({'a': 2})
+        os._exit(3)
+
+
+def test_crash_in_a_transaction_writes_nothing():
+    db = TinyDB('db.json')
+    db.insert({'a': 0})
+    db.close()
+
+    process = multiprocessing.Process(target=insert_and_crash,
+                                      args=('db.json',))
+    process.start()
+    process.join()
+    assert process.exitcode == 3
+
+    db = TinyDB('db.json')
+    assert db.all() == [{'a': 0}]
+    db.close()
+
+
+def test_indexed_transactions(monkeypatch):
+    saves = []
+    save_pointer_store = index_manager.save_pointer_store
+
+    def counting(*args):
+        saves.append(args)
+        return save_pointer_store(*args)
+
+    monkeypatch.setattr(index_manager, 'save_pointer_store', counting)
+
+    db = IndexedTinyDB('db.json')
+    db.create_index('$.n', 'n', 'NUMERIC')
+
+    with db.transaction():
+        for i in range(10):
+            db.insert({'n': i % 3})
+
+    assert len(saves) == 1
+    assert len(db.search(('n', 1))) == 3
+
+    with pytest.raises(ValueError):
+        with db.transaction():
+            db.insert({'n': 7})
+            raise ValueError
+
+    assert db.search(('n', 7)) == []
+    assert len(db) == 10
+    db.close()
@@ -0,0 +1,123 @@
+import multiprocessing
+import os
+import threading
+import time
+
+import pytest
+
+from tinydb_test import TinyDB, JSONStorage
+from tinydb_test.middlewares import WALMiddleware
+from tinydb_test.wal import WriteAheadLog
+
+
+def open_db(path, **kwargs):
+    return TinyDB(path, storage=WALMiddleware(JSONStorage, **kwargs))
+
+
+def insert_and_crash(path, count):
+    db = open_db(path)
+    for i in range(count):
+        db.insert({'n': i})
+
+    # Exit without closing, so nothing is checkpointed
+    os._exit(0)
+
+
+def test_committed_writes_survive_a_crash(tmp_path):
+    path = str(tmp_path / 'db.json')
+
+    process = multiprocessing.Process(target=insert_and_crash,
+                                      args=(path, 20))
+    process.start()
+    process.join()
+    assert process.exitcode == 0
+
+    # The writes are only in the log
+    assert os.path.getsize(path) == 0
+    assert os.path.getsize(path + '.wal') > 0
+
+    db = open_db(path)
+    assert [doc['n'] for doc in db] == list(range(20))
+    assert db.insert({'n': 20}) == 21
+    db.close()
+
+
+def test_close_checkpoints_the_log(tmp_path):
+    path = str(tmp_path / 'db.json')
+    db = open_db(path)
+    db.insert_multiple({'n': i} for i in range(5))
+    db.close()
+
+    assert os.path.getsize(path + '.wal') == 0
+    assert len(TinyDB(path)) == 5
+
+
+def test_interrupted_record_is_discarded(tmp_path):
+    path = str(tmp_path / 'log.wal')
+    wal = WriteAheadLog(path)
+    wal.commit(wal.append({'a': 1}))
+    wal.close()
+
+    with open(path, 'ab') as handle:
+        handle.write(b'{"a": ')
+
+    wal = WriteAheadLog(path)
+    assert list(wal.records()) == [{'a': 1}]
+    wal.commit(wal.append({'a': 2}))
+    assert list(wal.records()) == [{'a': 1}, {'a': 2}]
+    wal.close()
+
+
+def test_insert_returns_once_the_record_is_synced(tmp_path):
+    db = open_db(str(tmp_path / 'db.json'))
+    db.insert({'n': 1})
+
+    wal = db.storage.wal
+    assert wal._synced_lsn == wal._lsn == 1
+    db.close()
+
+
+def test_concurrent_commits_share_syncs(tmp_path, monkeypatch):
+    db = open_db(str(tmp_path / 'db.json'))
+
+    syncs = []
+    fsync = os.fsync
+
+    def slow_fsync(fd):
+        syncs.append(fd)
+        time.sleep(0.005)
+        fsync(fd)
+
+    monkeypatch.setattr(os, 'fsync', slow_fsync)
+
+    def insert(k):
+        for i in range(20):
+            db.insert({'k': k, 'i': i})
+
+    threads = [threading.Thread(target=insert, args=(k,)) for k in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(db) == 160
+    assert len(syncs) < 100
+    db.close()
+
+
+@pytest.mark.parametrize('durability', ['interval', 'os'])
+def test_relaxed_durability(tmp_path, durability):
+    path = str(tmp_path / 'db.json')
+    db = open_db(path, durability=durability, sync_interval=0.01)
+    db.insert_multiple({'n': i} for i in range(5))
+    db.insert({'n': 5})
+    db.close()
+
+    db = open_db(path)
+    assert len(db) == 6
+    db.close()
+
+
+def test_unknown_durability_is_rejected(tmp_path):
+    with pytest.raises(ValueError):
+        WriteAheadLog(str(tmp_path / 'log.wal'), durability='never')
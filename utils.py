@@ -2,16 +2,22 @@
 Utility functions.
 """
 
+import heapq
+import itertools
+import threading
 from collections import OrderedDict, abc
-from typing import List, Iterator, TypeVar, Generic, Union, Optional, Type, \
-    TYPE_CHECKING
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, List, Iterator, TypeVar, Generic, \
+    Union, Optional, Tuple, Type, Mapping, TYPE_CHECKING
 
 K = TypeVar('K')
 V = TypeVar('V')
 D = TypeVar('D')
 T = TypeVar('T')
 
-__all__ = ('LRUCache', 'freeze', 'with_typehint', 'int_to_bytes', 'str_to_bytes')
+__all__ = ('LRUCache', 'CostAwareCache', 'FrozenList', 'RWLock', 'freeze',
+           'thaw', 'with_typehint', 'int_to_bytes', 'str_to_bytes',
+           'estimate_size')
 
 def int_to_bytes(n, length=8):
     # Convert the integer to bytes with a fixed length.
@@ -24,6 +30,23 @@ def str_to_bytes(s, key_size=13):
     return b.ljust(key_size, b'\x00')
 
 
+def estimate_size(obj) -> int:
+    """
+    Estimate how many bytes an object takes up when serialized as JSON,
+    without actually serializing it.
+    """
+    if isinstance(obj, str):
+        return len(obj) + 2
+    elif isinstance(obj, Mapping):
+        return 2 + sum(estimate_size(key) + estimate_size(value) + 2
+                       for key, value in obj.items())
+    elif isinstance(obj, (list, tuple)):
+        return 2 + sum(estimate_size(value) + 1 for value in obj)
+    else:
+        # Numbers, booleans and ``None``
+        return 8
+
+
 def with_typehint(baseclass: Type[T]):
     """
     Add type hints from a specified class to a base class:
@@ -58,22 +81,28 @@ class LRUCache(abc.MutableMapping, Generic[K, V]):
     entry is moved to the front by re-inserting it into the ``OrderedDict``.
     When adding an entry and the cache size is exceeded, the last entry will
     be discarded.
+
+    As reading an entry reorders the entries, all accesses hold a lock, so
+    the cache can be used by several threads at once.
     """
 
     def __init__(self, capacity=None) -> None:
         self.capacity = capacity
         self.cache: OrderedDict[K, V] = OrderedDict()
+        self._lock = threading.Lock()
 
     @property
     def lru(self) -> List[K]:
-        return list(self.cache.keys())
+        with self._lock:
+            return list(self.cache.keys())
 
     @property
     def length(self) -> int:
         return len(self.cache)
 
     def clear(self) -> None:
-        self.cache.clear()
+        with self._lock:
+            self.cache.clear()
 
     def __len__(self) -> int:
         return self.length
@@ -85,7 +114,8 @@ class LRUCache(abc.MutableMapping, Generic[K, V]):
         self.set(key, value)
 
     def __delitem__(self, key: K) -> None:
-        del self.cache[key]
+        with self._lock:
+            del self.cache[key]
 
     def __getitem__(self, key) -> V:
         value = self.get(key)
@@ -95,30 +125,463 @@ class LRUCache(abc.MutableMapping, Generic[K, V]):
         return value
 
     def __iter__(self) -> Iterator[K]:
-        return iter(self.cache)
+        # Iterate over a copy, as other threads may change the cache
+        return iter(self.lru)
 
     def get(self, key: K, default: Optional[D] = None) -> Optional[Union[V, D]]:
-        value = self.cache.get(key)
+        with self._lock:
+            value = self.cache.get(key)
 
-        if value is not None:
-            self.cache.move_to_end(key, last=True)
+            if value is not None:
+                self.cache.move_to_end(key, last=True)
 
-            return value
+                return value
 
         return default
 
+    def peek(self, key: K) -> Optional[V]:
+        """
+        Get an entry without counting it as used.
+        """
+        return self.cache.get(key)
+
     def set(self, key: K, value: V):
-        if self.cache.get(key):
-            self.cache[key] = value
-            self.cache.move_to_end(key, last=True)
+        with self._lock:
+            if self.cache.get(key):
+                self.cache[key] = value
+                self.cache.move_to_end(key, last=True)
+            else:
+                self.cache[key] = value
+
+                # Check, if the cache is full and we have to remove old items
+                # If the queue is of unlimited size, self.capacity is NaN and
+                # x > NaN is always False in Python and the cache won't be
+                # cleared.
+                if self.capacity is not None and self.length > self.capacity:
+                    self.cache.popitem(last=False)
+
+
+class CostAwareCache:
+    """
+    A cache bounded by the size of its entries in bytes.
+
+    Which entries are evicted to make room depends on the ``policy``:
+
+    - ``'gdsf'`` (Greedy-Dual-Size-Frequency): keeps entries that are
+      expensive to recompute, small and frequently used,
+    - ``'gds'`` (Greedy-Dual-Size): like ``'gdsf'`` but ignoring how often
+      entries are used,
+    - ``'lru'``: evicts the least-recently used entries.
+
+    Every entry is added with the cost of recomputing it (e.g. the time it
+    took) and its size, by default taken from the value's ``cost`` and
+    ``size`` attributes. Entries larger than the whole cache aren't added.
+
+    A cache can be shared by several owners (e.g. the tables of a database),
+    each of which gets a :meth:`view` of its own entries. The owners then
+    compete for the same memory. All accesses hold a lock, so the owners
+    may use the cache from different threads.
+    """
+
+    POLICIES = ('gdsf', 'gds', 'lru')
+
+    def __init__(self, max_bytes: int = 64 * 1024 * 1024,
+                 policy: str = 'gdsf'):
+        if policy not in self.POLICIES:
+            raise ValueError('Unsupported policy {!r}. Use one of {}.'
+                             .format(policy, ', '.join(self.POLICIES)))
+
+        self.max_bytes = max_bytes
+        self.policy = policy
+        self.size = 0
+
+        # The entries by owner and key as [value, cost, size, uses,
+        # priority]. Evicting an entry raises the ``inflation`` to its
+        # priority, so old entries lose against new ones over time.
+        self._entries: Dict[Any, Dict[Any, list]] = {}
+        self._inflation = 0.0
+
+        # Entries by priority. Priorities change on every hit, so the heap
+        # has stale items that are skipped when evicting.
+        self._heap: List[Tuple[float, int, Any, Any]] = []
+        self._counter = itertools.count()
+
+        self._lock = threading.RLock()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return sum(len(entries) for entries in self._entries.values())
+
+    def view(self, owner: Any) -> 'CacheView':
+        """
+        Get a view of the entries of ``owner``.
+        """
+        return CacheView(self, owner)
+
+    def _prioritize(self, owner: Any, key: Any, entry: list) -> None:
+        _, cost, size, uses, _ = entry
+
+        if self.policy == 'lru':
+            priority = float(next(self._counter))
+        elif self.policy == 'gds':
+            priority = self._inflation + cost / size
         else:
-            self.cache[key] = value
+            priority = self._inflation + uses * cost / size
+
+        entry[4] = priority
+        heapq.heappush(self._heap, (priority, next(self._counter), owner, key))
+
+        if len(self._heap) > 2 * len(self) + 64:
+            # Drop the stale items
+            self._heap = [item for item in self._heap
+                          if self._is_current(item)]
+            heapq.heapify(self._heap)
+
+    def _is_current(self, item: Tuple[float, int, Any, Any]) -> bool:
+        priority, _, owner, key = item
+        entry = self._entries.get(owner, {}).get(key)
+
+        return entry is not None and entry[4] == priority
+
+    def get(self, owner: Any, key: Any) -> Any:
+        with self._lock:
+            entry = self._entries.get(owner, {}).get(key)
+            if entry is None:
+                return None
+
+            entry[3] += 1
+            self._prioritize(owner, key, entry)
+
+            return entry[0]
+
+    def peek(self, owner: Any, key: Any) -> Any:
+        """
+        Get an entry without counting it as used.
+        """
+        entry = self._entries.get(owner, {}).get(key)
+
+        return None if entry is None else entry[0]
+
+    def set(self, owner: Any, key: Any, value: Any,
+            cost: Optional[float] = None, size: Optional[int] = None) -> None:
+        if cost is None:
+            cost = getattr(value, 'cost', 1.0)
+        if size is None:
+            size = getattr(value, 'size', None)
+        if size is None:
+            size = estimate_size(value)
+        size = max(size, 1)
+
+        with self._lock:
+            self.remove(owner, key)
+            if size > self.max_bytes:
+                return
+
+            while self.size + size > self.max_bytes:
+                self._evict()
+
+            entry = [value, cost, size, 1, 0.0]
+            self._entries.setdefault(owner, {})[key] = entry
+            self.size += size
+            self._prioritize(owner, key, entry)
+
+    def _evict(self) -> None:
+        while True:
+            item = heapq.heappop(self._heap)
+            if self._is_current(item):
+                break
+
+        priority, _, owner, key = item
+        if self.policy != 'lru':
+            self._inflation = priority
+
+        self.remove(owner, key)
+
+    def remove(self, owner: Any, key: Any) -> None:
+        with self._lock:
+            entries = self._entries.get(owner)
+            if entries is None or key not in entries:
+                return
+
+            self.size -= entries.pop(key)[2]
+            if not entries:
+                del self._entries[owner]
+
+    def keys(self, owner: Any) -> List[Any]:
+        with self._lock:
+            return list(self._entries.get(owner, ()))
+
+    def clear(self, owner: Any) -> None:
+        with self._lock:
+            for key in self.keys(owner):
+                self.remove(owner, key)
+
+    def clear_all(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._heap.clear()
+            self.size = 0
+
+
+class CacheView(abc.MutableMapping):
+    """
+    The entries of one owner of a :class:`CostAwareCache`.
+
+    The view acts like a dictionary, :meth:`set` also takes the cost and
+    size of an entry.
+    """
+
+    def __init__(self, cache: CostAwareCache, owner: Any):
+        self.cache = cache
+        self.owner = owner
+
+    def get(self, key, default=None):
+        value = self.cache.get(self.owner, key)
+
+        return default if value is None else value
+
+    def peek(self, key):
+        return self.cache.peek(self.owner, key)
+
+    def set(self, key, value, cost: Optional[float] = None,
+            size: Optional[int] = None) -> None:
+        self.cache.set(self.owner, key, value, cost, size)
+
+    def __getitem__(self, key):
+        value = self.get(key)
+        if value is None:
+            raise KeyError(key)
+
+        return value
 
-            # Check, if the cache is full and we have to remove old items
-            # If the queue is of unlimited size, self.capacity is NaN and
-            # x > NaN is always False in Python and the cache won't be cleared.
-            if self.capacity is not None and self.length > self.capacity:
-                self.cache.popitem(last=False)
+    def __setitem__(self, key, value) -> None:
+        self.set(key, value)
+
+    def __delitem__(self, key) -> None:
+        if key not in self:
+            raise KeyError(key)
+
+        self.cache.remove(self.owner, key)
+
+    def __contains__(self, key: object) -> bool:
+        return key in self.cache._entries.get(self.owner, ())
+
+    def __iter__(self):
+        return iter(self.cache.keys(self.owner))
+
+    def __len__(self) -> int:
+        return len(self.cache._entries.get(self.owner, ()))
+
+    def clear(self) -> None:
+        self.cache.clear(self.owner)
+
+
+class RWLock:
+    """
+    A readers-writer lock.
+
+    Any number of threads can hold the lock for reading at once, while
+    writing requires holding it exclusively:
+
+    >>> lock = RWLock()
+    >>> with lock.read():
+    ...     ...  # Other readers may run at the same time
+    >>> with lock.write():
+    ...     ...  # Nobody else holds the lock
+
+    Waiting writers are preferred over new readers, so a steady stream of
+    reads can't starve writes. The lock is reentrant: a thread may read
+    again while reading, and read or write again while writing. A reader
+    can't start writing, as two readers doing so would wait for each
+    other forever.
+
+    Subclasses can extend the lock beyond the process by overriding
+    :meth:`_acquire_shared`, :meth:`_release_shared`,
+    :meth:`_acquire_exclusive` and :meth:`_release_exclusive`.
+    """
+
+    def __init__(self) -> None:
+        self._cond = threading.Condition(threading.Lock())
+        self._readers = 0
+        self._writers_waiting = 0
+        self._writer: Optional[int] = None
+        self._writes = 0
+
+        # The functions to call once the writer has released the lock, see
+        # after_write
+        self._after_write: List[Callable[[], None]] = []
+
+        # How often the current thread holds the lock for reading and
+        # whether it's counted as a reader (and not reading as the writer)
+        self._local = threading.local()
+
+    def acquire_read(self) -> None:
+        local = self._local
+        reads = getattr(local, 'reads', 0)
+
+        if reads == 0 and self._writer != threading.get_ident():
+            with self._cond:
+                while self._writer is not None or self._writers_waiting:
+                    self._cond.wait()
+
+                if self._readers == 0:
+                    self._acquire_shared()
+                self._readers += 1
+
+            local.counted = True
+        elif reads == 0:
+            local.counted = False
+
+        local.reads = reads + 1
+
+    def release_read(self) -> None:
+        local = self._local
+        local.reads -= 1
+
+        if local.reads == 0 and local.counted:
+            with self._cond:
+                self._readers -= 1
+                if self._readers == 0:
+                    try:
+                        self._release_shared()
+                    finally:
+                        self._cond.notify_all()
+
+    def acquire_write(self) -> None:
+        me = threading.get_ident()
+        if self._writer == me:
+            self._writes += 1
+            return
+
+        if getattr(self._local, 'reads', 0):
+            raise RuntimeError('Cannot write while holding the lock for '
+                               'reading')
+
+        with self._cond:
+            self._writers_waiting += 1
+            try:
+                while self._writer is not None or self._readers:
+                    self._cond.wait()
+
+                self._acquire_exclusive()
+            finally:
+                self._writers_waiting -= 1
+                if self._writer is None:
+                    # Let the readers waiting for us continue
+                    self._cond.notify_all()
+
+            self._writer = me
+            self._writes = 1
+
+    def release_write(self) -> None:
+        self._writes -= 1
+        if self._writes:
+            return
+
+        callbacks, self._after_write = self._after_write, []
+
+        with self._cond:
+            try:
+                self._release_exclusive()
+            finally:
+                self._writer = None
+                self._cond.notify_all()
+
+        for callback in callbacks:
+            callback()
+
+    def after_write(self, callback: Callable[[], None]) -> None:
+        """
+        Call ``callback`` once the current thread has stopped writing and
+        released the lock, so other threads don't have to wait for it (e.g.
+        for a write to reach the disk). Registering the same function again
+        before that calls it only once. If the thread isn't writing, the
+        function is called right away.
+        """
+        if self._writer != threading.get_ident():
+            callback()
+        elif callback not in self._after_write:
+            self._after_write.append(callback)
+
+    def mark_written(self) -> None:
+        """
+        Record that the writing thread has changed the data. Subclasses that
+        tell others about writes (see
+        :class:`~tinydb.process_lock.ProcessLock`) only do so for writers
+        that have called this.
+        """
+
+    def _acquire_shared(self) -> None:
+        """
+        Called when the first thread starts reading.
+        """
+
+    def _release_shared(self) -> None:
+        """
+        Called when the last thread stops reading.
+        """
+
+    def _acquire_exclusive(self) -> None:
+        """
+        Called when a thread starts writing.
+        """
+
+    def _release_exclusive(self) -> None:
+        """
+        Called when a thread stops writing.
+        """
+
+    @contextmanager
+    def read(self):
+        """
+        Hold the lock for reading.
+        """
+        self.acquire_read()
+        try:
+            yield
+        finally:
+            self.release_read()
+
+    @contextmanager
+    def write(self):
+        """
+        Hold the lock for writing.
+        """
+        self.acquire_write()
+        try:
+            yield
+        finally:
+            self.release_write()
+
+
+class FrozenList(list):
+    """
+    An immutable list.
+
+    This is used for query results that are shared by everyone who runs
+    the same query, so nobody may change them.
+    """
+
+    def _immutable(self, *args, **kws):
+        raise TypeError('object is immutable')
+
+    # Disable write access to the list
+    __setitem__ = _immutable
+    __delitem__ = _immutable
+    __iadd__ = _immutable
+    __imul__ = _immutable
+    append = _immutable
+    extend = _immutable
+    insert = _immutable
+    pop = _immutable
+    remove = _immutable
+    clear = _immutable
+    sort = _immutable
+    reverse = _immutable
+
+    def __reduce__(self):
+        # Pickle's default for lists restores the items using ``extend``
+        return type(self), (list(self),)
 
 
 class FrozenDict(dict):
@@ -150,6 +613,11 @@ class FrozenDict(dict):
     def pop(self, k, d=None):
         raise TypeError('object is immutable')
 
+    def __reduce__(self):
+        # Pickle's default for dicts restores the items one by one, which
+        # our disabled ``__setitem__`` doesn't allow
+        return type(self), (dict(self),)
+
 
 def freeze(obj):
     """
@@ -167,3 +635,18 @@ def freeze(obj):
     else:
         # Don't handle all other objects
         return obj
+
+
+def thaw(obj):
+    """
+    Undo :func:`freeze`, turning frozen objects back into their mutable
+    counterparts.
+    """
+    if isinstance(obj, dict):
+        return {k: thaw(v) for k, v in obj.items()}
+    elif isinstance(obj, tuple):
+        return [thaw(el) for el in obj]
+    elif isinstance(obj, frozenset):
+        return set(obj)
+    else:
+        return obj
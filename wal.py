@@ -0,0 +1,189 @@
+"""
+Contains a write-ahead log used to make writes durable without rewriting
+the whole database.
+"""
+
+import json
+import os
+import threading
+from typing import Any, Iterator, Optional
+
+__all__ = ('WriteAheadLog',)
+
+
+class WriteAheadLog:
+    """
+    An append-only log of JSON records with group commit.
+
+    Every record is written as a single line, so a record that has been
+    written completely is committed and a trailing incomplete line is the
+    leftover of an interrupted write that gets discarded on open.
+
+    When the log is synced to disk is decided by its ``durability``:
+
+    - ``'commit'``: every commit waits until its record has been synced.
+      Commits that arrive while a sync is in progress are synced together
+      by the next one (group commit), so concurrent writers share fsyncs.
+    - ``'interval'``: a background thread syncs the log every
+      ``sync_interval`` seconds. A crash loses at most the records of the
+      last interval.
+    - ``'os'``: records are handed to the operating system which decides
+      when to write them to disk.
+    """
+
+    DURABILITY_MODES = ('commit', 'interval', 'os')
+
+    def __init__(self, path: str, durability: str = 'commit',
+                 sync_interval: float = 0.05):
+        """
+        Open the log, creating it if it doesn't exist yet.
+
+        :param path: Where to store the log.
+        :param durability: One of ``'commit'``, ``'interval'`` or ``'os'``.
+        :param sync_interval: Seconds between syncs in ``'interval'`` mode.
+        """
+        if durability not in self.DURABILITY_MODES:
+            raise ValueError('Unsupported durability {!r}. Use one of {}.'
+                             .format(durability, ', '.join(self.DURABILITY_MODES)))
+
+        self.path = path
+        self.durability = durability
+        self.sync_interval = sync_interval
+
+        # Protects the file handle and the sequence numbers below
+        self._cond = threading.Condition()
+
+        # The number of the last record appended and the last record that
+        # is known to be on disk
+        self._lsn = 0
+        self._synced_lsn = 0
+        self._syncing = False
+
+        self._handle = open(path, 'ab+')
+        self._discard_incomplete()
+
+        self._stop = threading.Event()
+        self._syncer: Optional[threading.Thread] = None
+        if durability == 'interval':
+            self._syncer = threading.Thread(target=self._sync_periodically,
+                                            daemon=True)
+            self._syncer.start()
+
+    def _discard_incomplete(self):
+        """
+        Cut off a record that hasn't been written completely.
+        """
+        self._handle.seek(0)
+        offset = 0
+        for line in self._handle:
+            if not line.endswith(b'\n'):
+                self._handle.truncate(offset)
+                break
+            offset += len(line)
+
+    @property
+    def size(self) -> int:
+        """
+        The size of the log in bytes.
+        """
+        with self._cond:
+            return self._handle.seek(0, os.SEEK_END)
+
+    def records(self) -> Iterator[Any]:
+        """
+        Iterate over all records in the log, oldest first.
+        """
+        with self._cond:
+            self._handle.flush()
+            self._handle.seek(0)
+            lines = self._handle.readlines()
+
+        for line in lines:
+            yield json.loads(line)
+
+    def append(self, record: Any) -> int:
+        """
+        Append a record to the log without waiting for it to be synced.
+
+        :returns: the sequence number of the record, to be passed to
+                  :meth:`commit`
+        """
+        line = json.dumps(record).encode('utf-8') + b'\n'
+
+        with self._cond:
+            self._handle.write(line)
+            self._lsn += 1
+
+            return self._lsn
+
+    def commit(self, lsn: int) -> None:
+        """
+        Make sure the record ``lsn`` is as durable as the log's
+        ``durability`` requires.
+        """
+        if self.durability == 'commit':
+            self.sync(lsn)
+        elif self.durability == 'os':
+            with self._cond:
+                self._handle.flush()
+
+    def sync(self, lsn: Optional[int] = None) -> None:
+        """
+        Wait until all records up to ``lsn`` (by default: all records) have
+        been written to disk.
+
+        Only one thread syncs at a time. It syncs all records appended so
+        far, so threads waiting for it usually find their record synced
+        once it is done.
+        """
+        with self._cond:
+            if lsn is None:
+                lsn = self._lsn
+
+            while self._synced_lsn < lsn:
+                if self._syncing:
+                    self._cond.wait()
+                    continue
+
+                # Become the thread that syncs all records appended so far
+                self._syncing = True
+                target = self._lsn
+                self._handle.flush()
+                fileno = self._handle.fileno()
+
+                # Let other writers append while we wait for the disk
+                self._cond.release()
+                try:
+                    os.fsync(fileno)
+                finally:
+                    self._cond.acquire()
+                    self._syncing = False
+                    self._synced_lsn = max(self._synced_lsn, target)
+                    self._cond.notify_all()
+
+    def _sync_periodically(self):
+        while not self._stop.wait(self.sync_interval):
+            self.sync()
+
+    def truncate(self) -> None:
+        """
+        Remove all records, e.g. after they have been checkpointed.
+        """
+        with self._cond:
+            while self._syncing:
+                self._cond.wait()
+
+            self._handle.truncate(0)
+            self._handle.flush()
+            os.fsync(self._handle.fileno())
+            self._synced_lsn = self._lsn
+
+    def close(self) -> None:
+        self._stop.set()
+        if self._syncer is not None:
+            self._syncer.join()
+
+        if self.durability != 'os':
+            self.sync()
+
+        self._handle.close()